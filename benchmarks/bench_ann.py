@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# bench_ann.py – IVF-Index vs. exakte Suche: recall@k und Latenz je nprobe
+# Synthetische, geclusterte Embeddings (Themen-Zentren + Rauschen), Abfragen sind verrauschte
+# Regelvektoren. Zusätzlich: voller Neuaufbau vs. inkrementeller Rebuild nach neuen Regeln.
+#
+#   python benchmarks/bench_ann.py --rules 200000 --dim 384 --nprobe 1 4 8 16 32
+
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+
+from common import add_service_path
+
+add_service_path("decision_rules")
+
+import decision_engine  # noqa: E402
+from ann_index import IVFIndex  # noqa: E402
+
+
+def clustered(rng, n: int, dim: int, topics: int, noise: float) -> np.ndarray:
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    rows = centers[rng.integers(0, topics, n)] + noise * rng.standard_normal((n, dim)).astype(np.float32)
+    return decision_engine.normalize_rows(rows)
+
+
+def timed_search(fn, queries) -> tuple:
+    results, latencies = [], []
+    for q in queries:
+        t = time.perf_counter()
+        results.append(fn(q))
+        latencies.append(time.perf_counter() - t)
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rng = np.random.default_rng(0)
+    matrix = clustered(rng, args.rules, args.dim, args.topics, noise=0.6)
+    rules = [{"id": f"rule_{i}", "tool": "t", "pattern": f"p{i}", "language": "de"} for i in range(args.rules)]
+    keys = decision_engine.row_keys(rules)
+    picks = rng.integers(0, args.rules, args.queries)
+    queries = decision_engine.normalize_rows(
+        # Rauschen mit Norm ~0.5 relativ zu den normalisierten Regelvektoren
+        matrix[picks] + 0.5 / np.sqrt(args.dim) * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    )
+
+    t0 = time.perf_counter()
+    ivf = IVFIndex.build(matrix, keys, nlist=args.nlist)
+    build_s = time.perf_counter() - t0
+
+    exact_index = {"rules": rules, "matrix": matrix, "ready": None}
+    exact, exact_lat = timed_search(
+        lambda q: [r["id"] for r in decision_engine.top_k_matches(exact_index, q, args.k)], queries
+    )
+    exact_ms = float(np.mean(exact_lat) * 1000)
+
+    sweep = []
+    for nprobe in args.nprobe:
+        found, lat = timed_search(lambda q: ivf.search(q, args.k, nprobe)[0], queries)
+        recall = np.mean([
+            len({rules[i]["id"] for i in rows} & set(truth)) / len(truth) for rows, truth in zip(found, exact)
+        ])
+        mean_ms = float(np.mean(lat) * 1000)
+        sweep.append({
+            "nprobe": nprobe,
+            f"recall@{args.k}": round(float(recall), 4),
+            "mean_ms": round(mean_ms, 3),
+            "p95_ms": round(float(np.percentile(lat, 95) * 1000), 3),
+            "speedup": round(exact_ms / mean_ms, 1),
+        })
+
+    # Inkrementell: 5 % neue Regeln, bestehende behalten ihre Liste
+    extra = max(1, args.rules // 20)
+    grown = np.vstack([matrix, clustered(rng, extra, args.dim, args.topics, noise=0.6)])
+    grown_keys = keys + [f"new_{i}:x" for i in range(extra)]
+    t0 = time.perf_counter()
+    IVFIndex.build(grown, grown_keys, nlist=args.nlist, previous=ivf)
+    incremental_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    IVFIndex.build(grown, grown_keys, nlist=args.nlist)
+    full_s = time.perf_counter() - t0
+
+    print(json.dumps({
+        "benchmark": "ann",
+        "rules": args.rules,
+        "dim": args.dim,
+        "k": args.k,
+        "ivf": {**ivf.info(), "build_s": round(build_s, 2)},
+        "exact_mean_ms": round(exact_ms, 3),
+        "ivf_sweep": sweep,
+        "rebuild_after_5pct_new": {"full_s": round(full_s, 2), "incremental_s": round(incremental_s, 2)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# bench_bridge_dispatch.py – JSON-RPC-Handshake-Traffic gegen mini_bridge
+# Vergleicht den bisherigen if/elif-Handler (hier nachgebaut) mit der Dispatch-Registry
+# und vorserialisierten Antworten. Läuft per ASGITransport in-process, ohne Netzwerk.
+#
+#   python benchmarks/bench_bridge_dispatch.py --requests 20000 --concurrency 50
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+import httpx
+from fastapi import FastAPI, Request, Response
+
+from common import add_service_path, summarize
+
+add_service_path("mini_bridge")
+
+import mini_bridge  # noqa: E402
+
+METHODS = ["ping", "initialize", "tools/list", "resources/list", "prompts/list", "get_capabilities"]
+
+
+def create_legacy_app() -> FastAPI:
+    """Der alte Handler: if/elif-Kette, Payloads pro Request neu gebaut, INFO-Log pro Request."""
+    app = FastAPI()
+    logger = logging.getLogger("bridge")
+
+    @app.post("/")
+    async def handle_mcp(request: Request):
+        data = await request.json()
+        method = data.get("method")
+        req_id = data.get("id")
+        if not method:
+            return Response(status_code=204)
+        logger.info(f"[MCP] → {method}")
+        if method == "ping":
+            logger.info("[Bridge] Ping erhalten – 200 OK")
+            return {"jsonrpc": "2.0", "id": req_id, "result": {}}
+        elif method == "initialize":
+            return {"jsonrpc": "2.0", "id": req_id, "result": mini_bridge.STATIC_RESULTS["initialize"]}
+        elif method == "get_capabilities":
+            return {"jsonrpc": "2.0", "id": req_id,
+                    "result": {"capabilities": {"tools": True, "logging": True}}}
+        elif method == "tools/list":
+            logger.info("[Bridge] tools/list aufgerufen")
+            return {"jsonrpc": "2.0", "id": req_id, "result": {"tools": mini_bridge.AVAILABLE_TOOLS}}
+        elif method == "resources/list":
+            logger.info("[Bridge] resources/list aufgerufen")
+            return {"jsonrpc": "2.0", "id": req_id, "result": {"resources": []}}
+        elif method == "prompts/list":
+            logger.info("[Bridge] prompts/list aufgerufen")
+            return {"jsonrpc": "2.0", "id": req_id, "result": {"prompts": []}}
+        return {"jsonrpc": "2.0", "id": req_id,
+                "error": {"code": -32601, "message": f"Method not found: {method}"}}
+
+    return app
+
+
+async def measure(app, total: int, concurrency: int) -> dict:
+    latencies = []
+    counter = iter(range(total))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bridge") as client:
+        async def worker():
+            for i in counter:
+                body = {"jsonrpc": "2.0", "id": i, "method": METHODS[i % len(METHODS)]}
+                t = time.perf_counter()
+                r = await client.post("/", json=body)
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - t)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    return summarize(latencies, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    # Logging bleibt aktiv (Formatierungskosten zählen mit), landet aber nicht im Terminal
+    devnull = open(os.devnull, "w")
+    for handler in logging.getLogger().handlers:
+        handler.setStream(devnull)
+
+    legacy = asyncio.run(measure(create_legacy_app(), args.requests, args.concurrency))
+    dispatch = asyncio.run(measure(mini_bridge.app, args.requests, args.concurrency))
+
+    print(json.dumps({
+        "benchmark": "bridge_dispatch",
+        "methods": METHODS,
+        "if_elif_handler": legacy,
+        "dispatch_registry": dispatch,
+        "speedup_rps": round(dispatch["throughput_rps"] / legacy["throughput_rps"], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# bench_decision_matrix.py – Python-Schleife vs. vorberechnete Embedding-Matrix
+#
+#   python benchmarks/bench_decision_matrix.py --rules 10000 100000 --dim 768
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from common import add_service_path
+
+add_service_path("decision_rules")
+
+import decision_engine  # noqa: E402
+
+
+def cosine_similarity(a, b):
+    a, b = np.array(a), np.array(b)
+    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9)
+
+
+def loop_search(rule_cache, query):
+    """Bisheriges Verfahren aus find_best_match."""
+    best, best_score = None, 0
+    for rule in rule_cache:
+        score = cosine_similarity(rule["embedding"], query)
+        if score > best_score:
+            best, best_score = rule, score
+    return best
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in args.rules:
+        vectors = rng.standard_normal((n, args.dim)).astype(np.float32)
+        rules = [{"id": f"r{i}", "tool": "t", "pattern": "", "language": "de"} for i in range(n)]
+        embeddings = vectors.tolist()
+        rule_cache = [{**r, "embedding": e} for r, e in zip(rules, embeddings)]
+        query = rng.standard_normal(args.dim).astype(np.float32).tolist()
+
+        t0 = time.perf_counter()
+        index = decision_engine.build_index(rules, embeddings)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        loop_ms = timed(lambda: loop_search(rule_cache, query), max(1, args.queries // 10))
+        matrix_ms = timed(lambda: decision_engine.top_k_matches(index, query, args.top_k), args.queries)
+
+        assert decision_engine.top_k_matches(index, query, 1)[0]["id"] == loop_search(rule_cache, query)["id"]
+        results.append({
+            "rules": n,
+            "dim": args.dim,
+            "index_build_ms": round(build_ms, 2),
+            "loop_query_ms": round(loop_ms, 3),
+            "matrix_query_ms": round(matrix_ms, 3),
+            "speedup": round(loop_ms / matrix_ms, 1),
+        })
+
+    print(json.dumps({"benchmark": "decision_matrix", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
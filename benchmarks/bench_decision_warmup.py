@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# bench_decision_warmup.py – Warm-up sequentiell vs. parallel + gebatcht
+# Nutzt eine temporäre decision.db mit synthetischen Regeln und den Fake-Ollama.
+#
+#   python benchmarks/bench_decision_warmup.py --rules 2000 --embed-delay 0.01
+
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import tempfile
+from pathlib import Path
+
+import httpx
+
+import fake_ollama
+from common import add_service_path, run_server
+
+add_service_path("decision_rules")
+
+import decision_engine  # noqa: E402
+
+
+def create_rule_db(path: Path, n: int):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE decision_rules (
+            id TEXT PRIMARY KEY, category TEXT, language TEXT, pattern TEXT, tool TEXT,
+            params TEXT, confidence REAL, examples TEXT, tags TEXT, author TEXT,
+            source TEXT, enabled INTEGER, created_at TEXT
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO decision_rules VALUES (?, ?, ?, ?, ?, '{}', 0.9, '[]', '[]', 'bench', 'bench', 1, '')",
+        [(f"rule_{i}", f"cat_{i % 10}", "de", json.dumps(f"(muster{i}|pattern{i})"), f"tool_{i % 5}") for i in range(n)],
+    )
+    conn.commit()
+    conn.close()
+
+
+async def warm_up(batch_size: int, concurrency: int) -> dict:
+    decision_engine.EMBED_BATCH_SIZE = batch_size
+    decision_engine.EMBED_CONCURRENCY = concurrency
+    decision_engine.BATCH_SUPPORTED = True
+    async with httpx.AsyncClient(timeout=30) as client:
+        decision_engine.EMBED_CLIENT = client
+        await decision_engine.load_rules_with_embeddings()
+    return {
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "rules_loaded": len(decision_engine.RULE_INDEX["rules"]),
+        "elapsed_s": decision_engine.WARMUP["elapsed"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=2000)
+    parser.add_argument("--embed-delay", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "decision.db"
+        create_rule_db(db, args.rules)
+        decision_engine.DB_PATH = str(db)
+
+        with run_server(fake_ollama.create_app(embed_delay=args.embed_delay)) as base:
+            decision_engine.OLLAMA_URL = base + "/api/embeddings"
+            decision_engine.OLLAMA_BATCH_URL = base + "/api/embed"
+            sequential = asyncio.run(warm_up(1, 1))
+            parallel = asyncio.run(warm_up(args.batch_size, args.concurrency))
+
+    print(json.dumps({
+        "benchmark": "decision_warmup",
+        "rules": args.rules,
+        "sequential": sequential,
+        "concurrent_batched": parallel,
+        "speedup": round(sequential["elapsed_s"] / max(parallel["elapsed_s"], 1e-9), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
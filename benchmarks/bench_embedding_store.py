@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# bench_embedding_store.py – Startzeit und Speicher der Regel-Embeddings je Darstellung
+#   dict_of_lists  altes RULE_CACHE-Format: {id: {"tool", "pattern", "embedding": [float, ...]}}
+#   sqlite_matrix  Embedding-Cache aus decision.db → float32-Matrix im Heap
+#   mmap_float32   Embedding-Store (.npy + Spalten-Index) per mmap
+#   mmap_float16   dito mit halber Dateigröße
+# Jede Variante läuft zweimal in einem frischen Prozess: ohne tracemalloc für Ladezeit und
+# RSS-Zuwachs nach einer Abfrage über alle Regeln, mit tracemalloc für den Python-Heap
+# (inkl. numpy-Puffer; mmap-Seiten zählen nicht dazu).
+#
+#   python benchmarks/bench_embedding_store.py --rules 50000 --dim 768
+
+import argparse
+import json
+import logging
+import multiprocessing
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+import fake_ollama
+from bench_decision_warmup import create_rule_db
+from common import add_service_path
+
+add_service_path("decision_rules")
+
+import decision_engine  # noqa: E402
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 2**20
+
+
+def prepare(db: Path, store_dir: Path, n: int, dim: int):
+    """Füllt decision.db samt Embedding-Cache und schreibt beide Store-Varianten."""
+    create_rule_db(db, n)
+    decision_engine.DB_PATH = str(db)
+    rules = decision_engine.load_rule_rows()
+    vectors = decision_engine.normalize_rows(np.asarray(
+        [fake_ollama.fake_embedding(r["pattern"], dim) for r in rules], dtype=np.float32
+    ))
+    decision_engine.store_cached_embeddings(
+        decision_engine.EMBED_MODEL,
+        [(decision_engine.pattern_hash(r["pattern"]), v) for r, v in zip(rules, vectors)],
+    )
+    decision_engine.EMBED_STORE_DIR = str(store_dir)
+    store_dir.mkdir()
+    index = {"rules": rules, "matrix": vectors}
+    fingerprints = {}
+    for dtype in ("float32", "float16"):
+        decision_engine.EMBED_STORE_DTYPE = dtype
+        fingerprints[dtype] = decision_engine.index_fingerprint(rules)
+        decision_engine.write_store(index, fingerprints[dtype])
+        # write_store räumt fremde Stände weg – die float32-Dateien für den Vergleich behalten
+        if dtype == "float32":
+            keep = [p.read_bytes() for p in map(Path, decision_engine.store_paths(fingerprints[dtype]))]
+    for path, data in zip(decision_engine.store_paths(fingerprints["float32"]), keep):
+        Path(path).write_bytes(data)
+    return fingerprints
+
+
+def load_variant(variant: str, db: str, store_dir: str, fingerprint: str | None, dim: int, trace: bool, queue):
+    decision_engine.DB_PATH = db
+    decision_engine.EMBED_STORE_DIR = store_dir
+    query = np.asarray(fake_ollama.fake_embedding("wie spät ist es", dim), dtype=np.float32)
+    rss0 = rss_mb()
+    if trace:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+
+    if variant == "dict_of_lists":
+        cached = decision_engine.load_cached_embeddings(decision_engine.EMBED_MODEL)
+        cache = {
+            r["id"]: {"tool": r["tool"], "pattern": r["pattern"],
+                      "embedding": cached[decision_engine.pattern_hash(r["pattern"])].tolist()}
+            for r in decision_engine.load_rule_rows()
+        }
+        load_s = time.perf_counter() - t0
+        # alter Suchpfad: Kosinus pro Regel in Python
+        qn = float(np.linalg.norm(query))
+        best = max(cache.values(), key=lambda r: float(np.dot(r["embedding"], query)) / qn)
+        rules_loaded = len(cache)
+    else:
+        if variant == "sqlite_matrix":
+            rules = decision_engine.load_rule_rows()
+            cached = decision_engine.load_cached_embeddings(decision_engine.EMBED_MODEL)
+            matrix = np.stack([cached[decision_engine.pattern_hash(r["pattern"])] for r in rules])
+            del cached
+            index = {"rules": rules, "matrix": matrix, "ready": None}
+        else:
+            index = decision_engine.open_store(fingerprint)
+        load_s = time.perf_counter() - t0
+        best = decision_engine.top_k_matches(index, query, 1)
+        rules_loaded = len(index["rules"])
+
+    if trace:
+        queue.put({"heap_mb": round(tracemalloc.get_traced_memory()[0] / 2**20, 1)})
+        return
+    queue.put({
+        "variant": variant,
+        "rules_loaded": rules_loaded,
+        "load_ms": round(load_s * 1000, 1),
+        "rss_delta_mb": round(rss_mb() - rss0, 1),
+        "found": bool(best),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db, store_dir = Path(tmp) / "decision.db", Path(tmp) / "store"
+        fingerprints = prepare(db, store_dir, args.rules, args.dim)
+        for variant, fingerprint in (
+            ("dict_of_lists", None),
+            ("sqlite_matrix", None),
+            ("mmap_float32", fingerprints["float32"]),
+            ("mmap_float16", fingerprints["float16"]),
+        ):
+            result = {}
+            for trace in (False, True):
+                queue = ctx.Queue()
+                proc = ctx.Process(
+                    target=load_variant,
+                    args=(variant, str(db), str(store_dir), fingerprint, args.dim, trace, queue),
+                )
+                proc.start()
+                result.update(queue.get())
+                proc.join()
+            results.append(result)
+        sizes = {
+            f"{dtype}{Path(path).suffix}": round(Path(path).stat().st_size / 2**20, 1)
+            for dtype, fingerprint in fingerprints.items()
+            for path in decision_engine.store_paths(fingerprint)
+        }
+
+    print(json.dumps({
+        "benchmark": "embedding_store",
+        "rules": args.rules,
+        "dim": args.dim,
+        "store_files_mb": sizes,
+        "variants": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
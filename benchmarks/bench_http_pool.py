@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# bench_http_pool.py – Client pro Request vs. gepoolter Client
+# Misst den Verbindungs-Overhead eines Hops gegen einen lokalen Upstream.
+#
+#   python benchmarks/bench_http_pool.py --requests 500 --concurrency 10
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from common import run_server, summarize
+
+upstream = FastAPI()
+
+
+@upstream.post("/")
+async def echo():
+    return {"jsonrpc": "2.0", "id": 1, "result": {"status": "ok"}}
+
+
+async def run(url: str, total: int, concurrency: int, shared: bool) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    client = httpx.AsyncClient(timeout=10) if shared else None
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            if shared:
+                r = await client.post(url, json={"method": "ping"})
+            else:
+                async with httpx.AsyncClient(timeout=10) as c:
+                    r = await c.post(url, json={"method": "ping"})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    wall = time.perf_counter() - t0
+    if client is not None:
+        await client.aclose()
+    return summarize(latencies, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    with run_server(upstream) as base:
+        url = base + "/"
+        per_request = asyncio.run(run(url, args.requests, args.concurrency, shared=False))
+        pooled = asyncio.run(run(url, args.requests, args.concurrency, shared=True))
+
+    print(json.dumps({
+        "benchmark": "http_pool",
+        "per_request_client": per_request,
+        "pooled_client": pooled,
+        "overhead_saved_ms_p50": round(per_request["p50_ms"] - pooled["p50_ms"], 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
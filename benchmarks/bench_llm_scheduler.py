@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# bench_llm_scheduler.py – Lastspitze gegen eine "lokale GPU" mit und ohne Admission Control
+# Fake-Ollama rechnet nur eine Generierung gleichzeitig (gpu_slots=1). Ein Burst aus kurzen
+# Tool-Routing-Prompts und langen Chats, ein Teil davon doppelt (Retries, Doppel-Submits), geht
+# direkt an den Injector: einmal ohne Limits/Coalescing, einmal mit dem Scheduler.
+#
+#   python benchmarks/bench_llm_scheduler.py --burst 40 --duplicates 0.5 --first-token-delay 0.2
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+
+import httpx
+
+import fake_ollama
+from common import add_service_path, run_server, summarize
+
+add_service_path("prompt_injector")
+
+import llm_scheduler  # noqa: E402
+import mini_prompt_injector  # noqa: E402
+import pre_router  # noqa: E402
+
+
+def build_burst(n: int, duplicates: float, tool_share: float) -> list:
+    """(Art, Prompt)-Liste; die ersten Prompts jeder Art werden für Duplikate wiederverwendet."""
+    burst = []
+    unique = max(1, int(n * (1 - duplicates)))
+    for i in range(n):
+        kind = "tool" if i % round(1 / tool_share) == 0 else "chat"
+        j = i if i < unique else i % unique
+        prompt = f"Wetter in Stadt {j}?" if kind == "tool" else f"Erkläre mir ausführlich Thema {j}. " + "x" * 250
+        burst.append((kind, prompt))
+    return burst
+
+
+async def fire(url: str, burst: list) -> dict:
+    latencies = {"tool": [], "chat": []}
+    statuses = Counter()
+    async with httpx.AsyncClient(timeout=120) as client:
+        async def one(kind, prompt):
+            t = time.perf_counter()
+            r = await client.post(url, json={"prompt": prompt})
+            statuses[r.status_code] += 1
+            if r.status_code == 200:
+                latencies[kind].append(time.perf_counter() - t)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(kind, prompt) for kind, prompt in burst))
+        wall = time.perf_counter() - t0
+    return {
+        "wall_s": round(wall, 2),
+        "status": dict(sorted(statuses.items())),
+        "tool": summarize(latencies["tool"], wall),
+        "chat": summarize(latencies["chat"], wall),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=40)
+    parser.add_argument("--duplicates", type=float, default=0.5, help="Anteil doppelter Prompts")
+    parser.add_argument("--tool-share", type=float, default=0.25, help="Anteil kurzer Tool-Routing-Prompts")
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    pre_router.PREROUTE_ENABLED = False
+
+    burst = build_burst(args.burst, args.duplicates, args.tool_share)
+    ollama = fake_ollama.create_app(
+        first_token_delay=args.first_token_delay, token_interval=args.token_interval, gpu_slots=1
+    )
+    calls = ollama.state.calls
+    results = {}
+    with run_server(ollama) as ollama_url:
+        mini_prompt_injector.OLLAMA_URL = ollama_url + "/api/chat"
+        with run_server(mini_prompt_injector.app) as injector_url:
+            url = injector_url + "/api/chat"
+            configs = {
+                "unlimited": dict(concurrency=10_000, queue=10_000, timeout=600.0, coalesce=False),
+                "scheduler": dict(concurrency=1, queue=args.queue, timeout=args.queue_timeout, coalesce=True),
+            }
+            for name, cfg in configs.items():
+                llm_scheduler.LLM_MAX_CONCURRENCY = cfg["concurrency"]
+                llm_scheduler.LLM_MAX_QUEUE = cfg["queue"]
+                llm_scheduler.LLM_QUEUE_TIMEOUT = cfg["timeout"]
+                llm_scheduler.LLM_COALESCE = cfg["coalesce"]
+                before = calls["chat"]
+                results[name] = asyncio.run(fire(url, burst))
+                results[name]["generations"] = calls["chat"] - before
+
+    print(json.dumps({
+        "benchmark": "llm_scheduler",
+        "burst": args.burst,
+        "duplicates": args.duplicates,
+        "tool_share": args.tool_share,
+        **results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# bench_partitioned.py – globale vs. nach Sprache/Kategorie partitionierte Suche
+# Synthetische, mehrsprachige Regeln wie vom Installer erzeugt (eine Zeile pro Regel und Sprache):
+# Übersetzungen liegen nah beieinander (multilinguales Modell), Kategorien bilden Themen-Cluster.
+# Gemessen: Latenz, Top-1-Treffer (richtige Regel in richtiger Sprache) und Anteil falscher Sprachen.
+#
+#   python benchmarks/bench_partitioned.py --rules-per-category 500 --categories 10 50 --languages 3
+
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+
+from common import add_service_path
+
+add_service_path("decision_rules")
+
+import decision_engine  # noqa: E402
+
+LANGS = ["de", "en", "pt", "fr", "es", "it", "nl", "pl"]
+
+
+def make_index(rng, categories: int, per_category: int, languages: list, dim: int):
+    topics = rng.standard_normal((categories, dim)).astype(np.float32)
+    intents = topics.repeat(per_category, axis=0) + 0.8 * rng.standard_normal(
+        (categories * per_category, dim)).astype(np.float32)
+    # Sprachrichtung mit Norm ~0.2 relativ zum Intent: Übersetzungen bleiben sehr ähnlich
+    lang_dirs = {lang: 0.2 / np.sqrt(dim) * rng.standard_normal(dim).astype(np.float32) for lang in languages}
+
+    rules, rows = [], []
+    # Reihenfolge wie load_rule_rows: nach Sprache, Kategorie, id
+    for lang in sorted(languages):
+        for c in range(categories):
+            for r in range(per_category):
+                i = c * per_category + r
+                rules.append({"id": f"intent_{i}_{lang}", "tool": f"tool_{i % 7}", "pattern": f"p{i}_{lang}",
+                              "language": lang, "category": f"cat_{c}"})
+                rows.append(intents[i] + lang_dirs[lang] * np.linalg.norm(intents[i]))
+    matrix = decision_engine.normalize_rows(np.asarray(rows))
+    return {"rules": rules, "matrix": matrix, "ready": None}, intents, lang_dirs
+
+
+def run(index: dict, queries: list, language_known: bool) -> dict:
+    latencies, correct, wrong_language = [], 0, 0
+    for vec, rule_id, lang in queries:
+        t = time.perf_counter()
+        top = decision_engine.top_k_matches(index, vec, 1, language=lang if language_known else None)
+        latencies.append(time.perf_counter() - t)
+        correct += top[0]["id"] == rule_id
+        wrong_language += top[0]["language"] != lang
+    return {
+        "mean_ms": round(float(np.mean(latencies)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        "top1_accuracy": round(correct / len(queries), 4),
+        "wrong_language_rate": round(wrong_language / len(queries), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--categories", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--languages", type=int, nargs="+", default=[3])
+    parser.add_argument("--rules-per-category", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    decision_engine.PARTITION_FALLBACK = False
+
+    results = []
+    for n_lang in args.languages:
+        for n_cat in args.categories:
+            rng = np.random.default_rng(0)
+            languages = LANGS[:n_lang]
+            index, intents, lang_dirs = make_index(rng, n_cat, args.rules_per_category, languages, args.dim)
+            queries = []
+            for _ in range(args.queries):
+                i = int(rng.integers(0, len(intents)))
+                lang = languages[int(rng.integers(0, n_lang))]
+                # Query = Intent, anders formuliert (Rauschen); kurze Queries tragen nur ein schwaches,
+                # mit anderen Sprachen vermischtes Sprachsignal (Lehnwörter, Code-Switching)
+                other = languages[int(rng.integers(0, n_lang))]
+                signal = rng.uniform(0.2, 1.0) * lang_dirs[lang] + rng.uniform(0.0, 0.8) * lang_dirs[other]
+                vec = intents[i] + signal * np.linalg.norm(intents[i])
+                vec = vec + 0.5 * np.linalg.norm(vec) / np.sqrt(args.dim) * rng.standard_normal(args.dim)
+                queries.append((vec.astype(np.float32), f"intent_{i}_{lang}", lang))
+
+            flat = {**index, "partitions": None}
+            index["partitions"] = decision_engine.build_partitions(index)
+            results.append({
+                "languages": n_lang,
+                "categories": n_cat,
+                "rules": len(index["rules"]),
+                "global": run(flat, queries, language_known=False),
+                "partitioned": run(index, queries, language_known=True),
+            })
+
+    print(json.dumps({
+        "benchmark": "partitioned_search",
+        "category_probe": decision_engine.CATEGORY_PROBE,
+        "runs": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
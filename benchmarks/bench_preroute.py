@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# bench_preroute.py – Tool-Prompts mit und ohne Regex-Pre-Routing
+# Kette: Injector → (Fake-Ollama) → MCP-Hub → mcp_time, Regeln aus decision_rules/decision.db.
+#
+#   python benchmarks/bench_preroute.py --runs 20 --llm-delay 1.0
+
+import argparse
+import asyncio
+import json
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+import fake_ollama
+from common import REPO_ROOT, add_service_path, run_server, summarize
+
+for service in ("prompt_injector", "mcp_hub", "mcp_time"):
+    add_service_path(service)
+
+import mcp_hub  # noqa: E402
+import mcp_time  # noqa: E402
+import mini_prompt_injector  # noqa: E402
+import pre_router  # noqa: E402
+
+TOOL_REPLY = json.dumps({"action": "mcp_call", "tool": "time", "query": "Wie spät ist es?"})
+
+
+async def measure(url: str, runs: int) -> dict:
+    latencies = []
+    async with httpx.AsyncClient(timeout=60) as client:
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            t = time.perf_counter()
+            r = await client.post(url, json={"prompt": "Wie spät ist es?"})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t)
+        wall = time.perf_counter() - t0
+    return summarize(latencies, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--llm-delay", type=float, default=1.0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "decision.db"
+        shutil.copy(REPO_ROOT / "decision_rules" / "decision.db", db)
+        pre_router.DECISION_DB_PATH = str(db)
+
+        ollama = fake_ollama.create_app(reply=TOOL_REPLY, first_token_delay=args.llm_delay)
+        with run_server(ollama) as ollama_url, run_server(mcp_time.app) as time_url:
+            registry = Path(tmp) / "mcp_registry.json"
+            registry.write_text(json.dumps({"servers": [{"id": "time", "url": time_url}]}))
+            mcp_hub.REGISTRY_PATH = str(registry)
+            with run_server(mcp_hub.app) as hub_url:
+                mini_prompt_injector.OLLAMA_URL = ollama_url + "/api/chat"
+                mini_prompt_injector.MCP_HUB_URL = hub_url
+                with run_server(mini_prompt_injector.app) as injector_url:
+                    url = injector_url + "/api/chat"
+                    pre_router.PREROUTE_ENABLED = False
+                    llm = asyncio.run(measure(url, args.runs))
+                    pre_router.PREROUTE_ENABLED = True
+                    routed = asyncio.run(measure(url, args.runs))
+
+    print(json.dumps({
+        "benchmark": "preroute",
+        "llm_decision": llm,
+        "regex_preroute": routed,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
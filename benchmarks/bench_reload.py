@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# bench_reload.py – Live-Reload (/reload-Logik) vs. kompletter Neuaufbau nach Regeländerungen
+# Ändert einen Teil der Regeln in einer temporären decision.db (Pattern geändert, neu, gelöscht,
+# deaktiviert) und misst Reload-Zeit, eingebettete Texte und Query-Latenz während des Reloads.
+#
+#   python benchmarks/bench_reload.py --rules 20000 --change 0.01 --embed-delay 0.01
+
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+import fake_ollama
+from common import add_service_path, run_server
+
+add_service_path("decision_rules")
+
+import decision_engine  # noqa: E402
+from bench_decision_warmup import create_rule_db  # noqa: E402
+
+
+def mutate_rules(path: Path, n: int, fraction: float) -> dict:
+    """Ändert je ein Viertel der Stichprobe: Pattern, neue Regel, gelöscht, deaktiviert."""
+    step = max(1, int(n * fraction) // 4)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "UPDATE decision_rules SET pattern=? WHERE id=?",
+            [(json.dumps(f"(neu{i}|new{i})"), f"rule_{i}") for i in range(0, step)],
+        )
+        conn.executemany(
+            "INSERT INTO decision_rules VALUES (?, 'cat_0', 'de', ?, 'tool_0', '{}', 0.9, '[]', '[]', 'bench', 'bench', 1, '')",
+            [(f"extra_{i}", json.dumps(f"(extra{i})")) for i in range(step)],
+        )
+        conn.executemany("DELETE FROM decision_rules WHERE id=?", [(f"rule_{i}",) for i in range(step, 2 * step)])
+        conn.executemany(
+            "UPDATE decision_rules SET enabled=0 WHERE id=?", [(f"rule_{i}",) for i in range(2 * step, 3 * step)]
+        )
+    conn.close()
+    return {"changed": step, "added": step, "removed": 2 * step}
+
+
+async def query_while(task: asyncio.Task, dim: int) -> list:
+    """Abfragen gegen den jeweils aktuellen Snapshot, solange der Reload läuft."""
+    latencies = []
+    query = [1.0] * dim
+    while not task.done():
+        t0 = time.perf_counter()
+        decision_engine.top_k_matches(decision_engine.RULE_INDEX, query, 3)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0)
+    return latencies
+
+
+async def run(db: Path, rules: int, fraction: float, calls: dict) -> dict:
+    async with httpx.AsyncClient(timeout=30) as client:
+        decision_engine.EMBED_CLIENT = client
+        await decision_engine.warmup_index()
+        dim = decision_engine.RULE_INDEX["matrix"].shape[1]
+        expected = mutate_rules(db, rules, fraction)
+
+        before = calls["embed_inputs"]
+        t0 = time.perf_counter()
+        task = asyncio.create_task(decision_engine.reload_index())
+        latencies = await query_while(task, dim)
+        summary = await task
+        reload_s = time.perf_counter() - t0
+        reload_embedded = calls["embed_inputs"] - before
+
+        # Vergleich: alles neu einbetten (leerer Cache, kein Store)
+        conn = sqlite3.connect(db)
+        with conn:
+            conn.execute("DELETE FROM rule_embeddings")
+        conn.close()
+        decision_engine.EMBED_STORE_DIR = ""
+        before = calls["embed_inputs"]
+        t0 = time.perf_counter()
+        await decision_engine.warmup_index()
+        full_s = time.perf_counter() - t0
+        full_embedded = calls["embed_inputs"] - before
+
+    return {
+        "expected": expected,
+        "reload": {**summary, "wall_s": round(reload_s, 3), "embedded_texts": reload_embedded},
+        "full_rebuild": {"wall_s": round(full_s, 3), "embedded_texts": full_embedded},
+        "queries_during_reload": len(latencies),
+        "max_query_ms": round(max(latencies), 2) if latencies else None,
+        "speedup": round(full_s / max(reload_s, 1e-9), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=20000)
+    parser.add_argument("--change", type=float, default=0.01, help="Anteil geänderter Regeln")
+    parser.add_argument("--embed-delay", type=float, default=0.01)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "decision.db"
+        create_rule_db(db, args.rules)
+        decision_engine.DB_PATH = str(db)
+        decision_engine.EMBED_STORE_DIR = str(Path(tmp) / "embedding_store")
+
+        ollama = fake_ollama.create_app(embed_delay=args.embed_delay)
+        with run_server(ollama) as base:
+            decision_engine.OLLAMA_URL = base + "/api/embeddings"
+            decision_engine.OLLAMA_BATCH_URL = base + "/api/embed"
+            result = asyncio.run(run(db, args.rules, args.change, ollama.state.calls))
+
+    print(json.dumps({"benchmark": "decision_reload", "rules": args.rules, "change": args.change, **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# bench_streaming.py – Time-to-first-token über Bridge → Injector → Fake-Ollama
+#
+#   python benchmarks/bench_streaming.py --runs 10 --first-token-delay 0.2 --token-interval 0.02
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+import fake_ollama
+from common import add_service_path, run_server
+
+add_service_path("prompt_injector")
+add_service_path("mini_bridge")
+
+import mini_bridge  # noqa: E402
+import mini_prompt_injector  # noqa: E402
+
+BODY = {"model": "fake", "messages": [{"role": "user", "content": "Erzähl mir etwas."}]}
+
+
+async def measure(url: str, runs: int, stream: bool) -> dict:
+    ttft, total = [], []
+    async with httpx.AsyncClient(timeout=60) as client:
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            first = None
+            if stream:
+                async with client.stream("POST", url, json={**BODY, "stream": True}) as r:
+                    async for line in r.aiter_lines():
+                        if first is None and line.startswith("data: {"):
+                            delta = json.loads(line[6:])["choices"][0]["delta"]
+                            if delta.get("content"):
+                                first = time.perf_counter() - t0
+            else:
+                r = await client.post(url, json=BODY)
+                r.raise_for_status()
+                first = time.perf_counter() - t0
+            ttft.append(first or 0.0)
+            total.append(time.perf_counter() - t0)
+    return {
+        "runs": runs,
+        "ttft_ms_mean": round(sum(ttft) / runs * 1000, 2),
+        "total_ms_mean": round(sum(total) / runs * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    args = parser.parse_args()
+
+    ollama = fake_ollama.create_app(
+        first_token_delay=args.first_token_delay, token_interval=args.token_interval
+    )
+    with run_server(ollama) as ollama_url:
+        mini_prompt_injector.OLLAMA_URL = ollama_url + "/api/chat"
+        with run_server(mini_prompt_injector.app) as injector_url:
+            mini_bridge.PROMPT_INJECTOR_URL = injector_url + "/api/chat"
+            mini_bridge.PROMPT_INJECTOR_STREAM_URL = injector_url + "/api/chat/stream"
+            with run_server(mini_bridge.app) as bridge_url:
+                url = bridge_url + "/v1/chat/completions"
+                report = {
+                    "benchmark": "streaming",
+                    "streaming": asyncio.run(measure(url, args.runs, stream=True)),
+                    "non_streaming": asyncio.run(measure(url, args.runs, stream=False)),
+                }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# bench_suite.py – reproduzierbarer Lasttest über alle Hops mit lokalen Ersatz-Upstreams
+# Startet Fake-Ollama (Chat + Embeddings), dummy_MCP, mcp_time, MCP-Hub, Injector, Bridge und
+# Decision Engine per uvicorn im selben Prozess und fährt jedes Szenario mit fester Concurrency.
+# Ergebnis ist ein JSON-Report (Durchsatz, p50/p95/p99, Time-to-first-token) mit stabilen Keys;
+# mit --baseline wird gegen einen früheren Report verglichen (Exit-Code 1 bei Regression).
+#
+#   python benchmarks/bench_suite.py --requests 500 --concurrency 10 --output report.json
+#   python benchmarks/bench_suite.py --baseline report.json --tolerance 0.25
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+import fake_ollama
+from bench_decision_warmup import create_rule_db
+from common import REPO_ROOT, add_service_path, run_server, summarize
+
+for service in ("dummy_MCP", "mcp_time", "mcp_hub", "prompt_injector", "mini_bridge", "decision_rules"):
+    add_service_path(service)
+
+import decision_engine  # noqa: E402
+import dummy_mcp  # noqa: E402
+import llm_scheduler  # noqa: E402
+import memory_store  # noqa: E402
+import mcp_hub  # noqa: E402
+import mcp_time  # noqa: E402
+import mini_bridge  # noqa: E402
+import mini_prompt_injector  # noqa: E402
+import pre_router  # noqa: E402
+
+REPORT_VERSION = 1
+
+
+def rpc_call(name: str, arguments: dict) -> dict:
+    return {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": name, "arguments": arguments}}
+
+
+# ==================== SZENARIEN ====================
+# Jede Funktion schickt genau einen Request und liefert (ok, ttft in s oder None).
+async def rpc_mcp(client, urls, i):
+    # Bridge → dummy_MCP (per Discovery gefundenes Tool "ping")
+    r = await client.post(urls["bridge"] + "/", json=rpc_call("ping", {}))
+    return r.status_code == 200 and "error" not in r.json(), None
+
+
+async def rpc_chat(client, urls, i):
+    # Bridge → Injector → Fake-Ollama (Textantwort, Pre-Router ohne Treffer)
+    r = await client.post(urls["bridge"] + "/", json=rpc_call("chat", {"prompt": f"Erzähl mir etwas über Nummer {i}."}))
+    return r.status_code == 200 and "error" not in r.json(), None
+
+
+async def rpc_tool(client, urls, i):
+    # Bridge → Injector (Pre-Router-Treffer) → MCP-Hub → mcp_time
+    r = await client.post(urls["bridge"] + "/", json=rpc_call("chat", {"prompt": "Wie spät ist es?"}))
+    return r.status_code == 200 and "error" not in r.json(), None
+
+
+async def chat_completions(client, urls, i):
+    body = {"model": "fake", "messages": [{"role": "user", "content": f"Erzähl mir etwas über Nummer {i}."}]}
+    t0 = time.perf_counter()
+    r = await client.post(urls["bridge"] + "/v1/chat/completions", json=body)
+    ok = r.status_code == 200 and "error" not in r.json()
+    return ok, time.perf_counter() - t0
+
+
+async def chat_completions_stream(client, urls, i):
+    body = {"model": "fake", "stream": True,
+            "messages": [{"role": "user", "content": f"Erzähl mir etwas über Nummer {i}."}]}
+    t0 = time.perf_counter()
+    first = None
+    async with client.stream("POST", urls["bridge"] + "/v1/chat/completions", json=body) as r:
+        async for line in r.aiter_lines():
+            if first is None and line.startswith("data: {"):
+                if json.loads(line[6:])["choices"][0]["delta"].get("content"):
+                    first = time.perf_counter() - t0
+    return r.status_code == 200 and first is not None, first
+
+
+async def decision_query(client, urls, i):
+    # Jede Query ist neu – misst Embedding (Fake-Ollama) plus Matrix-Suche
+    r = await client.post(urls["decision"] + "/query", json={"query": f"frage nummer {i} nach muster{i * 37}"})
+    return r.status_code == 200 and "decision" in r.json(), None
+
+
+SCENARIOS = {
+    "rpc_tools_call_mcp": rpc_mcp,
+    "rpc_tools_call_chat": rpc_chat,
+    "rpc_tools_call_tool": rpc_tool,
+    "chat_completions": chat_completions,
+    "chat_completions_stream": chat_completions_stream,
+    "decision_query": decision_query,
+}
+
+
+# ==================== LAST ====================
+def percentiles(values: list[float]) -> dict:
+    stats = summarize(values, 0)
+    return {key: stats[key] for key in ("p50_ms", "p95_ms", "p99_ms")}
+
+
+async def run_scenario(fn, urls: dict, requests: int, concurrency: int, warmup: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        for i in range(warmup):
+            await fn(client, urls, -1 - i)
+
+        latencies, ttfts = [], []
+        errors = 0
+        counter = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                t = time.perf_counter()
+                try:
+                    ok, ttft = await fn(client, urls, i)
+                except (httpx.HTTPError, ValueError, KeyError):
+                    ok, ttft = False, None
+                latencies.append(time.perf_counter() - t)
+                if not ok:
+                    errors += 1
+                elif ttft is not None:
+                    ttfts.append(ttft)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+
+    result = {**summarize(latencies, wall), "concurrency": concurrency, "errors": errors}
+    if ttfts:
+        result["ttft"] = percentiles(ttfts)
+    return result
+
+
+def wait_until(check, what: str, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{what} nicht bereit nach {timeout:.0f}s")
+        time.sleep(0.05)
+
+
+def decision_ready(url: str) -> bool:
+    try:
+        return httpx.get(url + "/health", timeout=5).json()["status"] == "ok"
+    except (httpx.HTTPError, KeyError, ValueError):
+        return False
+
+
+def run_suite(args, tmp: Path) -> dict:
+    # Regeln: Pre-Router nutzt die echte decision.db, die Decision Engine eine synthetische
+    preroute_db = tmp / "decision.db"
+    shutil.copy(REPO_ROOT / "decision_rules" / "decision.db", preroute_db)
+    pre_router.DECISION_DB_PATH = str(preroute_db)
+    pre_router.PREROUTE_ENABLED = True   # opt-in, Szenario rpc_tools_call_tool braucht es
+    engine_db = tmp / "engine.db"
+    create_rule_db(engine_db, args.rules)
+    decision_engine.DB_PATH = str(engine_db)
+    decision_engine.EMBED_STORE_DIR = str(tmp / "embedding_store")
+    decision_engine.RULE_WATCH_INTERVAL = 0
+    # Fake-Ollama rechnet parallel – Admission Control soll hier nichts ablehnen
+    llm_scheduler.LLM_MAX_CONCURRENCY = args.llm_concurrency or args.concurrency
+    llm_scheduler.LLM_MAX_QUEUE = args.concurrency
+    memory_store.MEMORY_DB_PATH = str(tmp / "memory.db")
+    memory_store.CONTEXT_WINDOWS_PATH = str(REPO_ROOT / "anythingllm_data" / "models" / "context-windows" / "context-windows.json")
+
+    ollama = fake_ollama.create_app(
+        first_token_delay=args.first_token_delay,
+        token_interval=args.token_interval,
+        embed_delay=args.embed_delay,
+    )
+    results = {}
+    with run_server(ollama) as ollama_url, run_server(mcp_time.app) as time_url, \
+            run_server(dummy_mcp.app) as dummy_url:
+        registry = tmp / "mcp_registry.json"
+        registry.write_text(json.dumps({"servers": [
+            {"id": "time", "url": time_url},
+            {"id": "dummy", "url": dummy_url},
+        ]}))
+        mcp_hub.REGISTRY_PATH = str(registry)
+        mini_bridge.REGISTRY_PATH = str(registry)
+        mini_prompt_injector.OLLAMA_URL = ollama_url + "/api/chat"
+        decision_engine.OLLAMA_URL = ollama_url + "/api/embeddings"
+        decision_engine.OLLAMA_BATCH_URL = ollama_url + "/api/embed"
+
+        with run_server(mcp_hub.app) as hub_url:
+            mini_prompt_injector.MCP_HUB_URL = hub_url
+            with run_server(mini_prompt_injector.app) as injector_url:
+                mini_bridge.PROMPT_INJECTOR_URL = injector_url + "/api/chat"
+                mini_bridge.PROMPT_INJECTOR_STREAM_URL = injector_url + "/api/chat/stream"
+                with run_server(mini_bridge.app) as bridge_url, run_server(decision_engine.app) as decision_url:
+                    urls = {"bridge": bridge_url, "decision": decision_url}
+                    wait_until(lambda: "ping" in mini_bridge.TOOL_OWNERS, "Tool-Discovery der Bridge")
+                    wait_until(lambda: decision_ready(decision_url), "Decision Engine", timeout=600)
+                    for name in args.scenarios:
+                        results[name] = asyncio.run(
+                            run_scenario(SCENARIOS[name], urls, args.requests, args.concurrency, args.warmup)
+                        )
+                        print(f"{name}: {results[name]['throughput_rps']} req/s, "
+                              f"p95 {results[name]['p95_ms']} ms, {results[name]['errors']} Fehler", file=sys.stderr)
+    return results
+
+
+# ==================== VERGLEICH ====================
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressionen gegenüber einem früheren Report: p95 (auch TTFT) höher bzw. Durchsatz niedriger."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        checks = [("p95_ms", current["p95_ms"], before["p95_ms"], True),
+                  ("throughput_rps", current["throughput_rps"], before["throughput_rps"], False)]
+        if "ttft" in current and "ttft" in before:
+            checks.append(("ttft.p95_ms", current["ttft"]["p95_ms"], before["ttft"]["p95_ms"], True))
+        for metric, now, then, lower_is_better in checks:
+            if not then:
+                continue
+            change = (now - then) / then
+            if (change > tolerance) if lower_is_better else (change < -tolerance):
+                regressions.append(f"{name}.{metric}: {then} → {now} ({change:+.0%})")
+        if current["errors"] > before.get("errors", 0):
+            regressions.append(f"{name}.errors: {before.get('errors', 0)} → {current['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500, help="gemessene Requests pro Szenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=20, help="ungemessene Requests vorab")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--rules", type=int, default=2000, help="Regeln für die Decision Engine")
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    parser.add_argument("--embed-delay", type=float, default=0.005)
+    parser.add_argument("--llm-concurrency", type=int, default=0,
+                        help="Ollama-Slots im Injector (0 = wie --concurrency)")
+    parser.add_argument("--output", help="Report zusätzlich in diese Datei schreiben")
+    parser.add_argument("--baseline", help="früherer Report zum Vergleich")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="erlaubte relative Verschlechterung")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scenarios = run_suite(args, Path(tmp))
+
+    report = {
+        "benchmark": "suite",
+        "version": REPORT_VERSION,
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "rules": args.rules,
+            "first_token_delay": args.first_token_delay,
+            "token_interval": args.token_interval,
+            "embed_delay": args.embed_delay,
+            "llm_concurrency": args.llm_concurrency or args.concurrency,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "scenarios": scenarios,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# bench_tracing.py – Kosten des Tracings und Aufschlüsselung eines Requests nach Hops
+# Kette: Bridge (tools/call "chat") → Injector → Fake-Ollama (Tool-JSON) → MCP-Hub → mcp_time.
+# Läuft einmal ohne und einmal mit Tracing (Export als OTLP-JSON in eine temporäre Datei).
+# In-process teilen sich alle Services ein tracing-Modul, service.name ist daher nicht aussagekräftig.
+#
+#   python benchmarks/bench_tracing.py --runs 200 --llm-delay 0.01
+
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+import fake_ollama
+from common import add_service_path, run_server, summarize
+
+for service in ("mini_bridge", "prompt_injector", "mcp_hub", "mcp_time"):
+    add_service_path(service)
+
+import mcp_hub  # noqa: E402
+import mcp_time  # noqa: E402
+import mini_bridge  # noqa: E402
+import mini_prompt_injector  # noqa: E402
+import pre_router  # noqa: E402
+import tracing  # noqa: E402
+
+TOOL_REPLY = json.dumps({"action": "mcp_call", "tool": "time", "query": "Wie spät ist es?"})
+
+
+async def measure(url: str, runs: int) -> dict:
+    latencies = []
+    payload = {"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+               "params": {"name": "chat", "arguments": {"prompt": "Wie spät ist es?"}}}
+    async with httpx.AsyncClient(timeout=60) as client:
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            t = time.perf_counter()
+            r = await client.post(url, json=payload)
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t)
+        wall = time.perf_counter() - t0
+    return summarize(latencies, wall)
+
+
+def last_trace(path: Path) -> list:
+    """Spans des zuletzt begonnenen Traces, als Baum sortiert nach Startzeit."""
+    spans = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        for resource in json.loads(line)["resourceSpans"]:
+            for scope in resource["scopeSpans"]:
+                spans += scope["spans"]
+    root = max((s for s in spans if "parentSpanId" not in s), key=lambda s: int(s["startTimeUnixNano"]))
+    trace = sorted((s for s in spans if s["traceId"] == root["traceId"]), key=lambda s: int(s["startTimeUnixNano"]))
+    by_id = {s["spanId"]: s for s in trace}
+
+    def depth(s):
+        return 0 if s.get("parentSpanId") not in by_id else 1 + depth(by_id[s["parentSpanId"]])
+
+    start = int(root["startTimeUnixNano"])
+    return [
+        "  " * depth(s) + f"{s['name']}: +{(int(s['startTimeUnixNano']) - start) / 1e6:.2f} ms, "
+        f"{(int(s['endTimeUnixNano']) - int(s['startTimeUnixNano'])) / 1e6:.2f} ms"
+        for s in trace
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--llm-delay", type=float, default=0.01)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    pre_router.PREROUTE_ENABLED = False   # Weg über das LLM, damit alle Hops im Trace stehen
+
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_file = Path(tmp) / "traces.jsonl"
+        ollama = fake_ollama.create_app(reply=TOOL_REPLY, first_token_delay=args.llm_delay, token_interval=0)
+        with run_server(ollama) as ollama_url, run_server(mcp_time.app) as time_url:
+            registry = Path(tmp) / "mcp_registry.json"
+            registry.write_text(json.dumps({"servers": [{"id": "time", "url": time_url}]}))
+            mcp_hub.REGISTRY_PATH = str(registry)
+            mini_bridge.REGISTRY_PATH = str(Path(tmp) / "none.json")
+            with run_server(mcp_hub.app) as hub_url:
+                mini_prompt_injector.OLLAMA_URL = ollama_url + "/api/chat"
+                mini_prompt_injector.MCP_HUB_URL = hub_url
+                with run_server(mini_prompt_injector.app) as injector_url:
+                    mini_bridge.PROMPT_INJECTOR_URL = injector_url + "/api/chat"
+                    with run_server(mini_bridge.app) as bridge_url:
+                        tracing.ENABLED = False
+                        off = asyncio.run(measure(bridge_url + "/", args.runs))
+                        tracing.ENABLED = True
+                        tracing.TRACE_EXPORT_FILE = str(trace_file)
+                        on = asyncio.run(measure(bridge_url + "/", args.runs))
+                        tracing.ENABLED = False
+                        queued = len(tracing.QUEUE)
+                        asyncio.run(tracing.flush())
+        breakdown = last_trace(trace_file)
+
+    print(json.dumps({
+        "benchmark": "tracing",
+        "runs": args.runs,
+        "tracing_off": off,
+        "tracing_on": on,
+        "spans_exported": queued,
+        "last_trace": breakdown,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# bench_workers.py – Durchsatz der Decision Engine mit 1 vs. N uvicorn-Workern
+# Startet decision_engine als eigenen Prozess (uvicorn --workers N) gegen eine temporäre
+# decision.db und den Fake-Ollama; Last kommt aus mehreren Client-Prozessen.
+# Zusätzlich: PSS aller Worker (/proc/<pid>/smaps_rollup) – der per mmap geteilte Index
+# wird dabei anteilig gezählt, nicht pro Worker.
+#
+#   python benchmarks/bench_workers.py --rules 20000 --workers 1 4 --requests 4000
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+import fake_ollama
+from bench_decision_warmup import create_rule_db
+from common import REPO_ROOT, free_port, run_server, summarize
+
+QUERIES = [f"frage nummer {i} nach muster{i * 37}" for i in range(16)]
+
+
+def pss_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def wait_ready(url: str, workers: int, timeout: float = 300) -> set:
+    """Fragt /health, bis N verschiedene Worker-PIDs 'ok' gemeldet haben."""
+    ready = set()
+    deadline = time.monotonic() + timeout
+    while len(ready) < workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"nur {len(ready)}/{workers} Worker bereit")
+        try:
+            # Neue Verbindung pro Abfrage – Keep-Alive würde immer denselben Worker treffen
+            health = httpx.get(url + "/health", timeout=5).json()
+            if health["status"] == "ok" and health["rules_loaded"]:
+                ready.add(health["pid"])
+        except (httpx.HTTPError, KeyError, ValueError):
+            time.sleep(0.2)
+    return ready
+
+
+def client_process(url: str, requests: int, concurrency: int, queue):
+    async def run():
+        latencies = []
+        counter = iter(range(requests))
+        async with httpx.AsyncClient(timeout=60) as client:
+            async def worker():
+                for i in counter:
+                    t = time.perf_counter()
+                    r = await client.post(url + "/query", json={"query": QUERIES[i % len(QUERIES)]})
+                    r.raise_for_status()
+                    latencies.append(time.perf_counter() - t)
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies
+    queue.put(asyncio.run(run()))
+
+
+def load_test(url: str, requests: int, clients: int, concurrency: int) -> dict:
+    # Warm-up: jede Query mehrfach über neue Verbindungen, damit Query-Embeddings im Cache liegen
+    for _ in range(4):
+        for q in QUERIES:
+            httpx.post(url + "/query", json={"query": q}, timeout=60)
+
+    queue = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=client_process, args=(url, requests // clients, concurrency, queue))
+        for _ in range(clients)
+    ]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    latencies = [lat for _ in procs for lat in queue.get()]
+    wall = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    return summarize(latencies, wall)
+
+
+def run_engine(workers: int, db: Path, ollama_url: str, args) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as shared:
+        env = dict(
+            os.environ,
+            DECISION_DB_PATH=str(db),
+            OLLAMA_EMBED_URL=ollama_url + "/api/embeddings",
+            EMBED_STORE_DIR=shared,
+            WEB_CONCURRENCY=str(workers),
+            PYTHONPATH=str(REPO_ROOT / "shared"),
+        )
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "decision_engine:app", "--host", "127.0.0.1",
+             "--port", str(port), "--log-level", "warning"],
+            cwd=REPO_ROOT / "decision_rules", env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            t0 = time.perf_counter()
+            pids = wait_ready(url, workers)
+            startup = time.perf_counter() - t0
+            result = load_test(url, args.requests, args.clients, args.concurrency)
+            pss = [pss_mb(pid) for pid in pids]
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    return {
+        "workers": workers,
+        "startup_s": round(startup, 2),
+        "pss_mb_total": round(sum(p for p in pss if p), 1) if any(pss) else None,
+        **result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 2])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "decision.db"
+        create_rule_db(db, args.rules)
+        with run_server(fake_ollama.create_app()) as ollama_url:
+            for workers in args.workers:
+                results.append(run_engine(workers, db, ollama_url, args))
+
+    base = results[0]["throughput_rps"] or 1
+    print(json.dumps({
+        "benchmark": "workers",
+        "rules": args.rules,
+        "cpu_count": os.cpu_count(),
+        "runs": results,
+        "scaling": {r["workers"]: round(r["throughput_rps"] / base, 2) for r in results},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# common.py – Hilfsfunktionen für die Benchmarks
+# Startet ASGI-Apps in-process per uvicorn und wertet Latenzen aus.
+
+import contextlib
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import uvicorn
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def add_service_path(service_dir: str):
+    """Macht ein Service-Verzeichnis (z. B. 'mcp_hub') und die gemeinsamen Module importierbar."""
+    for path in (str(REPO_ROOT / "shared"), str(REPO_ROOT / service_dir)):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def run_server(app, port: int | None = None):
+    """Startet eine ASGI-App in einem Hintergrund-Thread, liefert die Basis-URL."""
+    port = port or free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def summarize(latencies: list[float], wall: float) -> dict:
+    """Durchsatz und Perzentile (in ms) einer Messreihe."""
+    ordered = sorted(latencies)
+
+    def pct(p):
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / wall, 1) if wall else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+    }
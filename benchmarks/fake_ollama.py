@@ -0,0 +1,78 @@
+# fake_ollama.py – deterministischer Ollama-Ersatz für Benchmarks
+# Unterstützt /api/chat (stream + non-stream), /api/embeddings und /api/embed (Batch).
+
+import asyncio
+import contextlib
+import hashlib
+import json
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    """Stabiler Pseudo-Vektor pro Text (gleicher Text → gleicher Vektor)."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32).tolist()
+
+
+def create_app(
+    reply: str = "Das ist eine Testantwort des lokalen Fake-Modells.",
+    first_token_delay: float = 0.05,
+    token_interval: float = 0.01,
+    embed_delay: float = 0.005,
+    embed_dim: int = 256,
+    batch_embeddings: bool = True,
+    gpu_slots: int = 0,
+) -> FastAPI:
+    """gpu_slots > 0: höchstens so viele Chat-Generierungen gleichzeitig, der Rest wartet (wie eine lokale GPU)."""
+    app = FastAPI(title="Fake Ollama")
+    app.state.calls = {"chat": 0, "embed": 0, "embed_inputs": 0}
+    gpu = asyncio.Semaphore(gpu_slots) if gpu_slots else contextlib.nullcontext()
+    tokens = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.calls["chat"] += 1
+        model = body.get("model", "fake")
+        text = body.get("_reply", reply)
+
+        if not body.get("stream", True):
+            async with gpu:
+                await asyncio.sleep(first_token_delay + token_interval * len(tokens))
+            return {"model": model, "message": {"role": "assistant", "content": text}, "done": True}
+
+        async def generate():
+            async with gpu:
+                await asyncio.sleep(first_token_delay)
+                for tok in tokens:
+                    yield json.dumps({"model": model, "message": {"role": "assistant", "content": tok}, "done": False}) + "\n"
+                    await asyncio.sleep(token_interval)
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.calls["embed"] += 1
+        app.state.calls["embed_inputs"] += 1
+        await asyncio.sleep(embed_delay)
+        text = body.get("input") or body.get("prompt") or ""
+        return {"embedding": fake_embedding(text, embed_dim)}
+
+    if batch_embeddings:
+        @app.post("/api/embed")
+        async def embed(request: Request):
+            body = await request.json()
+            inputs = body.get("input") or []
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            app.state.calls["embed"] += 1
+            app.state.calls["embed_inputs"] += len(inputs)
+            await asyncio.sleep(embed_delay)
+            return {"embeddings": [fake_embedding(t, embed_dim) for t in inputs]}
+
+    return app
@@ -0,0 +1,51 @@
+# test_decision_api.py – Eingabeprüfung der Decision-Engine-Endpoints
+#
+#   python -m pytest benchmarks/ -q
+
+import asyncio
+
+import httpx
+import pytest
+
+from common import add_service_path
+
+add_service_path("decision_rules")
+
+import decision_engine  # noqa: E402
+
+
+def post(path: str, content: bytes) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=decision_engine.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://engine") as client:
+            return await client.post(path, content=content, headers={"Content-Type": "application/json"})
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("body", [b"{kaputt", b"[1, 2]", b'"text"'])
+@pytest.mark.parametrize("path", ["/query", "/reload"])
+def test_malformed_body_is_rejected(path, body):
+    resp = post(path, body)
+    assert resp.status_code == 400
+    assert resp.json()["error"]
+
+
+@pytest.mark.parametrize("field, value", [
+    ("top_k", "drei"), ("top_k", 0), ("top_k", 2.5), ("top_k", True), ("nprobe", -1), ("nprobe", [4]),
+])
+def test_invalid_numbers_are_rejected(field, value):
+    resp = post("/query", httpx.Request("POST", "/", json={"query": "Licht an", field: value}).read())
+    assert resp.status_code == 400
+    assert field in resp.json()["error"]
+
+
+def test_non_string_query_is_rejected():
+    assert post("/query", b'{"query": 42}').status_code == 400
+
+
+@pytest.mark.parametrize("language", [42, ["de"], {"code": "de"}])
+def test_non_string_language_is_rejected(language):
+    resp = post("/query", httpx.Request("POST", "/", json={"query": "Licht an", "language": language}).read())
+    assert resp.status_code == 400
+    assert "language" in resp.json()["error"]
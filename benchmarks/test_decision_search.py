@@ -0,0 +1,79 @@
+# test_decision_search.py – Partitionierte Suche mit IVF-Index in den gewählten Partitionen
+#
+#   python -m pytest benchmarks/ -q
+
+import numpy as np
+import pytest
+
+from common import add_service_path
+
+add_service_path("decision_rules")
+
+import decision_engine  # noqa: E402
+
+DIM = 32
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """2 Sprachen × 4 Kategorien × 60 Regeln, jede Kategorie ein eigener Cluster."""
+    monkeypatch.setattr(decision_engine, "ANN_INDEX", "ivf")
+    monkeypatch.setattr(decision_engine, "ANN_MIN_RULES", 50)
+    monkeypatch.setattr(decision_engine, "ANN_NLIST", 8)
+    monkeypatch.setattr(decision_engine, "EMBED_STORE_DIR", "")
+    monkeypatch.setattr(decision_engine, "PARTITION_SEARCH", True)
+    monkeypatch.setattr(decision_engine, "CATEGORY_PROBE", 1)
+    rng = np.random.default_rng(0)
+    rules, vectors = [], []
+    for lang in ("de", "en"):
+        for cat in range(4):
+            center = rng.standard_normal(DIM)
+            for i in range(60):
+                rules.append({"id": f"{lang}_{cat}_{i}", "tool": f"tool_{cat}", "pattern": f"p{lang}{cat}{i}",
+                              "language": lang, "category": f"cat_{cat}"})
+                vectors.append(center + 0.3 * rng.standard_normal(DIM))
+    built = decision_engine.build_index(rules, vectors)
+    built["ann"] = decision_engine.build_ann_index(built)
+    built["partitions"] = decision_engine.build_partitions(built)
+    return built
+
+
+def test_ann_runs_inside_selected_partitions(index, monkeypatch):
+    calls = []
+    search = index["ann"].search
+
+    def spy(query, k, nprobe=None, allowed=None):
+        calls.append((nprobe, allowed))
+        return search(query, k, nprobe, allowed)
+
+    monkeypatch.setattr(index["ann"], "search", spy)
+    target = 60 + 17                                     # de, Kategorie 1
+    query = np.asarray(index["matrix"][target])
+
+    matches = decision_engine.top_k_matches(index, query, 5, nprobe=3, language="de")
+
+    assert matches[0]["id"] == "de_1_17"
+    assert {m["language"] for m in matches} == {"de"}
+    assert len(calls) == 1
+    nprobe, allowed = calls[0]
+    assert nprobe == 3
+    assert allowed.sum() == 60 and allowed[60:120].all()   # nur die gewählte Partition
+
+
+def test_small_partitions_stay_exact(index, monkeypatch):
+    monkeypatch.setattr(decision_engine, "ANN_MIN_RULES", 1000)
+    monkeypatch.setattr(index["ann"], "search", lambda *a, **kw: pytest.fail("ANN bei kleiner Auswahl"))
+    query = np.asarray(index["matrix"][240 + 60 + 20])          # en, Kategorie 1
+    assert decision_engine.top_k_matches(index, query, 3, language="en")[0]["id"] == "en_1_20"
+
+
+def test_guessed_language_falls_back_to_all_languages(index, monkeypatch):
+    monkeypatch.setattr(decision_engine, "PARTITION_FALLBACK", True)
+    query = np.asarray(index["matrix"][240 + 120 + 5])           # en, Kategorie 2
+    # Falsch geratene Sprache: ohne Treffer in "de" wird über alle Regeln gesucht
+    guessed = decision_engine.top_k_matches(index, query, 3, nprobe=8, language="de", language_guessed=True)
+    assert guessed[0]["id"] == "en_2_5"
+    # Vom Client vorgegebene Sprache bleibt verbindlich
+    given = decision_engine.top_k_matches(index, query, 3, nprobe=8, language="de")
+    assert {m["language"] for m in given} == {"de"}
+    assert given[0]["score"] < decision_engine.SIMILARITY_THRESHOLD
@@ -0,0 +1,134 @@
+# test_decision_warmup.py – Verhaltenstests für den Warm-up der Decision Engine gegen den Fake-Ollama
+#
+#   python -m pytest benchmarks/ -q
+
+import asyncio
+import time
+
+import httpx
+import numpy as np
+import pytest
+
+import fake_ollama
+from bench_decision_warmup import create_rule_db
+from common import run_server
+
+import decision_engine  # noqa: E402  (Pfad setzt bench_decision_warmup via add_service_path)
+
+RULES = 24
+BATCH = 4
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Frischer Modulzustand, temporäre decision.db, kein Store/Watcher."""
+    db = tmp_path / "decision.db"
+    create_rule_db(db, RULES)
+    monkeypatch.setattr(decision_engine, "DB_PATH", str(db))
+    monkeypatch.setattr(decision_engine, "EMBED_STORE_DIR", "")
+    monkeypatch.setattr(decision_engine, "RULE_WATCH_INTERVAL", 0)
+    monkeypatch.setattr(decision_engine, "EMBED_BATCH_SIZE", BATCH)
+    monkeypatch.setattr(decision_engine, "EMBED_CONCURRENCY", 1)
+    monkeypatch.setattr(decision_engine, "BATCH_SUPPORTED", True)
+    monkeypatch.setattr(decision_engine, "RULE_INDEX", {"rules": [], "matrix": np.zeros((0, 0), dtype=np.float32),
+                                                        "ready": None})
+    monkeypatch.setattr(decision_engine, "WARMUP", dict(decision_engine.WARMUP, state="idle"))
+    return decision_engine
+
+
+def point_at(engine, base: str):
+    engine.OLLAMA_URL = base + "/api/embeddings"
+    engine.OLLAMA_BATCH_URL = base + "/api/embed"
+
+
+def test_health_reports_warming_during_progressive_load(engine):
+    ollama = fake_ollama.create_app(embed_delay=0.1)
+    with run_server(ollama) as base:
+        point_at(engine, base)
+        with run_server(engine.app) as url:
+            seen, deadline = [], time.monotonic() + 30
+            while time.monotonic() < deadline:
+                health = httpx.get(url + "/health").json()
+                seen.append((health["status"], health["rules_loaded"]))
+                if health["status"] == "ok":
+                    break
+                time.sleep(0.02)
+
+    assert any(status == "warming" and 0 < loaded < RULES for status, loaded in seen), seen
+    assert seen[-1] == ("ok", RULES)
+    assert health["warmup"]["progress"] == 1.0
+
+
+def test_batch_endpoint_missing_falls_back_to_single_requests(engine):
+    ollama = fake_ollama.create_app(embed_delay=0, batch_embeddings=False)
+    with run_server(ollama) as base:
+        point_at(engine, base)
+
+        async def warm_up():
+            async with httpx.AsyncClient(timeout=30) as client:
+                engine.EMBED_CLIENT = client
+                await engine.load_rules_with_embeddings()
+
+        asyncio.run(warm_up())
+
+    assert engine.BATCH_SUPPORTED is False
+    assert ollama.state.calls["embed"] == RULES     # ein Request pro Regel über /api/embeddings
+    assert engine.WARMUP["state"] == "ready" and engine.WARMUP["failed"] == 0
+    assert len(engine.RULE_INDEX["rules"]) == RULES
+
+
+def test_partially_ready_rules_are_excluded_from_matches(engine):
+    ollama = fake_ollama.create_app(embed_delay=0.2)
+    rules = engine.load_rule_rows()
+    last = rules[-1]                      # wird mit EMBED_CONCURRENCY=1 als letzte eingebettet
+    query = fake_ollama.fake_embedding(last["pattern"], 256)
+
+    with run_server(ollama) as base:
+        point_at(engine, base)
+
+        async def query_while_warming():
+            async with httpx.AsyncClient(timeout=30) as client:
+                engine.EMBED_CLIENT = client
+                task = asyncio.create_task(engine.load_rules_with_embeddings())
+                while engine.WARMUP["done"] < BATCH:
+                    await asyncio.sleep(0.01)
+                index = engine.RULE_INDEX
+                partial = (engine.WARMUP["state"], index["ready"].copy(),
+                           engine.top_k_matches(index, query, RULES))
+                await task
+                return partial, engine.top_k_matches(engine.RULE_INDEX, query, 1)
+
+        (state, ready, during), after = asyncio.run(query_while_warming())
+
+    ready_ids = {rules[i]["id"] for i in np.flatnonzero(ready)}
+    assert state == "warming" and 0 < len(ready_ids) < RULES
+    assert during and {m["id"] for m in during} <= ready_ids
+    assert last["id"] not in ready_ids
+    # Nach dem Warm-up ist dieselbe Regel der exakte Treffer
+    assert after[0]["id"] == last["id"] and after[0]["score"] > 0.99
+
+
+def test_batch_with_wrong_dimension_counts_as_failed(engine, monkeypatch):
+    embed_many = engine.embed_many
+    batches = []
+
+    async def mixed_dimensions(client, texts):
+        batches.append(texts)
+        embeddings = await embed_many(client, texts)
+        # Zweiter Batch kommt mit anderer Dimension zurück (z. B. Modellwechsel mitten im Warm-up)
+        return [e[:128] for e in embeddings] if len(batches) == 2 else embeddings
+
+    monkeypatch.setattr(engine, "embed_many", mixed_dimensions)
+    ollama = fake_ollama.create_app(embed_delay=0)
+    with run_server(ollama) as base:
+        point_at(engine, base)
+
+        async def warm_up():
+            async with httpx.AsyncClient(timeout=30) as client:
+                engine.EMBED_CLIENT = client
+                await engine.load_rules_with_embeddings()
+
+        asyncio.run(warm_up())
+
+    assert engine.WARMUP["failed"] == BATCH
+    assert len(engine.RULE_INDEX["rules"]) == RULES - BATCH
@@ -0,0 +1,90 @@
+# test_llm_scheduler.py – Single-Flight und Warteschlange des LLM-Schedulers
+#
+#   python -m pytest benchmarks/ -q
+
+import asyncio
+
+import pytest
+
+from common import add_service_path
+
+add_service_path("prompt_injector")
+
+import llm_scheduler  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "_GATES", {})
+    monkeypatch.setattr(llm_scheduler, "_INFLIGHT", {})
+    monkeypatch.setattr(llm_scheduler, "LLM_COALESCE", True)
+    monkeypatch.setattr(llm_scheduler, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(llm_scheduler, "LLM_MAX_QUEUE", 8)
+    monkeypatch.setattr(llm_scheduler, "LLM_QUEUE_TIMEOUT", 5.0)
+
+
+def test_cancelled_leader_keeps_generation_for_followers():
+    generations = []
+
+    async def call():
+        generations.append(1)
+        await asyncio.sleep(0.1)
+        return {"message": {"content": "42"}}
+
+    async def scenario():
+        payload = {"prompt": "Frage"}
+        leader = asyncio.create_task(llm_scheduler.run("m", payload, 0, call))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(llm_scheduler.run("m", payload, 0, call))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await follower
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return result
+
+    assert asyncio.run(scenario()) == {"message": {"content": "42"}}
+    assert generations == [1]
+    assert not llm_scheduler._INFLIGHT
+    assert llm_scheduler.gate("m").active == 0
+
+
+def test_generation_is_cancelled_when_every_caller_left():
+    async def scenario():
+        state = {"cancelled": False}
+
+        async def call():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        callers = [asyncio.create_task(llm_scheduler.run("m", {"prompt": "x"}, 0, call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for task in callers:
+            task.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return state["cancelled"]
+
+    assert asyncio.run(scenario()) is True
+    assert not llm_scheduler._INFLIGHT
+    assert llm_scheduler.gate("m").active == 0
+
+
+def test_timed_out_waiter_already_popped_by_release():
+    async def scenario():
+        g = llm_scheduler.gate("m")
+        await g.acquire(0)                       # Slot belegt
+        waiter = asyncio.create_task(g.acquire(1))
+        await asyncio.sleep(0)
+        entry = g.waiters[0]
+        entry[2].cancel()                        # Future abgebrochen (wie durch wait_for) …
+        g.release()                              # … und release() entfernt den Eintrag schon
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return g
+
+    g = asyncio.run(scenario())
+    assert g.waiters == [] and g.active == 0
@@ -0,0 +1,108 @@
+# test_mcp_hub.py – Registry-Fallback und Routing des MCP-Hubs
+#
+#   python -m pytest benchmarks/ -q
+
+import asyncio
+import json
+import logging
+
+import httpx
+import pytest
+
+from common import add_service_path
+
+add_service_path("mcp_hub")
+
+import mcp_hub  # noqa: E402
+
+
+@pytest.fixture
+def hub(tmp_path, monkeypatch):
+    monkeypatch.setattr(mcp_hub, "REGISTRY_PATH", str(tmp_path / "mcp_registry.json"))
+    monkeypatch.setattr(mcp_hub, "REGISTRY_STATE", {"source": "builtin", "mtime": None, "auto_reload": False,
+                                                    "loaded_at": None, "missing": False})
+    monkeypatch.setattr(mcp_hub, "TOOLS", {})
+    monkeypatch.setattr(mcp_hub, "CLIENTS", {})
+    return mcp_hub
+
+
+def test_missing_registry_applies_builtin_once(hub, monkeypatch, caplog):
+    applied = []
+    apply_registry = hub.apply_registry
+
+    def spy(registry, source, mtime=None):
+        applied.append(source)
+        apply_registry(registry, source, mtime)
+
+    monkeypatch.setattr(hub, "apply_registry", spy)
+
+    async def polls():
+        with caplog.at_level(logging.WARNING, logger=hub.logger.name):
+            for _ in range(5):
+                hub.load_registry()
+            with open(hub.REGISTRY_PATH, "w") as f:
+                json.dump({"servers": [{"id": "time", "url": "http://time"}]}, f)
+            hub.load_registry()
+            hub.os.remove(hub.REGISTRY_PATH)
+            for _ in range(5):
+                hub.load_registry()
+
+    asyncio.run(polls())
+    assert applied == ["builtin", hub.REGISTRY_PATH]
+    assert hub.TOOLS == {"time": "http://time"}          # Routen bleiben nach dem Löschen erhalten
+    assert len([r for r in caplog.records if "fehlt" in r.getMessage()]) == 2
+
+
+def test_cancelled_leader_does_not_cancel_coalesced_callers(hub, monkeypatch):
+    calls = []
+
+    async def slow_tool(tool, target_url, client, timeout, body):
+        calls.append(body["id"])
+        await asyncio.sleep(0.2)
+        return {"tool": tool, "status": "ok", "elapsed": 0.2, "result": {"content": "12:00"}}
+
+    monkeypatch.setattr(hub, "forward_to_tool", slow_tool)
+    monkeypatch.setattr(hub, "TOOLS", {"time": "http://time"})
+    monkeypatch.setattr(hub, "TOOL_CACHE_TTLS", {"time": 60.0})
+    monkeypatch.setattr(hub, "RESPONSE_CACHE", hub.OrderedDict())
+    monkeypatch.setattr(hub, "RESPONSE_CACHE_STATS", dict.fromkeys(hub.RESPONSE_CACHE_STATS, 0))
+    body = {"jsonrpc": "2.0", "method": "tools/call", "params": {"name": "time", "arguments": {}}}
+
+    async def scenario():
+        leader = asyncio.create_task(hub.route_call("time", {**body, "id": 1}))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(hub.route_call("time", {**body, "id": 2}))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await follower
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return result
+
+    result = asyncio.run(scenario())
+    assert calls == [1]
+    assert result["status"] == "ok" and result["result"] == {"content": "12:00"}
+    assert hub.cache_get(hub.cache_key("time", {**body, "id": 3})) is not None
+    assert not hub.INFLIGHT
+
+
+def test_client_disconnect_is_not_a_tool_failure(hub, monkeypatch):
+    monkeypatch.setattr(hub, "BREAKERS", {})
+    monkeypatch.setattr(hub, "BREAKER_MIN_CALLS", 2)
+
+    async def hanging(request):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(hanging)) as client:
+            for i in range(5):
+                call = asyncio.create_task(hub.forward_to_tool("time", "http://time/", client, 20.0, {"id": i}))
+                await asyncio.sleep(0.01)
+                call.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await call
+
+    asyncio.run(scenario())
+    breaker = hub.get_breaker("time")
+    assert breaker["state"] == "closed"
+    assert list(breaker["calls"]) == []
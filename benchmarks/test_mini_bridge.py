@@ -0,0 +1,90 @@
+# test_mini_bridge.py – JSON-RPC-Fehlerpfade der Bridge
+#
+#   python -m pytest benchmarks/ -q
+
+import asyncio
+
+import httpx
+import pytest
+
+from common import add_service_path
+
+add_service_path("mini_bridge")
+
+import mini_bridge  # noqa: E402
+
+OWNER = {"server": "broken", "url": "http://broken/", "timeout": 5.0}
+
+
+def call_with_upstream(monkeypatch, handler):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            monkeypatch.setattr(mini_bridge, "MCP_CLIENT", client)
+            return await mini_bridge.call_server_tool(7, "broken_tool", {}, OWNER)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("body", [b"[1, 2, 3]", b"42", b'"nur text"', b"<html>502</html>"])
+def test_non_object_bodies_become_results(monkeypatch, body):
+    response = call_with_upstream(monkeypatch, lambda request: httpx.Response(200, content=body))
+    assert response["id"] == 7
+    assert response["result"]["content"][0]["type"] == "text"
+
+
+def test_string_error_is_wrapped_as_jsonrpc_error(monkeypatch):
+    response = call_with_upstream(monkeypatch, lambda request: httpx.Response(200, json={"error": "kaputt"}))
+    assert response["error"] == {"code": -32603, "message": "kaputt"}
+
+
+def test_unexpected_exception_returns_internal_error(monkeypatch):
+    def handler(request):
+        raise RuntimeError("Transport explodiert")
+
+    response = call_with_upstream(monkeypatch, handler)
+    assert response["id"] == 7
+    assert response["error"]["code"] == -32603
+    assert "Transport explodiert" in response["error"]["message"]
+
+
+def test_batch_isolates_failing_items(monkeypatch):
+    async def explode(req_id, params):
+        raise RuntimeError("Handler kaputt")
+
+    monkeypatch.setitem(mini_bridge.METHOD_HANDLERS, "tools/call", explode)
+    batch = [
+        {"jsonrpc": "2.0", "id": 1, "method": "ping"},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": {"name": "chat"}},
+        {"jsonrpc": "2.0", "method": "tools/call", "params": {"name": "chat"}},   # Notification
+    ]
+    transport = httpx.ASGITransport(app=mini_bridge.app)
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport, base_url="http://bridge") as client:
+            return await client.post("/", json=batch)
+
+    resp = asyncio.run(run())
+    assert resp.status_code == 200
+    by_id = {item["id"]: item for item in resp.json()}
+    assert set(by_id) == {1, 2}
+    assert by_id[1]["result"] == {}
+    assert by_id[2]["error"]["code"] == -32603
+
+
+def test_single_message_handler_error_is_jsonrpc_error(monkeypatch):
+    async def explode(req_id, params):
+        raise RuntimeError("Handler kaputt")
+
+    monkeypatch.setitem(mini_bridge.METHOD_HANDLERS, "tools/call", explode)
+    transport = httpx.ASGITransport(app=mini_bridge.app)
+
+    async def run(message):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bridge") as client:
+            return await client.post("/", json=message)
+
+    resp = asyncio.run(run({"jsonrpc": "2.0", "id": 9, "method": "tools/call", "params": {"name": "chat"}}))
+    assert resp.status_code == 200
+    assert resp.json()["id"] == 9 and resp.json()["error"]["code"] == -32603
+    # Notification ohne id: auch im Fehlerfall keine Antwort
+    resp = asyncio.run(run({"jsonrpc": "2.0", "method": "tools/call", "params": {"name": "chat"}}))
+    assert resp.status_code == 204
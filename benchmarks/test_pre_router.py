@@ -0,0 +1,52 @@
+# test_pre_router.py – Pre-Routing darf normale Fragen nicht am LLM vorbei an ein Tool schicken
+#
+#   python -m pytest benchmarks/ -q
+
+import pytest
+
+from common import REPO_ROOT, add_service_path
+
+add_service_path("prompt_injector")
+
+import pre_router  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def matcher(monkeypatch):
+    monkeypatch.setattr(pre_router, "DECISION_DB_PATH", str(REPO_ROOT / "decision_rules" / "decision.db"))
+    monkeypatch.setattr(pre_router, "PREROUTE_ENABLED", True)
+    monkeypatch.setattr(pre_router, "_MATCHER", dict(pre_router._MATCHER, fingerprint=None, signature=None))
+    pre_router.refresh({"time"}, force=True)
+
+
+@pytest.mark.parametrize("prompt", [
+    "Zeitung lesen",
+    "what are the latest news",
+    "What is time dilation?",
+    "Explain relativity of timelines",
+    "boa tarde, tudo bem?",
+    "Ich habe keine Zeit, erkläre kurz Quantenphysik",
+])
+def test_chat_prompts_go_to_the_llm(prompt):
+    assert pre_router.match(prompt) is None
+
+
+@pytest.mark.parametrize("prompt", ["Wie spät ist es?", "What time is it right now?", "Que hora é agora?"])
+def test_short_tool_commands_are_routed(prompt):
+    assert pre_router.match(prompt)["tool"] == "time"
+
+
+
+def test_missing_db_is_not_created(tmp_path, monkeypatch):
+    missing = tmp_path / "decision.db"
+    monkeypatch.setattr(pre_router, "DECISION_DB_PATH", str(missing))
+    pre_router.refresh({"time"}, force=True)
+    assert not missing.exists()
+    assert pre_router.match("Wie spät ist es?") is None
+
+
+def test_disabled_router_does_not_touch_the_db(monkeypatch):
+    monkeypatch.setattr(pre_router, "PREROUTE_ENABLED", False)
+    monkeypatch.setattr(pre_router, "_db_signature", lambda: pytest.fail("stat trotz PREROUTE_ENABLED=0"))
+    pre_router.refresh({"time"}, force=True)
+    pre_router.refresh({"time"})
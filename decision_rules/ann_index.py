@@ -0,0 +1,153 @@
+# ann_index.py – Approximative Nächste-Nachbarn-Suche für die Decision Engine
+# IVF (Inverted File) in reinem NumPy: sphärisches k-means teilt die normalisierten
+# Regel-Vektoren in nlist Listen, eine Abfrage bewertet nur die nprobe nächsten Listen.
+# nprobe ist der Regler zwischen Recall und Latenz (nprobe = nlist entspricht exakter Suche).
+
+import logging
+import math
+
+import numpy as np
+
+ASSIGN_CHUNK_ROWS = 16384
+TRAIN_SAMPLES_PER_LIST = 64
+
+
+def _as_float32(rows) -> np.ndarray:
+    return np.asarray(rows, dtype=np.float32)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9)
+
+
+def assign_rows(matrix, centroids: np.ndarray) -> np.ndarray:
+    """Nächster Zentroid je Zeile, blockweise (funktioniert auch auf mmap/float16)."""
+    assign = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], ASSIGN_CHUNK_ROWS):
+        block = _as_float32(matrix[start:start + ASSIGN_CHUNK_ROWS])
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def train_centroids(matrix, nlist: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Sphärisches k-means auf einer Stichprobe (TRAIN_SAMPLES_PER_LIST Zeilen pro Liste)."""
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    sample_idx = np.sort(rng.choice(n, size=min(n, nlist * TRAIN_SAMPLES_PER_LIST), replace=False))
+    sample = _as_float32(matrix[sample_idx])
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        counts = np.bincount(assign, minlength=nlist)
+        order = np.argsort(assign, kind="stable")
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[filled])[:-1]))
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Leere Listen mit zufälligen Stichprobenzeilen neu besetzen
+            centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+        centroids = _normalize(centroids).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-File-Index über eine (ggf. memory-mapped) normalisierte Matrix.
+
+    Die Listen liegen CSR-artig vor: order enthält die Zeilennummern sortiert nach Liste,
+    offsets[c]:offsets[c+1] ist der Bereich von Liste c. keys ordnen Zeilen über Rebuilds
+    hinweg zu (z. B. Regel-ID + Pattern-Hash), damit unveränderte Regeln ihre Liste behalten.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, matrix, centroids: np.ndarray, assign: np.ndarray, keys: list,
+                 nprobe: int, trained_rows: int):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.assign = assign
+        self.keys = keys
+        self.nprobe = nprobe
+        self.trained_rows = trained_rows
+        self.order = np.argsort(assign, kind="stable").astype(np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=len(centroids)))))
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, matrix, keys: list, nlist: int = 0, nprobe: int = 8,
+              previous: "IVFIndex | None" = None) -> "IVFIndex":
+        """Baut den Index; mit passendem Vorgänger werden nur neue/geänderte Zeilen zugeordnet.
+
+        Neu trainiert wird, wenn sich Dimension oder nlist ändern oder die Regelmenge
+        auf weniger als die Hälfte bzw. mehr als das Doppelte des Trainingsstands wächst.
+        """
+        n, dim = matrix.shape
+        reuse = (
+            previous is not None
+            and previous.centroids.shape[1] == dim
+            and (not nlist or nlist == previous.nlist)   # bei nlist=0 (√N) bleibt die alte Listenzahl
+            and previous.trained_rows / 2 <= n <= previous.trained_rows * 2
+        )
+        if not reuse:
+            nlist = min(nlist or max(1, int(math.sqrt(n))), n)
+            centroids = train_centroids(matrix, nlist)
+            return cls(matrix, centroids, assign_rows(matrix, centroids), keys, nprobe, n)
+
+        known = dict(zip(previous.keys, previous.assign.tolist()))
+        assign = np.fromiter((known.get(key, -1) for key in keys), dtype=np.int32, count=n)
+        new_rows = np.flatnonzero(assign < 0)
+        if len(new_rows):
+            assign[new_rows] = assign_rows(matrix[new_rows], previous.centroids)
+        logging.info(f"🧭 IVF inkrementell: {len(new_rows)} von {n} Zeilen neu zugeordnet")
+        return cls(matrix, previous.centroids, assign, keys, nprobe, previous.trained_rows)
+
+    def search(self, query: np.ndarray, k: int, nprobe: int | None = None, allowed: np.ndarray | None = None):
+        """Top-k (Zeilennummern, Scores) absteigend – nur über die nprobe nächsten Listen.
+
+        allowed: optionale bool-Maske über alle Zeilen (z. B. gewählte Partitionen), nur diese
+        Zeilen der Listen werden bewertet.
+        """
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(centroid_scores, -nprobe)[-nprobe:] if nprobe < self.nlist else np.arange(self.nlist)
+        candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        if not len(candidates):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates.sort()   # sequentieller Zugriff auf die (gemappte) Matrix
+        scores = _as_float32(self.matrix[candidates]) @ query
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(scores[top])[::-1]]
+        return candidates[top], scores[top]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(f, centroids=self.centroids, assign=self.assign,
+                     keys=np.asarray(self.keys), trained_rows=self.trained_rows)
+
+    @classmethod
+    def load(cls, path: str, matrix, nprobe: int) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(matrix, data["centroids"], data["assign"], data["keys"].tolist(),
+                       nprobe, int(data["trained_rows"]))
+
+    def info(self) -> dict:
+        sizes = np.diff(self.offsets)
+        return {
+            "type": self.kind,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "rows": int(self.offsets[-1]),
+            "trained_rows": self.trained_rows,
+            "largest_list": int(sizes.max()) if len(sizes) else 0,
+        }
+
+
+# Auswahl per ANN_INDEX; weitere Verfahren (z. B. HNSW) hier eintragen
+ANN_BACKENDS = {"ivf": IVFIndex}
@@ -1,85 +1,990 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 import sqlite3, json, logging, httpx, numpy as np
+import asyncio, fcntl, hashlib, os, re, tempfile, time
+from collections import OrderedDict
+from ann_index import ANN_BACKENDS
+import metrics
 
 app = FastAPI(title="Decision Engine API")
-DB_PATH = "/app/db/decision.db"
-OLLAMA_URL = "http://ollama:11434/api/embeddings"  # dein lokales Ollama
+metrics.instrument(app)
+DB_PATH = os.getenv("DECISION_DB_PATH", "/app/db/decision.db")
+OLLAMA_URL = os.getenv("OLLAMA_EMBED_URL", "http://ollama:11434/api/embeddings")  # dein lokales Ollama
+OLLAMA_BATCH_URL = OLLAMA_URL.replace("/api/embeddings", "/api/embed")         # Batch-Endpoint
+EMBED_MODEL = os.getenv("EMBED_MODEL", "embedding-gemma:2b")
+
+SIMILARITY_THRESHOLD = 0.75
+DEFAULT_TOP_K = 3
+
+# Warm-up: Regeln pro Request und parallele Requests an Ollama
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+
+# LRU-Cache für Query-Embeddings (TTL in Sekunden, 0 = kein Ablauf)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "0"))
+
+# Embedding-Store: Matrix als .npy (float32 oder float16) + Spalten-Index, per mmap geladen und
+# von allen Workern (uvicorn --workers / WEB_CONCURRENCY) geteilt. Leer = kein Store.
+EMBED_STORE_DIR = os.getenv(
+    "EMBED_STORE_DIR", os.path.join(os.path.dirname(DB_PATH) or ".", "embedding_store")
+)
+EMBED_STORE_DTYPE = os.getenv("EMBED_STORE_DTYPE", "float32")
+if EMBED_STORE_DTYPE not in ("float32", "float16"):
+    raise ValueError(f"EMBED_STORE_DTYPE muss float32 oder float16 sein, nicht {EMBED_STORE_DTYPE!r}")
+SCORE_CHUNK_ROWS = 16384   # float16: Zeilenblöcke werden für das Skalarprodukt nach float32 gewandelt
+
+# Approximative Suche (ann_index.py): "exact" oder ein Verfahren aus ANN_BACKENDS, z. B. "ivf"
+ANN_INDEX = os.getenv("ANN_INDEX", "exact")
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))              # 0 = √N Listen
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))            # Recall/Latenz-Regler, pro Query überschreibbar
+ANN_MIN_RULES = int(os.getenv("ANN_MIN_RULES", "5000"))   # kleinere Regelmengen werden exakt durchsucht
+# Zweistufige Suche: Sprache (erkannt oder per Request) → beste Kategorien → nur deren Regeln
+PARTITION_SEARCH = os.getenv("PARTITION_SEARCH", "1") == "1"
+CATEGORY_PROBE = int(os.getenv("CATEGORY_PROBE", "2"))                 # Partitionen pro Query
+PARTITION_FALLBACK = os.getenv("PARTITION_FALLBACK", "1") == "1"       # unter Schwellwert: ganze Sprache
+# Live-Reload: decision.db (inkl. WAL) wird alle RULE_WATCH_INTERVAL Sekunden auf Änderungen geprüft,
+# 0 = nur auf POST /reload (z. B. vom Installer mit --incremental)
+RULE_WATCH_INTERVAL = float(os.getenv("RULE_WATCH_INTERVAL", "10"))
+if ANN_INDEX != "exact" and ANN_INDEX not in ANN_BACKENDS:
+    raise ValueError(f"ANN_INDEX muss 'exact' oder eines von {sorted(ANN_BACKENDS)} sein, nicht {ANN_INDEX!r}")
 
 logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
 
-# Cache für geladene Regeln und Embeddings
-RULE_CACHE = []
+# Index aus Regel-Metadaten und L2-normalisierter Embedding-Matrix (float32, C-contiguous).
+# Zeile i der Matrix gehört zu rules[i]. Nach dem Warm-up wird der Snapshot nie verändert,
+# nur komplett ersetzt – Abfragen sehen dadurch immer ein konsistentes Paar.
+# "ready" markiert während des Warm-ups die bereits eingebetteten Zeilen (sonst None).
+RULE_INDEX = {"rules": [], "matrix": np.zeros((0, 0), dtype=np.float32), "ready": None}
+
+WARMUP = {"state": "idle", "total": 0, "done": 0, "failed": 0, "cached": 0, "elapsed": 0.0}
+BATCH_SUPPORTED = True
+QUERY_CACHE: OrderedDict = OrderedDict()   # (Modell, normalisierter Text) → (Zeitstempel, Embedding)
+QUERY_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+EMBED_CLIENT: httpx.AsyncClient | None = None
+EMBED_STORE = {"path": None, "fingerprint": None, "dtype": None, "bytes": 0}
+RELOAD = {"count": 0, "signature": None, "last": None}
+RELOAD_LOCK = asyncio.Lock()
+
+# ==================== INDEX AUFBAUEN ====================
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.ascontiguousarray(matrix / (norms + 1e-9), dtype=np.float32)
+
+def build_index(rules: list, embeddings: list) -> dict:
+    """Baut einen Index-Snapshot; Regeln ohne Embedding werden ausgelassen."""
+    pairs = [(r, e) for r, e in zip(rules, embeddings) if e is not None and len(e)]
+    if not pairs:
+        return {"rules": [], "matrix": np.zeros((0, 0), dtype=np.float32), "ready": None}
+    dim = len(pairs[0][1])
+    pairs = [(r, e) for r, e in pairs if len(e) == dim]
+    matrix = np.asarray([e for _, e in pairs], dtype=np.float32)
+    return {"rules": [r for r, _ in pairs], "matrix": normalize_rows(matrix), "ready": None}
+
+# ==================== EMBEDDINGS ====================
+async def embed_one(client: httpx.AsyncClient, text: str) -> list:
+    with metrics.track(metrics.UPSTREAM_LATENCY, "ollama", EMBED_MODEL):
+        resp = await client.post(OLLAMA_URL, json={"model": EMBED_MODEL, "input": text, "prompt": text})
+        resp.raise_for_status()
+    return resp.json().get("embedding", [])
+
+async def embed_many(client: httpx.AsyncClient, texts: list) -> list:
+    """Bettet mehrere Texte ein – per Batch-Endpoint, sonst Einzel-Requests."""
+    global BATCH_SUPPORTED
+    if BATCH_SUPPORTED and len(texts) > 1:
+        with metrics.track(metrics.UPSTREAM_LATENCY, "ollama-batch", EMBED_MODEL):
+            resp = await client.post(OLLAMA_BATCH_URL, json={"model": EMBED_MODEL, "input": texts})
+        if resp.status_code in (404, 405, 501):
+            logging.warning("⚠️ Batch-Embeddings nicht unterstützt – nutze Einzel-Requests")
+            BATCH_SUPPORTED = False
+        else:
+            resp.raise_for_status()
+            embeddings = resp.json().get("embeddings", [])
+            if len(embeddings) == len(texts):
+                return embeddings
+    return list(await asyncio.gather(*(embed_one(client, t) for t in texts)))
+
+# ==================== QUERY-EMBEDDING-CACHE (LRU) ====================
+def normalize_query(text: str) -> str:
+    """'  Wie spät ist es? ' und 'wie spät ist es' landen auf demselben Schlüssel."""
+    return re.sub(r"\s+", " ", text.casefold()).strip().rstrip("?!. ")
+
+async def embed_query(text: str) -> list:
+    key = (EMBED_MODEL, normalize_query(text))
+    entry = QUERY_CACHE.get(key)
+    if entry is not None:
+        stored_at, embedding = entry
+        if not QUERY_CACHE_TTL or time.monotonic() - stored_at < QUERY_CACHE_TTL:
+            QUERY_CACHE.move_to_end(key)
+            QUERY_CACHE_STATS["hits"] += 1
+            return embedding
+        del QUERY_CACHE[key]
+
+    QUERY_CACHE_STATS["misses"] += 1
+    embedding = await embed_one(EMBED_CLIENT, text)
+    if embedding and QUERY_CACHE_SIZE > 0:
+        QUERY_CACHE[key] = (time.monotonic(), embedding)
+        QUERY_CACHE.move_to_end(key)
+        while len(QUERY_CACHE) > QUERY_CACHE_SIZE:
+            QUERY_CACHE.popitem(last=False)
+            QUERY_CACHE_STATS["evictions"] += 1
+    return embedding
 
-# ==================== DB LADEN UND EMBEDDINGS ====================
-async def load_rules_with_embeddings():
-    global RULE_CACHE
+def query_cache_info() -> dict:
+    lookups = QUERY_CACHE_STATS["hits"] + QUERY_CACHE_STATS["misses"]
+    return {
+        **QUERY_CACHE_STATS,
+        "size": len(QUERY_CACHE),
+        "capacity": QUERY_CACHE_SIZE,
+        "hit_ratio": round(QUERY_CACHE_STATS["hits"] / lookups, 3) if lookups else 0.0,
+    }
+
+# ==================== EMBEDDING-CACHE (decision.db) ====================
+# Berechnete Embeddings liegen neben den Regeln, Schlüssel: (Modell, SHA-256 des Patterns).
+# Gespeichert wird der L2-normalisierte float32-Vektor als BLOB.
+def pattern_hash(pattern: str) -> str:
+    return hashlib.sha256(pattern.encode("utf-8")).hexdigest()
+
+def ensure_embedding_table(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rule_embeddings (
+        model TEXT NOT NULL,
+        pattern_hash TEXT NOT NULL,
+        dim INTEGER NOT NULL,
+        vector BLOB NOT NULL,
+        created_at TEXT,
+        PRIMARY KEY (model, pattern_hash)
+    )
+    """)
+
+def load_cached_embeddings(model: str, hashes: list | None = None) -> dict:
+    """Alle gecachten Vektoren des Modells oder nur die angefragten Hashes."""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        ensure_embedding_table(conn)
+        if hashes is None:
+            rows = conn.execute(
+                "SELECT pattern_hash, vector FROM rule_embeddings WHERE model=?", (model,)
+            ).fetchall()
+        else:
+            rows = []
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows += conn.execute(
+                    "SELECT pattern_hash, vector FROM rule_embeddings WHERE model=? "
+                    f"AND pattern_hash IN ({', '.join('?' for _ in chunk)})", (model, *chunk),
+                ).fetchall()
+    finally:
+        conn.close()
+    return {h: np.frombuffer(blob, dtype=np.float32) for h, blob in rows}
+
+def store_cached_embeddings(model: str, entries: list):
+    """entries: Liste aus (pattern_hash, normalisierter float32-Vektor)."""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        ensure_embedding_table(conn)
+        conn.executemany(
+            "INSERT OR REPLACE INTO rule_embeddings (model, pattern_hash, dim, vector, created_at) "
+            "VALUES (?, ?, ?, ?, datetime('now'))",
+            [(model, h, len(v), v.astype(np.float32).tobytes()) for h, v in entries],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+# ==================== DB LADEN UND WARM-UP ====================
+def load_rule_rows() -> list:
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
-    cur.execute("SELECT id, tool, pattern, language FROM decision_rules WHERE enabled=1")
+    # Sortiert nach Sprache/Kategorie: jede Partition ist ein zusammenhängender Block der Matrix
+    cur.execute(
+        "SELECT id, tool, pattern, language, category FROM decision_rules WHERE enabled=1 "
+        "ORDER BY language, category, id"
+    )
     rows = cur.fetchall()
     conn.close()
+    return [{"id": r[0], "tool": r[1], "pattern": r[2], "language": r[3], "category": r[4]} for r in rows]
 
-    async with httpx.AsyncClient() as client:
-        for r in rows:
-            rule_id, tool, pattern, lang = r
-            payload = {"model": "embedding-gemma:2b", "input": pattern}
+async def load_rules_with_embeddings(rules: list | None = None):
+    """Lädt gecachte Embeddings direkt und bettet nur neue/geänderte Regeln parallel in Batches ein.
+
+    Fertige Batches sind sofort abfragbar.
+    """
+    global RULE_INDEX
+    rules = load_rule_rows() if rules is None else rules
+    hashes = [pattern_hash(r["pattern"]) for r in rules]
+    WARMUP.update(state="warming", total=len(rules), done=0, failed=0, cached=0, elapsed=0.0)
+    t0 = time.monotonic()
+
+    # Index mit allen Regeln; Zeilen werden freigegeben, sobald ihr Embedding vorliegt
+    ready = np.zeros(len(rules), dtype=bool)
+    matrix = np.zeros((len(rules), 0), dtype=np.float32)
+
+    try:
+        cached = await asyncio.to_thread(load_cached_embeddings, EMBED_MODEL)
+    except Exception as e:
+        logging.error(f"Embedding-Cache nicht lesbar: {e}")
+        cached = {}
+    hits = [i for i, h in enumerate(hashes) if h in cached]
+    if hits:
+        dim = len(cached[hashes[hits[0]]])
+        hits = [i for i in hits if len(cached[hashes[i]]) == dim]
+        matrix = np.zeros((len(rules), dim), dtype=np.float32)
+        matrix[hits] = np.stack([cached[hashes[i]] for i in hits])
+        ready[hits] = True
+    WARMUP["cached"] = WARMUP["done"] = len(hits)
+    RULE_INDEX = {"rules": rules, "matrix": matrix, "ready": ready}
+
+    todo = np.flatnonzero(~ready).tolist()
+    sem = asyncio.Semaphore(EMBED_CONCURRENCY)
+    next_report = 0.1
+
+    async def run_batch(slots: list):
+        global RULE_INDEX
+        nonlocal next_report
+        async with sem:
             try:
-                resp = await client.post(OLLAMA_URL, json=payload)
-                embedding = resp.json().get("embedding", [])
-                RULE_CACHE.append({
-                    "id": rule_id,
-                    "tool": tool,
-                    "pattern": pattern,
-                    "language": lang,
-                    "embedding": embedding
-                })
+                embeddings = await embed_many(EMBED_CLIENT, [rules[i]["pattern"] for i in slots])
             except Exception as e:
-                logging.error(f"Embedding Fehler bei Regel {rule_id}: {e}")
+                logging.error(f"Embedding Fehler bei Regeln {rules[slots[0]]['id']}…{rules[slots[-1]]['id']}: {e}")
+                WARMUP["failed"] += len(slots)
+                return
 
-    logging.info(f"✅ {len(RULE_CACHE)} Regeln mit Embeddings geladen")
+        rows = [i for i, e in enumerate(embeddings) if e]
+        WARMUP["failed"] += len(slots) - len(rows)
+        if rows:
+            block = normalize_rows(np.asarray([embeddings[i] for i in rows], dtype=np.float32))
+            matrix = RULE_INDEX["matrix"]
+            if matrix.shape[1] == 0:
+                matrix = np.zeros((len(rules), block.shape[1]), dtype=np.float32)
+                RULE_INDEX = {**RULE_INDEX, "matrix": matrix}
+            if block.shape[1] == matrix.shape[1]:
+                filled = [slots[i] for i in rows]
+                matrix[filled] = block
+                ready[filled] = True
+                try:
+                    await asyncio.to_thread(
+                        store_cached_embeddings, EMBED_MODEL, [(hashes[s], matrix[s]) for s in filled]
+                    )
+                except Exception as e:
+                    logging.error(f"Embedding-Cache nicht beschreibbar: {e}")
+            else:
+                # Als fehlgeschlagen zählen – sonst würde der Store mit Lücken unter dem vollen Fingerprint geschrieben
+                logging.error(
+                    f"Embedding-Dimension {block.shape[1]} statt {matrix.shape[1]} bei Regeln "
+                    f"{rules[slots[0]]['id']}…{rules[slots[-1]]['id']} – übersprungen"
+                )
+                WARMUP["failed"] += len(rows)
+        WARMUP["done"] += len(slots)
+        WARMUP["elapsed"] = round(time.monotonic() - t0, 3)
 
-# ==================== ÄHNLICHKEITSBERECHNUNG ====================
-def cosine_similarity(a, b):
-    a, b = np.array(a), np.array(b)
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9)
+        progress = WARMUP["done"] / max(1, WARMUP["total"])
+        if progress >= next_report:
+            logging.info(f"⏳ Warm-up {progress:.0%} ({WARMUP['done']}/{WARMUP['total']})")
+            next_report = progress + 0.1
 
-async def find_best_match(text: str):
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(OLLAMA_URL, json={"model": "embedding-gemma:2b", "input": text})
-        query_emb = resp.json().get("embedding", [])
+    await asyncio.gather(*(
+        run_batch(todo[i:i + EMBED_BATCH_SIZE]) for i in range(0, len(todo), EMBED_BATCH_SIZE)
+    ))
 
-    if not query_emb:
+    # Finaler, kompakter Snapshot ohne fehlgeschlagene Regeln
+    matrix = RULE_INDEX["matrix"]
+    keep = np.flatnonzero(ready)
+    RULE_INDEX = {
+        "rules": [rules[i] for i in keep],
+        "matrix": np.ascontiguousarray(matrix[keep]) if matrix.shape[1] else np.zeros((0, 0), dtype=np.float32),
+        "ready": None,
+    }
+    WARMUP.update(state="ready", elapsed=round(time.monotonic() - t0, 3))
+    logging.info(
+        f"✅ {len(RULE_INDEX['rules'])} Regeln mit Embeddings geladen "
+        f"({WARMUP['cached']} aus Cache, {WARMUP['elapsed']}s)"
+    )
+
+# ==================== EMBEDDING-STORE (mmap) ====================
+# Pro Regelstand (Fingerprint) zwei Dateien in EMBED_STORE_DIR:
+#   index-<fp>.npy   L2-normalisierte Matrix (float32 oder float16), Zeile i = Regel i
+#   index-<fp>.json  kleiner Spalten-Index: ids, patterns, tool-/language-/category-Codes + Vokabular
+# Beim Start wird die Matrix per mmap geöffnet – nichts wird geparst oder kopiert, die Seiten
+# liegen im Page-Cache und werden von allen Workern geteilt. Ein Worker (per flock) baut fehlende
+# Stände, die anderen warten und mappen das Ergebnis.
+class RuleColumns:
+    """Regel-Metadaten spaltenweise; columns[i] baut das Regel-Dict erst bei Bedarf."""
+
+    def __init__(self, ids, patterns, tools, tool_codes, languages, language_codes,
+                 categories, category_codes):
+        self.ids = ids
+        self.patterns = patterns
+        self.tools = tools
+        self.tool_codes = np.asarray(tool_codes, dtype=np.uint16)
+        self.languages = languages
+        self.language_codes = np.asarray(language_codes, dtype=np.uint16)
+        self.categories = categories
+        self.category_codes = np.asarray(category_codes, dtype=np.uint16)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return {
+            "id": self.ids[i],
+            "tool": self.tools[self.tool_codes[i]],
+            "pattern": self.patterns[i],
+            "language": self.languages[self.language_codes[i]],
+            "category": self.categories[self.category_codes[i]],
+        }
+
+    @classmethod
+    def from_rules(cls, rules: list) -> "RuleColumns":
+        tools, languages, categories = {}, {}, {}
+        tool_codes = [tools.setdefault(r["tool"], len(tools)) for r in rules]
+        language_codes = [languages.setdefault(r["language"], len(languages)) for r in rules]
+        category_codes = [categories.setdefault(r.get("category"), len(categories)) for r in rules]
+        return cls(
+            [r["id"] for r in rules], [r["pattern"] for r in rules],
+            list(tools), tool_codes, list(languages), language_codes,
+            list(categories), category_codes,
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "ids": self.ids,
+            "patterns": self.patterns,
+            "tools": self.tools,
+            "tool_codes": self.tool_codes.tolist(),
+            "languages": self.languages,
+            "language_codes": self.language_codes.tolist(),
+            "categories": self.categories,
+            "category_codes": self.category_codes.tolist(),
+        }
+
+def index_fingerprint(rules: list) -> str:
+    """Ändert sich mit Modell, Speicherformat, Regel-IDs und Patterns."""
+    h = hashlib.sha256(f"{EMBED_MODEL}\0{EMBED_STORE_DTYPE}".encode("utf-8"))
+    for r in rules:
+        h.update(f"\0{r['id']}\0{r['tool']}\0{r['language']}\0{r.get('category')}\0{r['pattern']}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def store_paths(fingerprint: str) -> tuple:
+    base = os.path.join(EMBED_STORE_DIR, f"index-{fingerprint}")
+    return base + ".npy", base + ".json"
+
+def open_store(fingerprint: str) -> dict | None:
+    """Öffnet einen fertigen Stand read-only per mmap."""
+    matrix_path, meta_path = store_paths(fingerprint)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix = np.load(matrix_path, mmap_mode="r")
+        columns = RuleColumns(
+            meta["ids"], meta["patterns"], meta["tools"], meta["tool_codes"],
+            meta["languages"], meta["language_codes"], meta["categories"], meta["category_codes"],
+        )
+    except (FileNotFoundError, ValueError, KeyError):
         return None
+    if matrix.shape[0] != len(columns):
+        return None
+    return {"rules": columns, "matrix": matrix, "ready": None}
+
+def write_store(index: dict, fingerprint: str):
+    """Schreibt Matrix und Spalten-Index atomar (tmp + rename); die JSON-Datei kommt zuletzt."""
+    matrix_path, meta_path = store_paths(fingerprint)
+    columns = RuleColumns.from_rules(index["rules"])
+    matrix = np.ascontiguousarray(index["matrix"], dtype=EMBED_STORE_DTYPE)
+    meta = {"model": EMBED_MODEL, "dtype": EMBED_STORE_DTYPE, "dim": int(matrix.shape[1]),
+            "count": len(columns), **columns.to_json()}
+    for path, write in (
+        (matrix_path, lambda f: np.save(f, matrix)),
+        (meta_path, lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8"))),
+    ):
+        fd, tmp = tempfile.mkstemp(dir=EMBED_STORE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
 
-    best_match = None
-    best_score = 0
-    for rule in RULE_CACHE:
-        if not rule.get("embedding"):
+    # Alte Stände entfernen – Worker mit bestehendem mmap behalten ihre Seiten bis zum Swap
+    keep = {os.path.basename(p) for p in (matrix_path, meta_path)}
+    for name in os.listdir(EMBED_STORE_DIR):
+        if name.startswith("index-") and name not in keep:
+            try:
+                os.remove(os.path.join(EMBED_STORE_DIR, name))
+            except OSError:
+                pass
+
+async def lock_store(lock):
+    """Exklusiver flock auf warmup.lock, ohne die Event-Loop zu blockieren."""
+    while True:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            await asyncio.sleep(0.2)   # ein anderer Worker baut gerade
+
+async def attach_search(index: dict, fingerprint: str | None, previous_ann) -> dict:
+    """Ergänzt einen Snapshot um ANN-Index, Partitionen und Fingerprint (vor dem Swap)."""
+    index["ann"] = await asyncio.to_thread(build_ann_index, index, fingerprint, previous_ann)
+    index["partitions"] = await asyncio.to_thread(build_partitions, index)
+    index["fingerprint"] = fingerprint
+    return index
+
+def activate_store(stored: dict):
+    """Tauscht RULE_INDEX gegen einen gemappten Store-Stand – eine einzige Zuweisung."""
+    global RULE_INDEX
+    RULE_INDEX = stored
+    fingerprint = stored["fingerprint"]
+    EMBED_STORE.update(
+        path=store_paths(fingerprint)[0], fingerprint=fingerprint,
+        dtype=str(stored["matrix"].dtype), bytes=int(stored["matrix"].nbytes),
+    )
+
+async def warmup_index():
+    """Mappt den passenden Store oder baut ihn (ein Worker per flock, die anderen warten)."""
+    global RULE_INDEX
+    rules = await asyncio.to_thread(load_rule_rows)
+    if not EMBED_STORE_DIR:
+        await load_rules_with_embeddings(rules)
+        # Ohne Fingerprint versucht der nächste Reload fehlgeschlagene Regeln erneut
+        fingerprint = None if WARMUP["failed"] else index_fingerprint(rules)
+        RULE_INDEX = await attach_search(dict(RULE_INDEX), fingerprint, None)
+        return
+
+    fingerprint = index_fingerprint(rules)
+    os.makedirs(EMBED_STORE_DIR, exist_ok=True)
+    WARMUP.update(state="warming", total=len(rules), done=0, failed=0, cached=0, elapsed=0.0)
+    t0 = time.monotonic()
+    with open(os.path.join(EMBED_STORE_DIR, "warmup.lock"), "w") as lock:
+        await lock_store(lock)
+        stored = open_store(fingerprint)
+        if stored is None:
+            await load_rules_with_embeddings(rules)
+            if WARMUP["failed"]:
+                # Unvollständig nicht speichern – der nächste Worker/Start versucht die Lücken erneut
+                logging.warning(f"⚠️ {WARMUP['failed']} Regeln ohne Embedding – Store wird nicht geschrieben")
+                return
+            await asyncio.to_thread(write_store, RULE_INDEX, fingerprint)
+            stored = open_store(fingerprint)
+            if stored is None:
+                return
+        else:
+            WARMUP.update(done=len(rules), cached=len(rules))
+        await attach_search(stored, fingerprint, RULE_INDEX.get("ann"))
+
+    activate_store(stored)
+    WARMUP.update(state="ready", elapsed=round(time.monotonic() - t0, 3))
+    logging.info(
+        f"🔗 Embedding-Store {fingerprint}: {len(stored['rules'])} Regeln "
+        f"({EMBED_STORE['dtype']}, mmap, pid {os.getpid()})"
+    )
+
+# ==================== LIVE-RELOAD ====================
+# /reload und der DB-Watcher vergleichen decision_rules mit dem aktuellen Snapshot. Regeln mit
+# gleicher ID und gleichem Pattern übernehmen ihren Vektor aus der Matrix, neue/geänderte kommen
+# aus dem Embedding-Cache oder werden eingebettet, entfernte/deaktivierte fallen weg. Abfragen
+# laufen währenddessen auf dem alten Snapshot weiter; der neue ersetzt ihn in einem Schritt.
+def db_signature() -> tuple:
+    """mtime/size von DB und WAL – ändert sich bei jedem Schreibzugriff."""
+    sig = []
+    for path in (DB_PATH, DB_PATH + "-wal"):
+        try:
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+def rule_ids(rules) -> list:
+    return list(rules.ids) if isinstance(rules, RuleColumns) else [r["id"] for r in rules]
+
+def diff_rules(current, rules: list) -> dict:
+    """Zeilen-Zuordnung alt → neu plus Zähler für added/changed/removed."""
+    old_rows = {key: i for i, key in enumerate(row_keys(current))}
+    keys = row_keys(rules)
+    reuse = [(i, old_rows[key]) for i, key in enumerate(keys) if key in old_rows]
+    old_ids, new_ids = set(rule_ids(current)), rule_ids(rules)
+    reused = {i for i, _ in reuse}
+    todo = [i for i in range(len(rules)) if i not in reused]
+    return {
+        "reuse": reuse,
+        "todo": todo,
+        "added": sum(new_ids[i] not in old_ids for i in todo),
+        "changed": sum(new_ids[i] in old_ids for i in todo),
+        "removed": len(old_ids - set(new_ids)),
+    }
+
+async def embed_rules(rules: list) -> list:
+    """Bettet Regeln in Batches parallel ein; None für fehlgeschlagene."""
+    sem = asyncio.Semaphore(EMBED_CONCURRENCY)
+
+    async def run_batch(batch: list) -> list:
+        async with sem:
+            try:
+                return await embed_many(EMBED_CLIENT, [r["pattern"] for r in batch])
+            except Exception as e:
+                logging.error(f"Embedding Fehler bei Regeln {batch[0]['id']}…{batch[-1]['id']}: {e}")
+                return [None] * len(batch)
+
+    results = await asyncio.gather(*(
+        run_batch(rules[i:i + EMBED_BATCH_SIZE]) for i in range(0, len(rules), EMBED_BATCH_SIZE)
+    ))
+    return [e or None for batch in results for e in batch]
+
+async def rebuild_matrix(current: dict, rules: list, diff: dict) -> tuple:
+    """Neue Matrix aus übernommenen, gecachten und frisch eingebetteten Zeilen.
+
+    Liefert (Matrix oder None bei Fehlern, Anzahl Cache-Treffer, Anzahl neu eingebettet).
+    """
+    old = current["matrix"]
+    dim = old.shape[1] if len(current["rules"]) else 0
+    todo = diff["todo"]
+    hashes = [pattern_hash(rules[i]["pattern"]) for i in todo]
+    cached = await asyncio.to_thread(load_cached_embeddings, EMBED_MODEL, sorted(set(hashes))) if todo else {}
+    vectors = {i: cached[h] for i, h in zip(todo, hashes) if h in cached}
+    hits = len(vectors)
+
+    missing = [i for i in todo if i not in vectors]
+    if missing:
+        embeddings = await embed_rules([rules[i] for i in missing])
+        fresh = [(i, e) for i, e in zip(missing, embeddings) if e]
+        if len(fresh) < len(missing):
+            logging.error(f"❌ Reload: {len(missing) - len(fresh)} Regeln ohne Embedding – Snapshot bleibt")
+            return None, hits, len(fresh)
+        block = normalize_rows(np.asarray([e for _, e in fresh], dtype=np.float32))
+        vectors.update((i, block[n]) for n, (i, _) in enumerate(fresh))
+        try:
+            await asyncio.to_thread(
+                store_cached_embeddings, EMBED_MODEL,
+                [(pattern_hash(rules[i]["pattern"]), vectors[i]) for i, _ in fresh],
+            )
+        except Exception as e:
+            logging.error(f"Embedding-Cache nicht beschreibbar: {e}")
+
+    dim = dim or (len(next(iter(vectors.values()))) if vectors else 0)
+    if any(len(v) != dim for v in vectors.values()):
+        logging.error("❌ Reload: Embedding-Dimension passt nicht zum Index – Snapshot bleibt")
+        return None, hits, len(missing)
+    matrix = np.zeros((len(rules), dim), dtype=np.float32)
+    if diff["reuse"]:
+        new_rows, old_rows = map(list, zip(*diff["reuse"]))
+        matrix[new_rows] = old[old_rows]
+    if vectors:
+        rows = list(vectors)
+        matrix[rows] = np.stack([vectors[i] for i in rows])
+    return matrix, hits, len(missing)
+
+async def reload_index(force: bool = False) -> dict:
+    """Gleicht den Snapshot mit decision_rules ab und tauscht ihn bei Änderungen aus."""
+    global RULE_INDEX
+    async with RELOAD_LOCK:
+        t0 = time.monotonic()
+        signature = db_signature()
+        rules = await asyncio.to_thread(load_rule_rows)
+        fingerprint = index_fingerprint(rules)
+        current = RULE_INDEX
+        if fingerprint == current.get("fingerprint") and not force:
+            RELOAD["signature"] = signature
+            return {"status": "unchanged", "rules": len(rules), "fingerprint": fingerprint}
+
+        diff = diff_rules(current["rules"], rules)
+        summary = {
+            "rules": len(rules), "added": diff["added"], "changed": diff["changed"],
+            "removed": diff["removed"], "unchanged": len(diff["reuse"]), "cached": 0, "embedded": 0,
+        }
+
+        if EMBED_STORE_DIR:
+            os.makedirs(EMBED_STORE_DIR, exist_ok=True)
+            with open(os.path.join(EMBED_STORE_DIR, "warmup.lock"), "w") as lock:
+                await lock_store(lock)
+                # Ein anderer Worker hat diesen Stand evtl. schon geschrieben – dann nur mappen
+                index = open_store(fingerprint)
+                if index is None:
+                    matrix, summary["cached"], summary["embedded"] = await rebuild_matrix(current, rules, diff)
+                    if matrix is None:
+                        return {"status": "error", **summary}
+                    await asyncio.to_thread(write_store, {"rules": rules, "matrix": matrix}, fingerprint)
+                    index = open_store(fingerprint)
+                    if index is None:
+                        return {"status": "error", **summary}
+                await attach_search(index, fingerprint, current.get("ann"))
+            activate_store(index)
+        else:
+            matrix, summary["cached"], summary["embedded"] = await rebuild_matrix(current, rules, diff)
+            if matrix is None:
+                return {"status": "error", **summary}
+            index = {"rules": rules, "matrix": matrix, "ready": None}
+            RULE_INDEX = await attach_search(index, fingerprint, current.get("ann"))
+
+        summary.update(status="reloaded", fingerprint=fingerprint, elapsed=round(time.monotonic() - t0, 3))
+        RELOAD.update(count=RELOAD["count"] + 1, signature=signature, last=summary)
+        logging.info(
+            f"🔄 Reload: +{summary['added']} ~{summary['changed']} -{summary['removed']} "
+            f"({summary['embedded']} eingebettet, {summary['cached']} aus Cache, {summary['elapsed']}s)"
+        )
+        return summary
+
+def warmup_running() -> bool:
+    """Auch nach WARMUP "ready" läuft im Store-Modus noch das Schreiben/Mappen des Stands."""
+    task = getattr(app.state, "warmup_task", None)
+    return WARMUP["state"] != "ready" or (task is not None and not task.done())
+
+async def rule_watch_loop():
+    """Prüft decision.db periodisch und lädt nur bei Änderungen neu (jeder Worker für sich)."""
+    while True:
+        await asyncio.sleep(RULE_WATCH_INTERVAL)
+        if warmup_running() or db_signature() == RELOAD["signature"]:
             continue
-        score = cosine_similarity(rule["embedding"], query_emb)
-        if score > best_score:
-            best_match = rule
-            best_score = score
+        try:
+            await reload_index()
+        except Exception as e:
+            logging.error(f"❌ Reload fehlgeschlagen: {e}")
+
+# ==================== ANN-INDEX ====================
+# Wird aus der fertigen (gemappten) Matrix gebaut und neben dem Store abgelegt:
+# <verfahren>-<fingerprint>-<nlist>.npz. Bei geänderten Regeln dient der letzte gespeicherte
+# Index als Vorgänger – unveränderte Regeln behalten ihre Liste, nur neue werden zugeordnet.
+def row_keys(rules) -> list:
+    if isinstance(rules, RuleColumns):
+        pairs = zip(rules.ids, rules.patterns)
+    else:
+        pairs = ((r["id"], r["pattern"]) for r in rules)
+    return [f"{rule_id}:{pattern_hash(pattern)[:16]}" for rule_id, pattern in pairs]
 
-    return best_match if best_score > 0.75 else None
+def ann_path(fingerprint: str) -> str:
+    return os.path.join(EMBED_STORE_DIR, f"{ANN_INDEX}-{fingerprint}-{ANN_NLIST or 'auto'}.npz")
+
+def latest_ann_file(exclude: str) -> str | None:
+    prefix = f"{ANN_INDEX}-"
+    files = [
+        os.path.join(EMBED_STORE_DIR, name) for name in os.listdir(EMBED_STORE_DIR)
+        if name.startswith(prefix) and name.endswith(".npz") and os.path.join(EMBED_STORE_DIR, name) != exclude
+    ]
+    return max(files, key=os.path.getmtime) if files else None
+
+def build_ann_index(index: dict, fingerprint: str | None = None, previous=None):
+    """ANN-Index zum Snapshot laden oder (inkrementell) bauen – None heißt exakte Suche."""
+    if ANN_INDEX == "exact" or len(index["rules"]) < ANN_MIN_RULES:
+        return None
+    backend = ANN_BACKENDS[ANN_INDEX]
+    persist = bool(fingerprint and EMBED_STORE_DIR)
+    path = ann_path(fingerprint) if persist else None
+    t0 = time.monotonic()
+
+    if persist and os.path.exists(path):
+        try:
+            ann = backend.load(path, index["matrix"], ANN_NPROBE)
+            logging.info(f"🧭 {ANN_INDEX}-Index geladen: {ann.info()}")
+            return ann
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"⚠️ ANN-Index {path} nicht lesbar, baue neu: {e}")
+
+    if previous is None and persist:
+        old = latest_ann_file(exclude=path)
+        if old is not None:
+            try:
+                previous = backend.load(old, None, ANN_NPROBE)
+            except (OSError, ValueError, KeyError):
+                previous = None
+
+    ann = backend.build(index["matrix"], row_keys(index["rules"]), ANN_NLIST, ANN_NPROBE, previous)
+    if persist:
+        fd, tmp = tempfile.mkstemp(dir=EMBED_STORE_DIR, suffix=".tmp")
+        os.close(fd)
+        ann.save(tmp)
+        os.replace(tmp, path)
+        old = latest_ann_file(exclude=path)
+        while old is not None:
+            os.remove(old)
+            old = latest_ann_file(exclude=path)
+    logging.info(f"🧭 {ANN_INDEX}-Index: {ann.info()} ({time.monotonic() - t0:.2f}s)")
+    return ann
+
+# ==================== PARTITIONEN (SPRACHE × KATEGORIE) ====================
+# Stufe 1: Kategorie-Zentroide (Mittel der Regel-Embeddings je Sprache/Kategorie) gegen die Query,
+# Stufe 2: Suche nur in den CATEGORY_PROBE besten Partitionen der erkannten Sprache. Enthalten die
+# gewählten Partitionen mindestens ANN_MIN_RULES Regeln und ist ein ANN-Index aktiv, läuft Stufe 2
+# über den ANN-Index (ANN_NPROBE bzw. "nprobe" pro Query), beschränkt auf diese Zeilen; sonst exakt.
+# Die Kategorie-Embeddings aus den Regel-JSONs liegen nicht in der DB (und nicht im Modellraum),
+# daher werden die Zentroide aus den Regelvektoren selbst berechnet.
+LANGUAGE_HINTS = {
+    "de": {"der", "die", "das", "und", "ist", "ich", "nicht", "wie", "was", "mach", "bitte", "du",
+           "es", "ein", "eine", "mir", "mit", "auf", "an", "aus", "den", "dem", "kannst", "wird"},
+    "en": {"the", "and", "is", "what", "how", "please", "turn", "it", "you", "can", "my", "on",
+           "off", "to", "of", "me", "with", "will", "does", "are"},
+    "pt": {"o", "os", "as", "que", "por", "favor", "como", "você", "voce", "ligue", "não", "nao",
+           "da", "do", "para", "uma", "um", "qual", "está", "esta", "são"},
+}
+LANGUAGE_CHARS = {"de": "äöüß", "pt": "ãõçâêôáéíóú"}
+
+def detect_language(text: str, languages) -> str | None:
+    """Billige Heuristik über Funktionswörter und Sonderzeichen; None, wenn unklar."""
+    lowered = text.casefold()
+    words = re.findall(r"\w+", lowered)
+    scores = {
+        lang: sum(w in LANGUAGE_HINTS.get(lang, ()) for w in words)
+              + 2 * sum(ch in LANGUAGE_CHARS.get(lang, "") for ch in lowered)
+        for lang in languages if lang
+    }
+    if not scores:
+        return None
+    ranked = sorted(scores.values(), reverse=True)
+    if ranked[0] == 0 or (len(ranked) > 1 and ranked[0] == ranked[1]):
+        return None
+    return max(scores, key=scores.get)
+
+def build_partitions(index: dict) -> dict | None:
+    """Zeilenbereiche und normalisierte Zentroide je (Sprache, Kategorie)."""
+    rules, matrix = index["rules"], index["matrix"]
+    if not PARTITION_SEARCH or not len(rules) or not matrix.shape[1]:
+        return None
+    columns = rules if isinstance(rules, RuleColumns) else RuleColumns.from_rules(rules)
+    keys = columns.language_codes.astype(np.int64) * len(columns.categories) + columns.category_codes
+    order = np.argsort(keys, kind="stable")
+    contiguous = bool(np.all(order[1:] > order[:-1]))
+    bounds = np.flatnonzero(np.diff(keys[order])) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(keys)]))
+
+    rows, centroids, part_languages, labels = [], [], [], []
+    for start, end in zip(starts, ends):
+        # Bei sortierten Regeln (load_rule_rows) ist jede Partition ein Slice – ohne Kopie der mmap
+        sel = slice(int(start), int(end)) if contiguous else order[start:end]
+        block = np.asarray(matrix[sel], dtype=np.float32)
+        centroid = block.mean(axis=0)
+        centroids.append(centroid / (np.linalg.norm(centroid) + 1e-9))
+        rows.append(sel)
+        first = int(order[start])
+        part_languages.append(columns.languages[columns.language_codes[first]])
+        labels.append(f"{part_languages[-1]}/{columns.categories[columns.category_codes[first]]}")
+    return {
+        "rows": rows,
+        "centroids": np.asarray(centroids, dtype=np.float32),
+        "languages": np.asarray(part_languages, dtype=object),
+        "labels": labels,
+        "contiguous": contiguous,
+    }
+
+def search_partitions(index: dict, query: np.ndarray, k: int, language: str | None,
+                      probe: int | None, nprobe: int | None = None) -> list | None:
+    """Top-k aus den besten Partitionen; None = keine passende Partition (globale Suche)."""
+    parts = index["partitions"]
+    candidates = np.arange(len(parts["rows"]))
+    if language is not None:
+        candidates = candidates[parts["languages"] == language]
+        if not len(candidates):
+            return None
+    if probe is not None:
+        centroid_scores = parts["centroids"][candidates] @ query
+        if probe < len(candidates):
+            candidates = candidates[np.argpartition(centroid_scores, -probe)[-probe:]]
+
+    selected = [parts["rows"][p] for p in candidates]
+    row_ids = np.concatenate([
+        np.arange(sel.start, sel.stop) if isinstance(sel, slice) else sel for sel in selected
+    ])
+
+    ann = index.get("ann")
+    if ann is not None and len(row_ids) >= ANN_MIN_RULES:
+        allowed = np.zeros(len(index["rules"]), dtype=bool)
+        allowed[row_ids] = True
+        rows, scores = ann.search(query, max(1, k), nprobe, allowed)
+        # Zu wenige Treffer in den geprobten Listen → exakt in den Partitionen
+        if len(rows) >= min(max(1, k), len(row_ids)):
+            return [{**index["rules"][int(i)], "score": float(score)} for i, score in zip(rows, scores)]
+
+    scores = np.concatenate([matrix_scores(index["matrix"][sel], query) for sel in selected])
+    k = max(1, min(k, len(scores)))
+    top = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+    top = top[np.argsort(scores[top])[::-1]]
+    return [{**index["rules"][int(row_ids[i])], "score": float(scores[i])} for i in top]
+
+# ==================== ÄHNLICHKEITSBERECHNUNG ====================
+def matrix_scores(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Kosinus-Scores; float16-Matrizen blockweise in float32 (numpy hat kein BLAS für float16)."""
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    scores = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], SCORE_CHUNK_ROWS):
+        block = matrix[start:start + SCORE_CHUNK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    return scores
+
+def top_k_matches(index: dict, query_emb, k: int, nprobe: int | None = None,
+                  language: str | None = None, language_guessed: bool = False) -> list:
+    """Partitionierte Suche (darin ggf. ANN), sonst ANN-Suche oder ein Matrix-Vektor-Produkt über alle Regeln.
+
+    CATEGORY_PROBE wählt die Partitionen, nprobe/ANN_NPROBE die IVF-Listen innerhalb der gewählten Zeilen.
+    Eine nur geratene Sprache (language_guessed) schränkt die Suche nicht endgültig ein.
+    """
+    matrix = index["matrix"]
+    if not len(index["rules"]) or len(query_emb) != matrix.shape[1]:
+        return []
+
+    query = np.asarray(query_emb, dtype=np.float32)
+    query = query / (np.linalg.norm(query) + 1e-9)
+    if index.get("partitions") is not None and index.get("ready") is None:
+        matches = search_partitions(index, query, k, language, CATEGORY_PROBE, nprobe)
+        confident = bool(matches) and matches[0]["score"] > SIMILARITY_THRESHOLD
+        if matches is not None and (confident or not PARTITION_FALLBACK):
+            return matches
+        if matches is not None and language is not None:
+            # Keine Kategorie über dem Schwellwert: alle Partitionen der Sprache durchsuchen
+            matches = search_partitions(index, query, k, language, None, nprobe)
+            if not language_guessed or (matches and matches[0]["score"] > SIMILARITY_THRESHOLD):
+                return matches
+            # Geratene Sprache evtl. falsch erkannt: weiter mit der Suche über alle Regeln
+
+    ann = index.get("ann")
+    if ann is not None and index.get("ready") is None:
+        rows, scores = ann.search(query, max(1, k), nprobe)
+        return [{**index["rules"][i], "score": float(score)} for i, score in zip(rows, scores)]
+
+    scores = matrix_scores(matrix, query)
+    if index.get("ready") is not None:
+        scores = np.where(index["ready"], scores, -np.inf)
+
+    k = max(1, min(k, len(scores)))
+    top = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+    top = top[np.argsort(scores[top])[::-1]]
+    return [{**index["rules"][i], "score": float(scores[i])} for i in top if np.isfinite(scores[i])]
+
+async def find_best_match(text: str, k: int = DEFAULT_TOP_K, nprobe: int | None = None,
+                          language: str | None = None, language_guessed: bool = False):
+    """Liefert (beste Regel über Schwellwert oder None, Top-k-Kandidaten mit Scores)."""
+    query_emb = await embed_query(text)
+
+    if not query_emb:
+        return None, []
+
+    t0 = time.perf_counter()
+    candidates = top_k_matches(RULE_INDEX, query_emb, k, nprobe, language, language_guessed)
+    SEARCH_LATENCY.observe(time.perf_counter() - t0)
+    if candidates and candidates[0]["score"] > SIMILARITY_THRESHOLD:
+        return candidates[0], candidates
+    return None, candidates
+
+# ==================== METRIKEN ====================
+SEARCH_LATENCY = metrics.Histogram("decision_search_duration_seconds", "Ähnlichkeitssuche (ohne Query-Embedding)")
+metrics.Callback(
+    "cache_requests_total", "Lookups im Query-Embedding-Cache nach Ausgang", ("cache", "result"),
+    lambda: {("query_embedding", "hit"): QUERY_CACHE_STATS["hits"],
+             ("query_embedding", "miss"): QUERY_CACHE_STATS["misses"]},
+    kind="counter",
+)
+metrics.Callback("cache_hit_ratio", "Anteil Cache-Treffer an allen Lookups", ("cache",),
+                 lambda: {("query_embedding",): query_cache_info()["hit_ratio"]})
+metrics.Callback("cache_evictions_total", "Verdrängte Cache-Einträge", ("cache",),
+                 lambda: {("query_embedding",): QUERY_CACHE_STATS["evictions"]}, kind="counter")
+metrics.Callback("decision_rules_loaded", "Abfragbare Regeln im aktuellen Snapshot", (),
+                 lambda: {(): len(RULE_INDEX["rules"]) if RULE_INDEX["ready"] is None
+                          else int(RULE_INDEX["ready"].sum())})
+metrics.Callback("decision_reloads_total", "Ausgetauschte Snapshots durch /reload oder den DB-Watcher", (),
+                 lambda: {(): RELOAD["count"]}, kind="counter")
 
 # ==================== ENDPOINTS ====================
 @app.on_event("startup")
 async def startup_event():
-    await load_rules_with_embeddings()
+    global EMBED_CLIENT, RELOAD_LOCK
+    RELOAD_LOCK = asyncio.Lock()   # an die Event-Loop des Servers gebunden
+    EMBED_CLIENT = httpx.AsyncClient(
+        timeout=30.0, limits=httpx.Limits(max_connections=EMBED_CONCURRENCY * 2 + 10)
+    )
+    # Warm-up im Hintergrund – der Service nimmt sofort Anfragen an
+    app.state.warmup_task = asyncio.create_task(warmup_index())
+    if RULE_WATCH_INTERVAL > 0:
+        app.state.watch_task = asyncio.create_task(rule_watch_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for name in ("warmup_task", "watch_task"):
+        task = getattr(app.state, name, None)
+        if task is not None and not task.done():
+            task.cancel()
+    if EMBED_CLIENT is not None:
+        await EMBED_CLIENT.aclose()
+
+def bad_request(message: str) -> JSONResponse:
+    return JSONResponse(status_code=400, content={"error": message})
+
+def parse_json_object(body: bytes):
+    """Body als JSON-Objekt; leerer Body = {}. Liefert (Daten, Fehlermeldung)."""
+    if not body.strip():
+        return {}, None
+    try:
+        data = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return None, f"Ungültiges JSON: {e}"
+    if not isinstance(data, dict):
+        return None, "Body muss ein JSON-Objekt sein"
+    return data, None
+
+def positive_int(data: dict, key: str, default):
+    """Ganzzahl >= 1 aus dem Request (bool und Kommazahlen zählen nicht); liefert (Wert, Fehlermeldung)."""
+    value = data.get(key)
+    if value is None:
+        return default, None
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        return None, f"'{key}' muss eine ganze Zahl >= 1 sein, nicht {value!r}"
+    return value, None
 
 @app.post("/query")
 async def query_decision(request: Request):
-    data = await request.json()
+    data, error = parse_json_object(await request.body())
+    if error:
+        return bad_request(error)
     text = data.get("query", "")
-    logging.info(f"[Decision Engine] Anfrage erhalten: {text}")
+    if not isinstance(text, str):
+        return bad_request("'query' muss ein String sein")
+    top_k, error = positive_int(data, "top_k", DEFAULT_TOP_K)
+    if error:
+        return bad_request(error)
+    nprobe, error = positive_int(data, "nprobe", None)
+    if error:
+        return bad_request(error)
+    language = data.get("language")
+    if language is not None and not isinstance(language, str):
+        return bad_request("'language' muss ein String sein")
+    partitions = RULE_INDEX.get("partitions")
+    language_guessed = language is None and partitions is not None
+    if language_guessed:
+        language = detect_language(text, set(partitions["languages"]))
+    logging.info(f"[Decision Engine] Anfrage erhalten ({language or '?'}): {text}")
 
-    match = await find_best_match(text)
+    match, candidates = await find_best_match(text, top_k, nprobe, language, language_guessed)
     if not match:
-        return {"decision": None, "reason": "No semantic match found."}
+        return {"decision": None, "reason": "No semantic match found.", "candidates": candidates,
+                "language": language}
+
+    return {"decision": match, "confidence": "semantic", "candidates": candidates, "language": language}
 
-    return {"decision": match, "confidence": "semantic"}
+@app.post("/reload")
+async def reload_rules(request: Request):
+    """Lädt geänderte Regeln nach. Optionaler Body vom Installer: {"changed": [...], "removed": [...]}."""
+    data, error = parse_json_object(await request.body())
+    if error:
+        return bad_request(error)
+    if warmup_running():
+        return {"status": "warming", "warmup": WARMUP}
+    if data.get("changed") or data.get("removed"):
+        logging.info(
+            f"[Decision Engine] Reload angefordert: {len(data.get('changed', []))} geändert, "
+            f"{len(data.get('removed', []))} entfernt"
+        )
+    result = await reload_index(force=bool(data.get("force")))
+    return {**result, "summary": f"{result['status']}, {result['rules']} Regeln"}
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "rules_loaded": len(RULE_CACHE)}
+    ready = RULE_INDEX["ready"]
+    loaded = int(ready.sum()) if ready is not None else len(RULE_INDEX["rules"])
+    return {
+        "status": "warming" if WARMUP["state"] == "warming" else "ok",
+        "rules_loaded": loaded,
+        "warmup": {**WARMUP, "progress": round(WARMUP["done"] / max(1, WARMUP["total"]), 3)},
+        "query_cache": query_cache_info(),
+        "embedding_store": EMBED_STORE,
+        "ann": RULE_INDEX["ann"].info() if RULE_INDEX.get("ann") is not None else {"type": "exact"},
+        "partitions": RULE_INDEX["partitions"]["labels"] if RULE_INDEX.get("partitions") is not None else [],
+        "reload": {"count": RELOAD["count"], "last": RELOAD["last"], "watch_interval": RULE_WATCH_INTERVAL},
+        "pid": os.getpid(),
+    }
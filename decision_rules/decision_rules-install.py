@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 import os
 import json
+import time
+import hashlib
 import sqlite3
+import argparse
 import datetime
+import urllib.request
 from pathlib import Path
 
 # -------------------------------------------------------------
@@ -11,12 +15,22 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "decision.db"
 RULES_DIR = BASE_DIR / "jsons"
+# Laufende Decision Engine nach inkrementellem Import benachrichtigen (leer = aus)
+DECISION_ENGINE_URL = os.getenv("DECISION_ENGINE_URL", "http://decision-engine:4500")
+
+RULE_COLUMNS = (
+    "id", "category", "language", "pattern", "tool", "params", "confidence",
+    "examples", "tags", "author", "source", "enabled", "created_at",
+)
 
 # -------------------------------------------------------------
 # SQL INITIALISIERUNG
 # -------------------------------------------------------------
 def init_db():
     conn = sqlite3.connect(DB_PATH)
+    # WAL: Leser (Decision Engine, Pre-Router) blockieren den Import nicht und umgekehrt
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     c = conn.cursor()
     c.execute("""
     CREATE TABLE IF NOT EXISTS decision_rules (
@@ -35,6 +49,26 @@ def init_db():
         created_at TEXT
     )
     """)
+    # Embedding-Cache der Decision Engine, Schlüssel: (Modell, SHA-256 des Patterns)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS rule_embeddings (
+        model TEXT NOT NULL,
+        pattern_hash TEXT NOT NULL,
+        dim INTEGER NOT NULL,
+        vector BLOB NOT NULL,
+        created_at TEXT,
+        PRIMARY KEY (model, pattern_hash)
+    )
+    """)
+    # Inhalts-Hash je importierter Datei – unveränderte Dateien werden übersprungen
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS rule_imports (
+        source TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        rules INTEGER,
+        imported_at TEXT
+    )
+    """)
     conn.commit()
     return conn
 
@@ -50,36 +84,54 @@ def load_json_file(path: Path):
         return None
 
 
-def insert_rule(conn, rule_data):
-    c = conn.cursor()
-    try:
-        c.execute("""
-            INSERT OR REPLACE INTO decision_rules
-            (id, category, language, pattern, tool, params, confidence, examples, tags, author, source, enabled, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            rule_data.get("id"),
-            rule_data.get("category", "default"),
-            rule_data.get("language", "de"),
-            json.dumps(rule_data.get("pattern", "")),
-            rule_data.get("tool"),
-            json.dumps(rule_data.get("params", {})),
-            rule_data.get("confidence", 0.9),
-            json.dumps(rule_data.get("examples", [])),
-            json.dumps(rule_data.get("tags", [])),
-            rule_data.get("author", "unknown"),
-            rule_data.get("source", "local"),
-            1 if rule_data.get("enabled", True) else 0,
-            datetime.datetime.utcnow().isoformat()
-        ))
-        conn.commit()
-    except Exception as e:
-        print(f"❌ Fehler beim Einfügen von Regel {rule_data.get('id')}: {e}")
+def rule_row(rule_data, created_at: str) -> tuple:
+    """Regel → Tabellenzeile in der Reihenfolge von RULE_COLUMNS."""
+    return (
+        rule_data.get("id"),
+        rule_data.get("category", "default"),
+        rule_data.get("language", "de"),
+        json.dumps(rule_data.get("pattern", "")),
+        rule_data.get("tool"),
+        json.dumps(rule_data.get("params", {})),
+        rule_data.get("confidence", 0.9),
+        json.dumps(rule_data.get("examples", [])),
+        json.dumps(rule_data.get("tags", [])),
+        rule_data.get("author", "unknown"),
+        rule_data.get("source", "local"),
+        1 if rule_data.get("enabled", True) else 0,
+        created_at,
+    )
+
+
+def upsert_rules(conn, rows):
+    conn.executemany(f"""
+        INSERT OR REPLACE INTO decision_rules ({", ".join(RULE_COLUMNS)})
+        VALUES ({", ".join("?" for _ in RULE_COLUMNS)})
+    """, rows)
+
+
+def pattern_hash(pattern: str) -> str:
+    """Muss zu decision_engine.pattern_hash passen (Hash über den gespeicherten Pattern-Text)."""
+    return hashlib.sha256(pattern.encode("utf-8")).hexdigest()
+
+
+def invalidate_stale_embeddings(conn):
+    """Entfernt gecachte Embeddings, deren Pattern in keiner Regel mehr vorkommt."""
+    current = {pattern_hash(p) for (p,) in conn.execute("SELECT pattern FROM decision_rules") if p is not None}
+    stale = [
+        (h,) for (h,) in conn.execute("SELECT DISTINCT pattern_hash FROM rule_embeddings")
+        if h not in current
+    ]
+    conn.executemany("DELETE FROM rule_embeddings WHERE pattern_hash=?", stale)
+    conn.commit()
+    return len(stale)
 
 # -------------------------------------------------------------
 # PARSER: SIMPLE vs. ADVANCED
 # -------------------------------------------------------------
-def parse_and_insert(conn, data, source_file):
+def parse_rules(data, source_file) -> list:
+    """Liest alle Regeln einer Datei (eine Regel pro Sprache) ohne DB-Zugriff."""
+    parsed = []
     meta_author = "unknown"
     if isinstance(data, dict) and "meta" in data:
         meta_author = data["meta"].get("author", "unknown")
@@ -94,7 +146,7 @@ def parse_and_insert(conn, data, source_file):
                 # Sprache bestimmen
                 if isinstance(rule.get("pattern"), dict):
                     for lang, pattern in rule["pattern"].items():
-                        insert_rule(conn, {
+                        parsed.append({
                             "id": f"{rule.get('id','unknown')}_{lang}",
                             "category": category_id,
                             "language": lang,
@@ -109,7 +161,7 @@ def parse_and_insert(conn, data, source_file):
                             "enabled": rule.get("enabled", True)
                         })
                 else:
-                    insert_rule(conn, {
+                    parsed.append({
                         "id": rule.get("id","unknown"),
                         "category": category_id,
                         "language": data.get("meta", {}).get("default_language", "de"),
@@ -126,7 +178,7 @@ def parse_and_insert(conn, data, source_file):
 
     # --- Simple Structure ---
     elif isinstance(data, dict) and "tool" in data:
-        insert_rule(conn, {
+        parsed.append({
             "id": data.get("id", "unknown"),
             "category": "default",
             "language": "de",
@@ -144,28 +196,141 @@ def parse_and_insert(conn, data, source_file):
     else:
         print(f"⚠️ Keine gültige Struktur erkannt in {source_file.name}")
 
+    return parsed
+
+# -------------------------------------------------------------
+# IMPORT: EINE TRANSAKTION PRO DATEI
+# -------------------------------------------------------------
+def content_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def existing_rules(conn, source: str) -> dict:
+    """id → Zeile (ohne created_at) aller Regeln, die aus dieser Datei stammen."""
+    cols = ", ".join(RULE_COLUMNS[:-1])
+    return {
+        row[0]: row
+        for row in conn.execute(f"SELECT {cols} FROM decision_rules WHERE source=?", (source,))
+    }
+
+
+def import_file(conn, path: Path, incremental: bool, force: bool) -> dict | None:
+    """Importiert eine Datei atomar; None = unverändert übersprungen.
+
+    Voll: alle Regeln der Datei per executemany schreiben (INSERT OR REPLACE).
+    Inkrementell: nur neue/geänderte Regeln schreiben, entfernte Regeln löschen.
+    """
+    t0 = time.perf_counter()
+    digest = content_hash(path)
+    row = conn.execute("SELECT content_hash FROM rule_imports WHERE source=?", (path.name,)).fetchone()
+    if row and row[0] == digest and not force:
+        return None
+
+    data = load_json_file(path)
+    if not data:
+        return {"file": path.name, "rules": 0, "changed": [], "removed": [], "error": True,
+                "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    now = datetime.datetime.utcnow().isoformat()
+    rows = [rule_row(rule, now) for rule in parse_rules(data, path)]
+    total, removed = len(rows), []
+    with conn:   # eine Transaktion: commit am Ende, rollback bei Fehler
+        if incremental:
+            old = existing_rules(conn, path.name)
+            current = {r[0] for r in rows}
+            removed = [rule_id for rule_id in old if rule_id not in current]
+            rows = [r for r in rows if old.get(r[0]) != r[:-1]]
+            conn.executemany("DELETE FROM decision_rules WHERE id=?", [(rule_id,) for rule_id in removed])
+        upsert_rules(conn, rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO rule_imports (source, content_hash, rules, imported_at) VALUES (?, ?, ?, ?)",
+            (path.name, digest, total, now),
+        )
+    return {"file": path.name, "rules": len(rows), "changed": [r[0] for r in rows], "removed": removed,
+            "error": False, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def remove_missing_sources(conn, present: set) -> list:
+    """Inkrementell: Regeln von Dateien löschen, die es nicht mehr gibt."""
+    gone = [src for (src,) in conn.execute("SELECT source FROM rule_imports") if src not in present]
+    removed = []
+    with conn:
+        for src in gone:
+            removed += [rule_id for (rule_id,) in conn.execute("SELECT id FROM decision_rules WHERE source=?", (src,))]
+            conn.execute("DELETE FROM decision_rules WHERE source=?", (src,))
+            conn.execute("DELETE FROM rule_imports WHERE source=?", (src,))
+    return removed
+
+
+def notify_engine(changed: list, removed: list):
+    """Teilt einer laufenden Decision Engine die geänderten Regel-IDs mit (POST /reload)."""
+    if not DECISION_ENGINE_URL:
+        return
+    body = json.dumps({"changed": changed, "removed": removed}).encode("utf-8")
+    req = urllib.request.Request(
+        DECISION_ENGINE_URL.rstrip("/") + "/reload", data=body,
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            result = json.loads(resp.read() or b"{}")
+        print(f"📦 [INFO] 🔄 Decision Engine neu geladen: {result.get('summary', result)}")
+    except Exception as e:
+        print(f"⚠️ Decision Engine nicht erreichbar ({DECISION_ENGINE_URL}): {e}")
+
 # -------------------------------------------------------------
 # MAIN
 # -------------------------------------------------------------
 def main():
+    parser = argparse.ArgumentParser(description="Decision Rules Installer")
+    parser.add_argument("--incremental", action="store_true",
+                        help="nur geänderte Regeln schreiben, entfernte löschen und die Decision Engine benachrichtigen")
+    parser.add_argument("--force", action="store_true", help="auch unveränderte Dateien neu importieren")
+    parser.add_argument("--no-notify", action="store_true", help="Decision Engine nicht benachrichtigen")
+    args = parser.parse_args()
+
     conn = init_db()
-    json_files = [f for f in RULES_DIR.glob("*.json") if f.name != "example.json"]
+    json_files = sorted(f for f in RULES_DIR.glob("*.json") if f.name != "example.json")
 
     if not json_files:
         print("⚠️ Keine JSON-Regeln gefunden.")
         return
 
-    print("📦 [INFO] Decision Rules Installer gestartet")
+    mode = "inkrementell" if args.incremental else "voll"
+    print(f"📦 [INFO] Decision Rules Installer gestartet ({mode})")
 
-    total_new = 0
+    t0 = time.perf_counter()
+    imported = skipped = 0
+    changed, removed = [], []
     for file in json_files:
-        data = load_json_file(file)
-        if not data:
+        result = import_file(conn, file, args.incremental, args.force)
+        if result is None:
+            skipped += 1
+            print(f"📦 [INFO] ⏭️  {file.name}: unverändert")
+            continue
+        if result["error"]:
             continue
-        parse_and_insert(conn, data, file)
-        total_new += 1
+        imported += 1
+        changed += result["changed"]
+        removed += result["removed"]
+        print(f"📦 [INFO] 📄 {file.name}: {result['rules']} geschrieben, "
+              f"{len(result['removed'])} gelöscht ({result['ms']} ms)")
+
+    if args.incremental:
+        gone = remove_missing_sources(conn, {f.name for f in json_files})
+        if gone:
+            removed += gone
+            print(f"📦 [INFO] 🗑️  {len(gone)} Regeln entfernter Dateien gelöscht.")
+
+    elapsed = (time.perf_counter() - t0) * 1000
+    print(f"📦 [INFO] ✅ {imported} Regel-Dateien importiert, {skipped} unverändert ({elapsed:.0f} ms).")
 
-    print(f"📦 [INFO] ✅ {total_new} Regel-Dateien importiert.")
+    if changed or removed:
+        stale = invalidate_stale_embeddings(conn)
+        if stale:
+            print(f"📦 [INFO] 🧹 {stale} veraltete Embeddings aus dem Cache entfernt.")
+        if args.incremental and not args.no_notify:
+            notify_engine(changed, removed)
     print("📦 [INFO] 🏁 Installation abgeschlossen.")
 
     conn.close()
@@ -1,10 +1,18 @@
 # mcp_hub.py - MCP Tool Hub v2.0.0
 # Zentrale Routing-Schicht für Tools (time, weather, docs, etc.)
+import asyncio
+import json
+from collections import OrderedDict, deque
 import logging
+import os
 from fastapi import FastAPI, Request
 import httpx
 import time
 
+import http_pool
+import metrics
+import tracing
+
 # ---------------------------------------------------------
 # Logging Setup
 # ---------------------------------------------------------
@@ -15,19 +23,398 @@ logging.basicConfig(
 logger = logging.getLogger("mcp-hub")
 
 app = FastAPI(title="MCP Tool Hub")
+tracing.setup("mcp-hub")
+metrics.instrument(app)
 
 # ---------------------------------------------------------
-# Tool-Registry – hier kannst du beliebig neue Tools ergänzen
+# Tool-Registry – wird aus mcp_registry.json geladen (Hot-Reload),
+# DEFAULT_TOOLS greift nur, wenn die Datei fehlt
 # ---------------------------------------------------------
-TOOLS = {
+DEFAULT_TOOLS = {
     "time": "http://mcp-time:4210/",
     "weather": "http://mcp-weather:4220/",
     "docs": "http://mcp-docs:4230/"
 }
+REGISTRY_PATH = os.getenv("MCP_REGISTRY_PATH", "/app/config/mcp_registry.json")
+REGISTRY_POLL_SECONDS = float(os.getenv("REGISTRY_POLL_SECONDS", "2"))
 
 # Timeout-Konfiguration
 DEFAULT_TIMEOUT = 20.0
 
+# Aktive Routing-Tabelle (nur aktivierte Server). Wird bei Änderungen komplett
+# ersetzt – laufende Requests behalten die Route, die sie beim Start gelesen haben.
+TOOLS = dict(DEFAULT_TOOLS)
+TOOL_TIMEOUTS: dict[str, float] = {}
+TOOL_CACHE_TTLS: dict[str, float] = {}   # opt-in per Registry-Feld "cacheTtl" (Sekunden)
+DISABLED_TOOLS: set[str] = set()
+REGISTRY_STATE = {"source": "builtin", "mtime": None, "auto_reload": False, "loaded_at": None, "missing": False}
+
+# Hintergrund-Healthchecks: alle Tools parallel, /health antwortet aus dem Cache
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL", "10"))
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT", "3"))
+HEALTH: dict[str, dict] = {}
+
+# Circuit Breaker pro Tool: closed → open (Fast-Fail) → half_open (ein Probe-Request) → closed
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))              # letzte N Aufrufe
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "5"))  # langsamer Aufruf zählt als Fehler
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "15"))
+BREAKER_HEALTH_FAILURES = int(os.getenv("BREAKER_HEALTH_FAILURES", "2"))
+BREAKERS: dict[str, dict] = {}
+
+# Ergebnis-Cache für idempotente Tool-Aufrufe (LRU mit Speicher-Obergrenze)
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE: OrderedDict = OrderedDict()   # Schlüssel → (läuft ab um, Größe, Antwort)
+RESPONSE_CACHE_STATS = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "bytes": 0}
+INFLIGHT: dict[str, asyncio.Future] = {}       # Single-Flight: gleiche Aufrufe teilen einen Request
+
+# ---------------------------------------------------------
+# HTTP-Client-Pool – ein langlebiger Client pro Tool
+# Limits global oder pro Tool überschreibbar, z. B. TIME_MAX_CONNECTIONS
+# ---------------------------------------------------------
+
+CLIENTS: dict[str, httpx.AsyncClient] = {}
+
+
+def get_client(tool: str) -> httpx.AsyncClient:
+    """Liefert den gepoolten Client eines Tools (wird bei Bedarf angelegt)."""
+    client = CLIENTS.get(tool)
+    if client is None:
+        client = CLIENTS[tool] = http_pool.create_client(tool, DEFAULT_TIMEOUT)
+    return client
+
+
+async def retire_client(client: httpx.AsyncClient, grace: float):
+    """Schließt den Client eines entfernten Tools erst, wenn laufende Requests fertig sind."""
+    await asyncio.sleep(grace)
+    await client.aclose()
+
+
+# ---------------------------------------------------------
+# Registry laden & beobachten
+# ---------------------------------------------------------
+def read_registry(path: str) -> dict:
+    """Parst mcp_registry.json in Routing-Tabelle, Timeouts und deaktivierte Server."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    tools, timeouts, cache_ttls, disabled = {}, {}, {}, set()
+    for server in data.get("servers", []):
+        tool_id, url = server.get("id"), server.get("url")
+        if not tool_id or not url:
+            logger.warning(f"[Hub] Registry-Eintrag ohne id/url ignoriert: {server}")
+            continue
+        if not server.get("enabled", True):
+            disabled.add(tool_id)
+            continue
+        tools[tool_id] = url
+        if server.get("timeout") is not None:
+            timeouts[tool_id] = float(server["timeout"])
+        if server.get("cacheTtl"):
+            cache_ttls[tool_id] = float(server["cacheTtl"])
+
+    return {
+        "tools": tools,
+        "timeouts": timeouts,
+        "cache_ttls": cache_ttls,
+        "disabled": disabled,
+        "auto_reload": bool(data.get("autoReload", False)),
+    }
+
+
+def apply_registry(registry: dict, source: str, mtime=None):
+    """Tauscht die Routing-Tabelle atomar aus (keine awaits dazwischen)."""
+    global TOOLS, TOOL_TIMEOUTS, TOOL_CACHE_TTLS, DISABLED_TOOLS
+    old_tools, old_timeouts = TOOLS, TOOL_TIMEOUTS
+    TOOLS = registry["tools"]
+    TOOL_TIMEOUTS = registry["timeouts"]
+    TOOL_CACHE_TTLS = registry.get("cache_ttls", {})
+    DISABLED_TOOLS = registry["disabled"]
+    REGISTRY_STATE.update(
+        source=source, mtime=mtime, auto_reload=registry["auto_reload"], loaded_at=time.time()
+    )
+
+    loop = asyncio.get_running_loop()
+    for tool in TOOLS:
+        get_client(tool)
+        if old_tools.get(tool) != TOOLS[tool] and tool in HEALTH:
+            # Neue URL → sofort neu prüfen statt bis zum nächsten Intervall zu warten
+            loop.create_task(probe_tool(tool, TOOLS[tool]))
+    for tool in set(old_tools) - set(TOOLS):
+        client = CLIENTS.pop(tool, None)
+        if client is not None:
+            grace = old_timeouts.get(tool, DEFAULT_TIMEOUT) + 1.0
+            loop.create_task(retire_client(client, grace))
+
+    if old_tools != TOOLS or old_timeouts != TOOL_TIMEOUTS:
+        logger.info(
+            f"[Hub] Registry geladen ({source}): aktiv={sorted(TOOLS)}, deaktiviert={sorted(DISABLED_TOOLS)}"
+        )
+
+
+def load_registry():
+    """Lädt die Registry-Datei; bei Fehlern bleibt die bisherige Tabelle aktiv."""
+    try:
+        mtime = os.stat(REGISTRY_PATH).st_mtime_ns
+    except FileNotFoundError:
+        # Nur beim Übergang vorhanden → fehlend reagieren, nicht bei jedem Poll
+        if REGISTRY_STATE["missing"]:
+            return
+        REGISTRY_STATE["missing"] = True
+        if REGISTRY_STATE["loaded_at"] is None:
+            logger.warning(f"[Hub] {REGISTRY_PATH} fehlt – nutze eingebaute Tool-Liste.")
+            apply_registry(
+                {"tools": dict(DEFAULT_TOOLS), "timeouts": {}, "cache_ttls": {}, "disabled": set(),
+                 "auto_reload": True},
+                source="builtin",
+            )
+        else:
+            logger.warning(f"[Hub] {REGISTRY_PATH} fehlt – behalte bisherige Routen ({REGISTRY_STATE['source']}).")
+        return
+    REGISTRY_STATE["missing"] = False
+    if mtime == REGISTRY_STATE["mtime"]:
+        return
+    try:
+        registry = read_registry(REGISTRY_PATH)
+    except Exception as e:
+        logger.error(f"[Hub] Registry fehlerhaft, behalte bisherige Routen: {e}")
+        REGISTRY_STATE["mtime"] = mtime
+        return
+    apply_registry(registry, source=REGISTRY_PATH, mtime=mtime)
+
+
+async def watch_registry():
+    """Pollt die mtime der Registry und lädt Änderungen ohne Neustart."""
+    while True:
+        await asyncio.sleep(REGISTRY_POLL_SECONDS)
+        if REGISTRY_STATE["auto_reload"]:
+            load_registry()
+
+
+# ---------------------------------------------------------
+# Circuit Breaker
+# ---------------------------------------------------------
+def get_breaker(tool: str) -> dict:
+    breaker = BREAKERS.get(tool)
+    if breaker is None:
+        breaker = BREAKERS[tool] = {
+            "state": "closed", "opened_at": 0.0, "probe_in_flight": False,
+            "calls": deque(maxlen=BREAKER_WINDOW), "trips": 0, "reason": None,
+        }
+    return breaker
+
+
+def open_breaker(tool: str, reason: str):
+    breaker = get_breaker(tool)
+    if breaker["state"] != "open":
+        breaker["trips"] += 1
+        logger.warning(f"[Hub] Circuit für '{tool}' geöffnet: {reason}")
+    breaker.update(state="open", opened_at=time.monotonic(), probe_in_flight=False, reason=reason)
+
+
+def close_breaker(tool: str):
+    breaker = get_breaker(tool)
+    if breaker["state"] != "closed":
+        logger.info(f"[Hub] Circuit für '{tool}' geschlossen.")
+    breaker.update(state="closed", probe_in_flight=False, reason=None)
+    breaker["calls"].clear()
+
+
+def breaker_allow(tool: str) -> bool:
+    """Darf ein Request durch? Im half_open-Zustand genau einer (Probe)."""
+    breaker = get_breaker(tool)
+    if breaker["state"] == "open":
+        if time.monotonic() - breaker["opened_at"] < BREAKER_OPEN_SECONDS:
+            return False
+        breaker["state"] = "half_open"
+    if breaker["state"] == "half_open":
+        if breaker["probe_in_flight"]:
+            return False
+        breaker["probe_in_flight"] = True
+    return True
+
+
+def breaker_record(tool: str, ok: bool, elapsed: float):
+    breaker = get_breaker(tool)
+    ok = ok and elapsed < BREAKER_SLOW_SECONDS
+    if breaker["state"] == "half_open":
+        if ok:
+            close_breaker(tool)
+        else:
+            open_breaker(tool, "Probe-Request fehlgeschlagen")
+        return
+    calls = breaker["calls"]
+    calls.append(ok)
+    if breaker["state"] == "closed" and len(calls) >= BREAKER_MIN_CALLS:
+        error_rate = calls.count(False) / len(calls)
+        if error_rate >= BREAKER_ERROR_RATE:
+            open_breaker(tool, f"Fehlerrate {error_rate:.0%} in den letzten {len(calls)} Aufrufen")
+
+
+def release_probe(tool: str):
+    """Abgebrochener Request ohne Urteil über das Tool: nur den Probe-Platz wieder freigeben."""
+    breaker = get_breaker(tool)
+    if breaker["state"] == "half_open":
+        breaker["probe_in_flight"] = False
+
+
+def breaker_snapshot(tool: str) -> dict:
+    breaker = get_breaker(tool)
+    calls = breaker["calls"]
+    retry_after = 0.0
+    if breaker["state"] == "open":
+        retry_after = max(0.0, BREAKER_OPEN_SECONDS - (time.monotonic() - breaker["opened_at"]))
+    return {
+        "state": breaker["state"],
+        "error_rate": round(calls.count(False) / len(calls), 3) if calls else 0.0,
+        "window_calls": len(calls),
+        "trips": breaker["trips"],
+        "retry_after": round(retry_after, 2),
+        "reason": breaker["reason"],
+    }
+
+
+# ---------------------------------------------------------
+# Ergebnis-Cache
+# ---------------------------------------------------------
+def cache_key(tool: str, body: dict) -> str:
+    """Tool + kanonisierte Parameter; JSON-RPC-id und -Version gehören nicht zum Schlüssel."""
+    params = {k: v for k, v in body.items() if k not in ("id", "jsonrpc")}
+    return tool + ":" + json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def cache_get(key: str):
+    entry = RESPONSE_CACHE.get(key)
+    if entry is None:
+        return None
+    expires_at, size, response = entry
+    if time.monotonic() >= expires_at:
+        del RESPONSE_CACHE[key]
+        RESPONSE_CACHE_STATS["bytes"] -= size
+        return None
+    RESPONSE_CACHE.move_to_end(key)
+    return response
+
+
+def cache_put(key: str, response: dict, ttl: float):
+    size = len(key) + len(json.dumps(response, default=str))
+    if size > RESPONSE_CACHE_MAX_BYTES:
+        return
+    old = RESPONSE_CACHE.pop(key, None)
+    if old is not None:
+        RESPONSE_CACHE_STATS["bytes"] -= old[1]
+    RESPONSE_CACHE[key] = (time.monotonic() + ttl, size, response)
+    RESPONSE_CACHE_STATS["bytes"] += size
+    while RESPONSE_CACHE_STATS["bytes"] > RESPONSE_CACHE_MAX_BYTES:
+        _, (_, evicted, _) = RESPONSE_CACHE.popitem(last=False)
+        RESPONSE_CACHE_STATS["bytes"] -= evicted
+        RESPONSE_CACHE_STATS["evictions"] += 1
+
+
+def with_request_id(response: dict, body: dict, cache_status: str) -> dict:
+    """Kopie der gecachten Antwort mit der JSON-RPC-id des aktuellen Aufrufers."""
+    response = {**response, "cache": cache_status}
+    result = response.get("result")
+    if isinstance(result, dict) and "id" in result and isinstance(body, dict):
+        response["result"] = {**result, "id": body.get("id")}
+    return response
+
+
+def cache_info() -> dict:
+    lookups = RESPONSE_CACHE_STATS["hits"] + RESPONSE_CACHE_STATS["misses"]
+    return {
+        **RESPONSE_CACHE_STATS,
+        "entries": len(RESPONSE_CACHE),
+        "max_bytes": RESPONSE_CACHE_MAX_BYTES,
+        "hit_ratio": round(RESPONSE_CACHE_STATS["hits"] / lookups, 3) if lookups else 0.0,
+        "ttls": dict(TOOL_CACHE_TTLS),
+    }
+
+
+# Cache- und Breaker-Zustand werden erst beim Scrape gelesen – kein Zusatzaufwand pro Aufruf
+metrics.Callback(
+    "cache_requests_total", "Lookups im Ergebnis-Cache nach Ausgang", ("cache", "result"),
+    lambda: {("response", result): RESPONSE_CACHE_STATS[key]
+             for result, key in (("hit", "hits"), ("miss", "misses"), ("coalesced", "coalesced"))},
+    kind="counter",
+)
+metrics.Callback("cache_hit_ratio", "Anteil Cache-Treffer an allen Lookups", ("cache",),
+                 lambda: {("response",): cache_info()["hit_ratio"]})
+metrics.Callback("cache_bytes", "Belegter Speicher des Ergebnis-Caches", ("cache",),
+                 lambda: {("response",): RESPONSE_CACHE_STATS["bytes"]})
+metrics.Callback("cache_evictions_total", "Verdrängte Cache-Einträge", ("cache",),
+                 lambda: {("response",): RESPONSE_CACHE_STATS["evictions"]}, kind="counter")
+metrics.Callback("circuit_breaker_open", "1 = Circuit des Tools offen oder half_open", ("tool",),
+                 lambda: {(tool,): int(get_breaker(tool)["state"] != "closed") for tool in TOOLS})
+
+
+# ---------------------------------------------------------
+# Health-Prober (Hintergrund)
+# ---------------------------------------------------------
+async def probe_tool(tool: str, url: str):
+    """Prüft ein Tool und aktualisiert Latenz und Fehlerzähler im Cache."""
+    state = HEALTH.setdefault(tool, {"alive": None, "latency_ms": None, "consecutive_failures": 0,
+                                     "last_checked": None, "last_error": None})
+    t0 = time.monotonic()
+    try:
+        r = await get_client(tool).get(url.rstrip("/") + "/health", timeout=HEALTH_TIMEOUT)
+        alive = r.status_code == 200
+        error = None if alive else f"HTTP {r.status_code}"
+    except Exception as e:
+        alive, error = False, str(e) or type(e).__name__
+    state.update(
+        alive=alive,
+        latency_ms=round((time.monotonic() - t0) * 1000, 2),
+        consecutive_failures=0 if alive else state["consecutive_failures"] + 1,
+        last_checked=time.time(),
+        last_error=error,
+    )
+
+    # Health-Ergebnis speist den Circuit Breaker
+    breaker = get_breaker(tool)
+    if not alive and state["consecutive_failures"] >= BREAKER_HEALTH_FAILURES:
+        if breaker["state"] == "closed":
+            open_breaker(tool, f"Healthcheck {state['consecutive_failures']}x fehlgeschlagen: {error}")
+    elif alive and breaker["state"] == "open":
+        # Tool wieder erreichbar → nächster Request darf als Probe durch
+        breaker["opened_at"] = 0.0
+
+
+async def probe_all():
+    tools = TOOLS
+    for tool in set(HEALTH) - set(tools):
+        HEALTH.pop(tool, None)
+        BREAKERS.pop(tool, None)
+    await asyncio.gather(*(probe_tool(tool, url) for tool, url in tools.items()))
+
+
+async def health_loop():
+    while True:
+        try:
+            await probe_all()
+        except Exception:
+            logger.exception("[Hub] Health-Probe fehlgeschlagen:")
+        await asyncio.sleep(HEALTH_INTERVAL)
+
+
+@app.on_event("startup")
+async def startup_event():
+    load_registry()
+    app.state.registry_watcher = asyncio.create_task(watch_registry())
+    app.state.health_prober = asyncio.create_task(health_loop())
+    tracing.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.registry_watcher.cancel()
+    app.state.health_prober.cancel()
+    for client in CLIENTS.values():
+        await client.aclose()
+    CLIENTS.clear()
+    await tracing.stop()
+
 
 # ---------------------------------------------------------
 # Utility – sicheres JSON-Antwort-Parsing
@@ -57,45 +444,164 @@ async def root():
 @app.get("/manifest")
 async def manifest():
     """Zeigt aktuelle Tool-Registry."""
-    return {"tools": TOOLS, "count": len(TOOLS)}
+    return {
+        "tools": TOOLS,
+        "count": len(TOOLS),
+        "disabled": sorted(DISABLED_TOOLS),
+        "timeouts": {tool: TOOL_TIMEOUTS.get(tool, DEFAULT_TIMEOUT) for tool in TOOLS},
+        "registry": REGISTRY_STATE,
+        "breakers": {tool: breaker_snapshot(tool) for tool in TOOLS},
+        "response_cache": cache_info(),
+        "tracing": tracing.info(),
+    }
 
 
 # ---------------------------------------------------------
 # Tool-Aufrufe
 # ---------------------------------------------------------
+@app.post("/batch")
+async def call_batch(request: Request):
+    """Verteilt mehrere Tool-Aufrufe parallel: [{"tool": "time", "body": {...}}, ...]."""
+    try:
+        calls = await request.json()
+    except Exception:
+        logger.error("[Hub] Batch enthält kein valides JSON.")
+        return {"error": "Invalid JSON body."}
+    if isinstance(calls, dict):
+        calls = calls.get("calls", [])
+    if not isinstance(calls, list) or not calls:
+        return {"error": "Batch muss eine nicht-leere Liste von Aufrufen sein."}
+
+    async def one(call):
+        if not isinstance(call, dict) or not call.get("tool"):
+            return {"error": "Batch-Eintrag braucht 'tool' und 'body'."}
+        return await route_call(call["tool"], call.get("body", {}))
+
+    logger.info(f"[Hub] Batch mit {len(calls)} Aufrufen")
+    with tracing.server_span("POST /batch", request.headers, calls=len(calls)):
+        return await asyncio.gather(*(one(call) for call in calls))
+
+
 @app.post("/{tool}")
 async def call_tool(tool: str, request: Request):
     """Leitet JSON-RPC Requests an das passende Tool weiter."""
-    if tool not in TOOLS:
+    try:
+        body = await request.json()
+    except Exception:
+        logger.error("[Hub] Request enthält kein valides JSON.")
+        return {"error": "Invalid JSON body."}
+
+    with tracing.server_span(f"POST /{tool}", request.headers, tool=tool):
+        return await route_call(tool, body)
+
+
+async def route_call(tool: str, body):
+    """Routing, Cache und Single-Flight für einen Tool-Aufruf."""
+    # Route einmalig lesen – ein Registry-Reload ändert laufende Requests nicht mehr
+    target_url = TOOLS.get(tool)
+    timeout = TOOL_TIMEOUTS.get(tool, DEFAULT_TIMEOUT)
+    if target_url is None:
+        if tool in DISABLED_TOOLS:
+            logger.warning(f"[Hub] Tool '{tool}' ist deaktiviert.")
+            return {
+                "error": f"Tool '{tool}' ist deaktiviert.",
+                "available_tools": list(TOOLS.keys())
+            }
         logger.warning(f"[Hub] Unbekanntes Tool '{tool}' angefragt.")
         return {
             "error": f"Tool '{tool}' ist nicht registriert.",
             "available_tools": list(TOOLS.keys())
         }
+    client = get_client(tool)
+    cache_ttl = TOOL_CACHE_TTLS.get(tool)
+
+    if not cache_ttl or not isinstance(body, dict):
+        return await forward_to_tool(tool, target_url, client, timeout, body)
+
+    key = cache_key(tool, body)
+    cached = cache_get(key)
+    if cached is not None:
+        RESPONSE_CACHE_STATS["hits"] += 1
+        with tracing.span("cache.hit", tool=tool):
+            return with_request_id(cached, body, "hit")
+
+    # Single-Flight: ein identischer Aufruf läuft bereits → dessen Ergebnis teilen
+    pending = INFLIGHT.get(key)
+    if pending is not None:
+        RESPONSE_CACHE_STATS["coalesced"] += 1
+        with tracing.span("cache.coalesced", tool=tool):
+            return with_request_id(await asyncio.shield(pending), body, "coalesced")
+
+    RESPONSE_CACHE_STATS["misses"] += 1
+    # Der Upstream-Aufruf läuft als eigener Task: bricht der erste Client ab, bekommen die
+    # angehängten Aufrufer trotzdem ihr Ergebnis (und der Cache wird gefüllt)
+    task = INFLIGHT[key] = asyncio.create_task(
+        fetch_and_cache(tool, target_url, client, timeout, body, key, cache_ttl)
+    )
+    task.add_done_callback(lambda t: finish_inflight(key, t))
+    return {**await asyncio.shield(task), "cache": "miss"}
+
+
+async def fetch_and_cache(tool: str, target_url: str, client: httpx.AsyncClient, timeout: float, body,
+                          key: str, cache_ttl: float) -> dict:
+    """Upstream-Aufruf des Single-Flight-Leaders; cachebare Antworten landen im Cache."""
+    response = await forward_to_tool(tool, target_url, client, timeout, body)
+    result = response.get("result")
+    if response.get("status") == "ok" and isinstance(result, dict) and "error" not in result:
+        cache_put(key, response, cache_ttl)
+    return response
 
-    try:
-        body = await request.json()
-    except Exception:
-        logger.error("[Hub] Request enthält kein valides JSON.")
-        return {"error": "Invalid JSON body."}
 
-    target_url = TOOLS[tool]
+def finish_inflight(key: str, task: asyncio.Task):
+    """Gibt den Schlüssel frei, sobald der Upstream-Task fertig ist."""
+    if INFLIGHT.get(key) is task:
+        INFLIGHT.pop(key)
+    if not task.cancelled():
+        task.exception()  # als abgerufen markieren, falls niemand mehr wartet
+
+
+async def forward_to_tool(tool: str, target_url: str, client: httpx.AsyncClient, timeout: float, body):
+    """Leitet einen Request an das Tool weiter – mit Circuit Breaker."""
+    # Fast-Fail: bekannt tote Tools gar nicht erst anfragen
+    if not breaker_allow(tool):
+        snapshot = breaker_snapshot(tool)
+        return {
+            "jsonrpc": "2.0",
+            "id": body.get("id") if isinstance(body, dict) else None,
+            "tool": tool,
+            "status": "unavailable",
+            "error": {
+                "code": -32003,
+                "message": f"Tool '{tool}' ist nicht erreichbar (Circuit {snapshot['state']}).",
+                "data": {"tool": tool, "breaker": snapshot},
+            },
+        }
+
     logger.info(f"[Hub] → Weiterleitung an {tool}: {target_url}")
 
-    t0 = time.time()
+    t0 = time.monotonic()
+    ok = False
+    cancelled = False
     try:
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            resp = await client.post(target_url, json=body)
+        with tracing.span("tool.call", client=True, tool=tool, url=target_url) as span:
+            resp = await client.post(target_url, json=body, timeout=timeout, headers=tracing.headers())
+            span.set("http.status_code", resp.status_code)
             result = await safe_json_response(resp)
-            elapsed = time.time() - t0
-            logger.info(f"[Hub] Tool '{tool}' erfolgreich ({elapsed:.2f}s)")
+        elapsed = time.monotonic() - t0
+        ok = resp.status_code < 500
+        logger.info(f"[Hub] Tool '{tool}' erfolgreich ({elapsed:.2f}s)")
 
-            return {
-                "tool": tool,
-                "status": "ok",
-                "elapsed": elapsed,
-                "result": result
-            }
+        return {
+            "tool": tool,
+            "status": "ok",
+            "elapsed": elapsed,
+            "result": result
+        }
+
+    except asyncio.CancelledError:
+        # Client hat abgebrochen – sagt nichts über das Tool aus, zählt nicht für den Breaker
+        cancelled = True
+        raise
 
     except httpx.ReadTimeout:
         logger.error(f"[Hub] Timeout beim Tool '{tool}'")
@@ -109,25 +615,27 @@ async def call_tool(tool: str, request: Request):
         logger.exception("[Hub] Unerwarteter Fehler:")
         return {"error": f"Internal error in hub: {e}"}
 
+    finally:
+        elapsed = time.monotonic() - t0
+        if cancelled:
+            release_probe(tool)
+        else:
+            breaker_record(tool, ok, elapsed)
+        metrics.UPSTREAM_LATENCY.observe(elapsed, "tool", tool, "ok" if ok else "error")
+
 
 # ---------------------------------------------------------
 # Health Check
 # ---------------------------------------------------------
 @app.get("/health")
 async def health():
-    """Überprüft den Zustand aller registrierten Tools."""
-    async with httpx.AsyncClient(timeout=3.0) as client:
-        results = {}
-        for name, url in TOOLS.items():
-            try:
-                r = await client.get(url.rstrip("/") + "/health")
-                results[name] = (r.status_code == 200)
-            except Exception:
-                results[name] = False
+    """Zustand aller registrierten Tools – aus dem Cache des Hintergrund-Probers."""
+    results = {name: bool(HEALTH.get(name, {}).get("alive")) for name in TOOLS}
 
-        return {
-            "status": "ok" if all(results.values()) else "degraded",
-            "tools_alive": results,
-            "total_tools": len(TOOLS),
-            "version": "2.0.0"
-        }
+    return {
+        "status": "ok" if all(results.values()) else "degraded",
+        "tools_alive": results,
+        "tools_detail": {name: HEALTH[name] for name in TOOLS if name in HEALTH},
+        "total_tools": len(TOOLS),
+        "version": "2.0.0"
+    }
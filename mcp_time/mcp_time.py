@@ -4,6 +4,8 @@ from datetime import datetime
 import pytz
 import logging
 
+import metrics
+
 logging.basicConfig(
     level=logging.INFO,
     format="[%(asctime)s] %(levelname)s | %(message)s"
@@ -11,6 +13,7 @@ logging.basicConfig(
 logger = logging.getLogger("mcp-time")
 
 app = FastAPI(title="MCP Time Tool")
+metrics.instrument(app)
 
 @app.post("/")
 async def get_time(request: Request):
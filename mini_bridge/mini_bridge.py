@@ -1,13 +1,19 @@
 # mini_bridge.py – Bridge v3.0.0
 # Vollständig MCP-kompatibel, robust, multi-tool-fähig
 
+import asyncio
 import logging
 import json
+import os
 import time
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import StreamingResponse
 import httpx
 
+import http_pool
+import metrics
+import tracing
+
 # -------------------------------------------------------------
 # Logging Setup
 # -------------------------------------------------------------
@@ -16,15 +22,83 @@ logging.basicConfig(
     format="[%(asctime)s] %(levelname)s | %(message)s"
 )
 logger = logging.getLogger("bridge")
+tracing.setup("mini-bridge")
 
 # -------------------------------------------------------------
 # FastAPI App Setup
 # -------------------------------------------------------------
 app = FastAPI(title="Mini MCP Bridge")
+metrics.instrument(app)
 PROMPT_INJECTOR_URL = "http://prompt-injector:4300/api/chat"
+PROMPT_INJECTOR_STREAM_URL = PROMPT_INJECTOR_URL + "/stream"
 
 # -------------------------------------------------------------
-# Beispiel-Tools – später dynamisch erweiterbar
+# HTTP-Client-Pool (ein langlebiger Client pro Upstream, siehe shared/http_pool.py)
+# Limits global oder pro Upstream überschreibbar, z. B. INJECTOR_MAX_CONNECTIONS
+# -------------------------------------------------------------
+
+INJECTOR_CLIENT: httpx.AsyncClient | None = None
+
+# Hintergrund-Healthcheck des Injectors, /health antwortet aus dem Cache
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL", "10"))
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT", "3"))
+HEALTH = {
+    "prompt_injector": {"alive": False, "latency_ms": None, "consecutive_failures": 0,
+                        "last_checked": None, "last_error": None},
+}
+
+
+async def probe_injector():
+    state = HEALTH["prompt_injector"]
+    t0 = time.monotonic()
+    try:
+        ping = await INJECTOR_CLIENT.get(
+            f"{PROMPT_INJECTOR_URL.replace('/api/chat','')}/health", timeout=HEALTH_TIMEOUT
+        )
+        alive = ping.status_code == 200
+        error = None if alive else f"HTTP {ping.status_code}"
+    except Exception as e:
+        alive, error = False, str(e) or type(e).__name__
+    state.update(
+        alive=alive,
+        latency_ms=round((time.monotonic() - t0) * 1000, 2),
+        consecutive_failures=0 if alive else state["consecutive_failures"] + 1,
+        last_checked=time.time(),
+        last_error=error,
+    )
+
+
+async def health_loop():
+    while True:
+        try:
+            await probe_injector()
+        except Exception:
+            logger.exception("[Bridge] Health-Probe fehlgeschlagen:")
+        await asyncio.sleep(HEALTH_INTERVAL)
+
+
+@app.on_event("startup")
+async def startup_event():
+    global INJECTOR_CLIENT, MCP_CLIENT
+    INJECTOR_CLIENT = http_pool.create_client("injector", timeout=60)
+    MCP_CLIENT = http_pool.create_client("mcp", timeout=MCP_CALL_TIMEOUT)
+    app.state.health_prober = asyncio.create_task(health_loop())
+    # Discovery im Hintergrund – bis dahin antwortet tools/list mit den lokalen Tools
+    app.state.discovery = asyncio.create_task(discovery_loop())
+    tracing.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.health_prober.cancel()
+    app.state.discovery.cancel()
+    for client in (INJECTOR_CLIENT, MCP_CLIENT):
+        if client is not None:
+            await client.aclose()
+    await tracing.stop()
+
+# -------------------------------------------------------------
+# Lokale Tools – laufen über den Prompt Injector
 # -------------------------------------------------------------
 AVAILABLE_TOOLS = [
     {
@@ -61,6 +135,121 @@ AVAILABLE_TOOLS = [
     },
 ]
 
+# -------------------------------------------------------------
+# Tool-Discovery: tools/list aller Server aus mcp_registry.json
+# Lokale Tools (oben) + entdeckte Tools = Katalog für tools/list
+# -------------------------------------------------------------
+REGISTRY_PATH = os.getenv("MCP_REGISTRY_PATH", "/app/config/mcp_registry.json")
+DISCOVERY_INTERVAL = float(os.getenv("DISCOVERY_INTERVAL", "60"))
+DISCOVERY_TIMEOUT = float(os.getenv("DISCOVERY_TIMEOUT", "3"))
+MCP_CALL_TIMEOUT = float(os.getenv("MCP_CALL_TIMEOUT", "20"))
+
+MCP_CLIENT: httpx.AsyncClient | None = None
+
+# server_id → {"url", "timeout", "tools", "ok", "latency_ms", "last_checked", "last_error"}
+DISCOVERED: dict[str, dict] = {}
+TOOL_CATALOG = list(AVAILABLE_TOOLS)
+TOOL_OWNERS: dict[str, dict] = {}   # Tool-Name → {"server", "url", "timeout", "name"}
+
+
+def read_registry_servers(path: str) -> list[dict]:
+    """Aktivierte Server (id, url, timeout) aus der Registry – fehlende Datei = keine Server."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"[Bridge] Registry {path} nicht lesbar: {e}")
+        return []
+
+    servers = []
+    for server in data.get("servers", []):
+        if not server.get("id") or not server.get("url") or not server.get("enabled", True):
+            continue
+        servers.append({
+            "id": server["id"],
+            "name": server.get("name", server["id"]),
+            "url": server["url"],
+            "timeout": float(server.get("timeout") or MCP_CALL_TIMEOUT),
+        })
+    return servers
+
+
+def fallback_tool(server: dict) -> dict:
+    # Server ohne tools/list (z. B. mcp_time) werden als ein Tool mit ihrer id angeboten
+    return {
+        "name": server["id"],
+        "description": server["name"],
+        "inputSchema": {"type": "object", "properties": {}},
+    }
+
+
+def rebuild_catalog():
+    """Fügt lokale und entdeckte Tools zusammen; bei Namenskonflikten gewinnt der Erste."""
+    global TOOL_CATALOG, TOOL_OWNERS
+    catalog = list(AVAILABLE_TOOLS)
+    owners = {}
+    names = {t["name"] for t in AVAILABLE_TOOLS}
+    for server_id, entry in DISCOVERED.items():
+        for tool in entry["tools"]:
+            if tool["name"] in names:
+                logger.warning(f"[Bridge] Tool '{tool['name']}' von '{server_id}' doppelt – ignoriert.")
+                continue
+            names.add(tool["name"])
+            catalog.append(tool)
+            owners[tool["name"]] = {"server": server_id, "url": entry["url"], "timeout": entry["timeout"]}
+    TOOL_CATALOG, TOOL_OWNERS = catalog, owners
+    build_static_responses()
+
+
+async def discover_server(server: dict):
+    """Fragt einen Server ab und aktualisiert den Katalog sofort – unabhängig von den anderen."""
+    entry = DISCOVERED.setdefault(server["id"], {"tools": [], "ok": False, "latency_ms": None,
+                                                 "last_checked": None, "last_error": None})
+    entry.update(url=server["url"], timeout=server["timeout"])
+    t0 = time.monotonic()
+    try:
+        resp = await MCP_CLIENT.post(
+            server["url"],
+            json={"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
+            timeout=DISCOVERY_TIMEOUT,
+        )
+        resp.raise_for_status()
+        result = resp.json().get("result") or {}
+        tools = result.get("tools") if isinstance(result, dict) else None
+        if isinstance(tools, list):
+            tools = [t for t in tools if isinstance(t, dict) and t.get("name")]
+        else:
+            tools = [fallback_tool(server)]
+        entry.update(tools=tools, ok=True, last_error=None)
+    except Exception as e:
+        # Letzten bekannten Stand behalten – ein kurzer Ausfall leert den Katalog nicht
+        entry.update(ok=False, last_error=str(e) or type(e).__name__)
+        logger.warning(f"[Bridge] Discovery bei '{server['id']}' fehlgeschlagen: {entry['last_error']}")
+    entry.update(latency_ms=round((time.monotonic() - t0) * 1000, 2), last_checked=time.time())
+    rebuild_catalog()
+
+
+async def discover_tools():
+    servers = read_registry_servers(REGISTRY_PATH)
+    active = {s["id"] for s in servers}
+    for server_id in list(DISCOVERED):
+        if server_id not in active:
+            del DISCOVERED[server_id]
+    rebuild_catalog()
+    await asyncio.gather(*(discover_server(s) for s in servers))
+    logger.info(f"[Bridge] Tool-Katalog: {len(TOOL_CATALOG)} Tools von {len(servers)} Servern")
+
+
+async def discovery_loop():
+    while True:
+        try:
+            await discover_tools()
+        except Exception:
+            logger.exception("[Bridge] Tool-Discovery fehlgeschlagen:")
+        await asyncio.sleep(DISCOVERY_INTERVAL)
+
 # -------------------------------------------------------------
 # Utility: Safe JSON decode
 # -------------------------------------------------------------
@@ -75,219 +264,379 @@ async def safe_json_response(resp: httpx.Response) -> dict:
 # -------------------------------------------------------------
 # MCP Handler
 # -------------------------------------------------------------
+def encode_json(obj) -> bytes:
+    # Gleiche Serialisierung wie FastAPIs JSONResponse
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dump_response(response) -> bytes:
+    """Vorgefertigte Bytes durchreichen, Dicts serialisieren."""
+    return response if isinstance(response, bytes) else encode_json(response)
+
+
 @app.post("/")
 async def handle_mcp(request: Request):
     try:
-        data = await request.json()
+        data = json.loads(await request.body())
     except Exception as e:
         logger.error(f"[Bridge] Ungültige JSON-Anfrage: {e}")
         return {"error": "Invalid JSON"}
 
-    method = data.get("method")
-    req_id = data.get("id")
+    # ⚡ Fast Path: ping ohne Dispatch und ohne Logging
+    if isinstance(data, dict) and data.get("method") == "ping" and data.get("id") is not None:
+        t0 = time.perf_counter()
+        content = splice_id(STATIC_RESPONSES["ping"], data["id"])
+        RPC_LATENCY.observe(time.perf_counter() - t0, "ping")
+        return Response(content=content, media_type="application/json")
+
+    with tracing.server_span("POST /", request.headers, batch=isinstance(data, list)):
+        # JSON-RPC 2.0 Batch: alle Requests parallel, Antworten gesammelt in einem Array
+        if isinstance(data, list):
+            if not data:
+                return invalid_request(None)
+            logger.debug(f"[Bridge] Batch mit {len(data)} Nachrichten erhalten")
+            # Jede Nachricht einzeln abgesichert – ein fehlerhafter Handler kippt nicht den ganzen Batch
+            responses = await asyncio.gather(*(safe_process_message(item) for item in data))
+            with tracing.span("serialize"):
+                responses = [dump_response(r) for r in responses if r is not None]
+            if not responses:
+                return Response(status_code=204)
+            return Response(content=b"[" + b",".join(responses) + b"]", media_type="application/json")
+
+        response = await safe_process_message(data)
+        if response is None:
+            return Response(status_code=204)
+        with tracing.span("serialize"):
+            content = dump_response(response)
+        return Response(content=content, media_type="application/json")
+
+
+async def safe_process_message(data) -> dict | bytes | None:
+    """process_message mit JSON-RPC-Fehler (-32603) statt HTTP 500 – für Einzel- und Batch-Nachrichten."""
+    try:
+        return await process_message(data)
+    except Exception as e:
+        logger.exception("[Bridge] Unerwarteter Fehler in JSON-RPC-Nachricht:")
+        req_id = data.get("id") if isinstance(data, dict) else None
+        if req_id is None:
+            return None   # Notification – keine Antwort, auch nicht im Fehlerfall
+        return {
+            "jsonrpc": "2.0",
+            "id": req_id,
+            "error": {"code": -32603, "message": f"Internal error: {e}"},
+        }
 
-    # 🧩 Fix: Notifications und Requests ohne Methode richtig behandeln
-    if not method:
-        logger.warning("[Bridge] Anfrage ohne 'method' erhalten – sende 204 No Content.")
-        return Response(status_code=204)
 
-    # Notifications (z. B. notifications/initialized)
-    if "notifications/" in method or req_id is None:
-        logger.info(f"[Bridge] Notification erhalten: {method}")
-        return Response(status_code=204)
+def invalid_request(req_id):
+    return {
+        "jsonrpc": "2.0",
+        "id": req_id,
+        "error": {"code": -32600, "message": "Invalid Request"},
+    }
+
+
+# -------------------------------------------------------------
+# Statische Antworten – einmal serialisiert, nur die id wird eingesetzt
+# -------------------------------------------------------------
+STATIC_RESULTS = {
+    "ping": {},
+    "initialize": {
+        "protocolVersion": "2024-11-05",
+        "capabilities": {
+            "tools": {"list": True, "call": True},
+            "resources": {},
+            "roots": {},
+            "sampling": {}
+        },
+        "serverInfo": {
+            "name": "mini-bridge",
+            "version": "3.0.0",
+            "mcpVersion": "1.8.0",
+            "description": "Custom MCP bridge for AnythingLLM"
+        }
+    },
+    "get_capabilities": {"capabilities": {"tools": True, "logging": True}},
+    "resources/list": {"resources": []},
+    "prompts/list": {"prompts": []},
+    "roots/list": {"roots": []},
+}
+
+RESPONSE_PREFIX = b'{"jsonrpc":"2.0","id":'
+STATIC_RESPONSES: dict[str, bytes] = {}   # method → Bytes ab ',"result":...}'
+
+
+def build_static_responses():
+    """Serialisiert alle konstanten Ergebnisse; erneut aufrufen, wenn sich der Tool-Katalog ändert."""
+    results = dict(STATIC_RESULTS, **{"tools/list": {"tools": TOOL_CATALOG}})
+    STATIC_RESPONSES.clear()
+    STATIC_RESPONSES.update({
+        method: b',"result":' + encode_json(result) + b"}"
+        for method, result in results.items()
+    })
+
+
+def splice_id(suffix: bytes, req_id) -> bytes:
+    return RESPONSE_PREFIX + encode_json(req_id) + suffix
+
+
+build_static_responses()
+
+
+# -------------------------------------------------------------
+# Dynamische Methoden
+# -------------------------------------------------------------
+async def handle_shutdown(req_id, params):
+    logger.info("[Bridge] MCP shutdown received")
+    return {
+        "jsonrpc": "2.0",
+        "method": "shutdown",
+        "params": {"status": "ok"}
+    }
 
-    logger.info(f"[MCP] → {method}")
-    params = data.get("params", {})
 
-    # ---------------------------------------------------------
-    # Base Methods
-    # ---------------------------------------------------------
-    if method == "ping":
-        logger.info("[Bridge] Ping erhalten – 200 OK")
+async def call_server_tool(req_id, tool_name: str, args: dict, owner: dict):
+    """Leitet tools/call direkt an den Server weiter, der das Tool anbietet."""
+    logger.info(f"[Bridge] Tool-Call '{tool_name}' → Server '{owner['server']}'")
+    t0 = time.monotonic()
+    try:
+        with metrics.track(metrics.UPSTREAM_LATENCY, "mcp", owner["server"]), \
+                tracing.span("mcp.tools_call", client=True, tool=tool_name, server=owner["server"]):
+            resp = await MCP_CLIENT.post(
+                owner["url"],
+                json={"jsonrpc": "2.0", "id": req_id, "method": "tools/call",
+                      "params": {"name": tool_name, "arguments": args}},
+                headers=tracing.headers(),
+                timeout=owner["timeout"],
+            )
+            data = await safe_json_response(resp)
+    except httpx.TimeoutException:
+        logger.error(f"[Bridge] Timeout bei Server '{owner['server']}'")
         return {
             "jsonrpc": "2.0",
             "id": req_id,
-            "result": {}
+            "error": {"code": -32000, "message": f"Timeout calling tool '{tool_name}'"},
         }
-
-    elif method == "initialize":
+    except httpx.RequestError as e:
+        logger.error(f"[Bridge] Netzwerkfehler zu '{owner['server']}': {e}")
         return {
             "jsonrpc": "2.0",
             "id": req_id,
-            "result": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {
-                    "tools": {"list": True, "call": True},
-                    "resources": {},
-                    "roots": {},
-                    "sampling": {}
-                },
-                "serverInfo": {
-                    "name": "mini-bridge",
-                    "version": "3.0.0",
-                    "mcpVersion": "1.8.0",
-                    "description": "Custom MCP bridge for AnythingLLM"
-                }
-            }
+            "error": {"code": -32001, "message": f"Network error to {owner['server']}: {e}"},
         }
-
-    elif method == "get_capabilities":
+    except Exception as e:
+        logger.exception(f"[Bridge] Unerwarteter Fehler bei Server '{owner['server']}':")
         return {
             "jsonrpc": "2.0",
             "id": req_id,
-            "result": {"capabilities": {"tools": True, "logging": True}},
+            "error": {"code": -32603, "message": f"Internal error: {e}"},
         }
 
-    elif method == "shutdown":
-        logger.info("[Bridge] MCP shutdown received")
+    # Server antwortet evtl. mit nacktem JSON (Liste, String, Zahl) statt einem Objekt
+    if not isinstance(data, dict):
+        data = {"result": data}
+    if "error" in data:
+        error = data["error"]
+        if not isinstance(error, dict):
+            error = {"code": -32603, "message": str(error)}
+        return {"jsonrpc": "2.0", "id": req_id, "error": error}
+    result = data.get("result", data.get("final", data))
+    # Nicht-MCP-Ergebnisse (z. B. {"time": ...}) als Text-Content verpacken
+    if not isinstance(result, dict) or "content" not in result:
+        text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        result = {"content": [{"type": "text", "text": text}], "status": "ok"}
+    result.setdefault("tool", tool_name)
+    result.setdefault("elapsed", time.monotonic() - t0)
+    return {"jsonrpc": "2.0", "id": req_id, "result": result}
+
+
+async def handle_tools_call(req_id, params):
+    tool_name = params.get("name")
+    args = params.get("arguments", {})
+    prompt = args.get("prompt", "")
+
+    owner = TOOL_OWNERS.get(tool_name)
+    if owner is not None:
+        return await call_server_tool(req_id, tool_name, args, owner)
+
+    known_tools = [t["name"] for t in AVAILABLE_TOOLS]
+    if tool_name not in known_tools:
+        logger.warning(f"[Bridge] Unbekanntes Tool: {tool_name}")
         return {
             "jsonrpc": "2.0",
-            "method": "shutdown",
-            "params": {"status": "ok"}
+            "id": req_id,
+            "error": {"code": -32601, "message": f"Unknown tool: {tool_name}"},
         }
 
-    # ---------------------------------------------------------
-    # Tools
-    # ---------------------------------------------------------
-    elif method == "tools/list":
-        logger.info("[Bridge] tools/list aufgerufen")
-        try:
-            return {
-                "jsonrpc": "2.0",
-                "id": req_id,
-                "result": {"tools": AVAILABLE_TOOLS}
-            }
-        except Exception as e:
-            logger.error(f"[Bridge] Fehler bei tools/list: {e}")
-            return {
-                "jsonrpc": "2.0",
-                "id": req_id,
-                "error": {
-                    "code": -32000,
-                    "message": f"tools/list error: {e}"
-                }
-            }
-
-    elif method == "tools/call":
-        tool_name = params.get("name")
-        args = params.get("arguments", {})
-        prompt = args.get("prompt", "")
-
-        known_tools = [t["name"] for t in AVAILABLE_TOOLS]
-        if tool_name not in known_tools:
-            logger.warning(f"[Bridge] Unbekanntes Tool: {tool_name}")
-            return {
-                "jsonrpc": "2.0",
-                "id": req_id,
-                "error": {"code": -32601, "message": f"Unknown tool: {tool_name}"},
-            }
-
-        payload = {"tool": tool_name, "prompt": prompt}
-        logger.info(f"[Bridge] Tool-Call '{tool_name}' → Weiterleitung an Prompt Injector")
-
-        t0 = time.time()
-        try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                resp = await client.post(
-                    PROMPT_INJECTOR_URL,
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                )
+    payload = {"tool": tool_name, "prompt": prompt}
+    logger.info(f"[Bridge] Tool-Call '{tool_name}' → Weiterleitung an Prompt Injector")
 
-                result_data = await safe_json_response(resp)
-                result = (
-                    result_data.get("final")
-                    or result_data.get("response")
-                    or str(result_data)
-                )
-                elapsed = time.time() - t0
-                logger.info(f"[Bridge] Tool '{tool_name}' fertig ({elapsed:.2f}s)")
-
-                return {
-                    "jsonrpc": "2.0",
-                    "id": req_id,
-                    "result": {
-                        "content": [{"type": "text", "text": result}],
-                        "status": "ok",
-                        "tool": tool_name,
-                        "elapsed": elapsed,
-                    },
-                }
-
-        except httpx.ReadTimeout:
-            logger.error("[Bridge] Timeout bei Tool-Aufruf")
-            return {
-                "jsonrpc": "2.0",
-                "id": req_id,
-                "error": {
-                    "code": -32000,
-                    "message": f"Timeout calling tool '{tool_name}'",
-                },
-            }
-
-        except httpx.RequestError as e:
-            logger.error(f"[Bridge] Netzwerkfehler: {e}")
-            return {
-                "jsonrpc": "2.0",
-                "id": req_id,
-                "error": {
-                    "code": -32001,
-                    "message": f"Network error to injector: {e}",
-                },
-            }
+    t0 = time.monotonic()
+    try:
+        with metrics.track(metrics.UPSTREAM_LATENCY, "injector", tool_name), \
+                tracing.span("injector.chat", client=True, tool=tool_name):
+            resp = await INJECTOR_CLIENT.post(
+                PROMPT_INJECTOR_URL,
+                json=payload,
+                headers={"Content-Type": "application/json", **tracing.headers()},
+            )
+            result_data = await safe_json_response(resp)
+        result = (
+            result_data.get("final")
+            or result_data.get("response")
+            or str(result_data)
+        )
+        elapsed = time.monotonic() - t0
+        logger.info(f"[Bridge] Tool '{tool_name}' fertig ({elapsed:.2f}s)")
 
-        except Exception as e:
-            logger.exception("[Bridge] Unerwarteter Fehler:")
-            return {
-                "jsonrpc": "2.0",
-                "id": req_id,
-                "error": {
-                    "code": -32603,
-                    "message": f"Internal bridge error: {e}",
-                },
-            }
-
-    # ---------------------------------------------------------
-    # Additional MCP Methods (AnythingLLM compatibility)
-    # ---------------------------------------------------------
-    elif method == "resources/list":
-        logger.info("[Bridge] resources/list aufgerufen")
         return {
             "jsonrpc": "2.0",
             "id": req_id,
-            "result": {"resources": []}
+            "result": {
+                "content": [{"type": "text", "text": result}],
+                "status": "ok",
+                "tool": tool_name,
+                "elapsed": elapsed,
+            },
+        }
+
+    except httpx.ReadTimeout:
+        logger.error("[Bridge] Timeout bei Tool-Aufruf")
+        return {
+            "jsonrpc": "2.0",
+            "id": req_id,
+            "error": {
+                "code": -32000,
+                "message": f"Timeout calling tool '{tool_name}'",
+            },
         }
 
-    elif method == "prompts/list":
-        logger.info("[Bridge] prompts/list aufgerufen")
+    except httpx.RequestError as e:
+        logger.error(f"[Bridge] Netzwerkfehler: {e}")
         return {
             "jsonrpc": "2.0",
             "id": req_id,
-            "result": {"prompts": []}
+            "error": {
+                "code": -32001,
+                "message": f"Network error to injector: {e}",
+            },
         }
 
-    elif method == "roots/list":
-        logger.info("[Bridge] roots/list aufgerufen")
+    except Exception as e:
+        logger.exception("[Bridge] Unerwarteter Fehler:")
         return {
             "jsonrpc": "2.0",
             "id": req_id,
-            "result": {"roots": []}
+            "error": {
+                "code": -32603,
+                "message": f"Internal bridge error: {e}",
+            },
         }
 
-    # ---------------------------------------------------------
-    # Notifications / Unknown
-    # ---------------------------------------------------------
-    elif method.startswith("notifications/"):
-        logger.info(f"[Bridge] Notification erhalten: {method}")
-        return Response(status_code=204)
 
-    else:
+# Dauer je JSON-RPC-Methode (statische Antworten inklusive)
+RPC_LATENCY = metrics.Histogram("jsonrpc_request_duration_seconds", "JSON-RPC-Methoden der Bridge", ("method",))
+metrics.Callback("bridge_tools_available", "Tools im Katalog (lokal + entdeckt)", (),
+                 lambda: {(): len(TOOL_CATALOG)})
+
+# Dispatch-Registry: Methode → async Handler(req_id, params)
+METHOD_HANDLERS = {
+    "shutdown": handle_shutdown,
+    "tools/call": handle_tools_call,
+}
+
+
+async def process_message(data) -> dict | bytes | None:
+    """Verarbeitet eine einzelne JSON-RPC-Nachricht; None = keine Antwort (Notification)."""
+    if not isinstance(data, dict):
+        return invalid_request(None)
+
+    method = data.get("method")
+    req_id = data.get("id")
+
+    # 🧩 Fix: Notifications und Requests ohne Methode richtig behandeln
+    if not method:
+        logger.warning("[Bridge] Anfrage ohne 'method' erhalten – sende 204 No Content.")
+        return None
+
+    # Notifications (z. B. notifications/initialized)
+    if "notifications/" in method or req_id is None:
+        logger.debug(f"[Bridge] Notification erhalten: {method}")
+        return None
+
+    logger.debug(f"[MCP] → {method}")
+    t0 = time.perf_counter()
+
+    static = STATIC_RESPONSES.get(method)
+    if static is not None:
+        response = splice_id(static, req_id)
+        RPC_LATENCY.observe(time.perf_counter() - t0, method)
+        return response
+
+    handler = METHOD_HANDLERS.get(method)
+    if handler is None:
         logger.warning(f"[Bridge] Unbekannte Methode: {method}")
+        RPC_LATENCY.observe(time.perf_counter() - t0, "unknown")   # beliebige Namen nicht als Label
         return {
             "jsonrpc": "2.0",
             "id": req_id,
             "error": {"code": -32601, "message": f"Method not found: {method}"},
         }
+    try:
+        with tracing.span(f"rpc {method}", rpc_method=method):
+            return await handler(req_id, data.get("params") or {})
+    finally:
+        RPC_LATENCY.observe(time.perf_counter() - t0, method)
+
+# -------------------------------------------------------------
+# Streaming: Injector-NDJSON → OpenAI SSE-Chunks
+# -------------------------------------------------------------
+def sse_chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "delta": delta,
+            "finish_reason": finish_reason
+        }]
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+async def stream_from_injector(payload: dict, model: str, trace_headers=None):
+    """Leitet jedes Delta des Injectors sofort als SSE-Chunk weiter (ohne künstliche Pausen)."""
+    completion_id = "chatcmpl-" + str(time.time())
+    # Der Generator läuft erst nach dem Endpoint – der Trace wird über die Header fortgesetzt
+    with tracing.server_span("stream /v1/chat/completions", trace_headers, model=model) as root:
+        t0 = time.monotonic()
+        deltas = 0
+        try:
+            async with INJECTOR_CLIENT.stream(
+                "POST", PROMPT_INJECTOR_STREAM_URL, json=payload, headers=tracing.headers()
+            ) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if event.get("done"):
+                        break
+                    if event.get("delta"):
+                        if not deltas:
+                            root.set("ttft_ms", round((time.monotonic() - t0) * 1000, 2))
+                        deltas += 1
+                        yield sse_chunk(completion_id, model, {"content": event["delta"]})
+        except Exception as e:
+            logger.error(f"[Bridge] Stream-Fehler: {e}")
+            root.set("error", str(e))
+            yield sse_chunk(completion_id, model, {"content": f"⚠️ Bridge-Fehler: {e}"})
+        root.set("deltas", deltas)
+
+    yield sse_chunk(completion_id, model, {}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
 
 # -------------------------------------------------------------
 # OpenAI-kompatibler Chat Endpoint (mit Streaming-Support)
@@ -303,77 +652,45 @@ async def chat_completions(request: Request):
         
         prompt = messages[-1]["content"] if messages else ""
         logger.info(f"[Bridge] Chat-Anfrage (stream={stream}): {prompt[:80]}...")
-        
+
+        # Bisheriger Verlauf geht mit – der Injector kürzt ihn aufs Kontextfenster des Modells
+        payload = {"prompt": prompt, "messages": messages[:-1]}
+        conversation = data.get("conversation_id") or request.headers.get("x-conversation-id")
+        if conversation:
+            payload["conversation_id"] = conversation
+
+        # STREAMING Response – Deltas des Injectors 1:1 als SSE weiterreichen
+        if stream:
+            return StreamingResponse(
+                stream_from_injector(payload, model, request.headers), media_type="text/event-stream"
+            )
+
         # Anfrage an Prompt-Injector
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(PROMPT_INJECTOR_URL, json={"prompt": prompt})
-            resp.raise_for_status()
-            result = resp.json()
-            
+        with tracing.server_span("POST /v1/chat/completions", request.headers, model=model):
+            with metrics.track(metrics.UPSTREAM_LATENCY, "injector", "chat"), \
+                    tracing.span("injector.chat", client=True):
+                resp = await INJECTOR_CLIENT.post(
+                    PROMPT_INJECTOR_URL, json=payload, headers=tracing.headers()
+                )
+                resp.raise_for_status()
+                result = resp.json()
+
         text = result.get("final") or result.get("response") or str(result)
-        
-        # STREAMING Response
-        if stream:
-            async def generate_stream():
-                import asyncio
-
-                # chunk_size = 4 ist ideal
-                chunk_size = 4  
-
-                # Text in kleine Teile aufsplitten
-                chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-
-                for chunk_text in chunks:
-                    chunk = {
-                        "id": "chatcmpl-" + str(time.time()),
-                        "object": "chat.completion.chunk",
-                        "created": int(time.time()),
-                        "model": model,
-                        "choices": [{
-                            "index": 0,
-                            "delta": {"content": chunk_text},
-                            "finish_reason": None
-                        }]
-                    }
-
-                    yield f"data: {json.dumps(chunk)}\n\n"
-
-                    # leichte Verzögerung für realistische Typing-Illusion
-                    await asyncio.sleep(0.012)  # 12ms optimal
-
-                # final chunk
-                final_chunk = {
-                    "id": "chatcmpl-" + str(time.time()),
-                    "object": "chat.completion.chunk",
-                    "created": int(time.time()),
-                    "model": model,
-                    "choices": [{
-                        "index": 0,
-                        "delta": {},
-                        "finish_reason": "stop"
-                    }]
-                }
-
-                yield f"data: {json.dumps(final_chunk)}\n\n"
-                yield "data: [DONE]\n\n"
-
-            return StreamingResponse(generate_stream(), media_type="text/event-stream")
-        
+
         # NON-STREAMING Response
-        else:
-            return {
-                "id": "chatcmpl-" + str(time.time()),
-                "object": "chat.completion",
-                "created": int(time.time()),
-                "model": model,
-                "choices": [{
-                    "index": 0,
-                    "message": {"role": "assistant", "content": text},
-                    "finish_reason": "stop"
-                }],
-                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
-            }
-            
+        return {
+            "id": "chatcmpl-" + str(time.time()),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
     except Exception as e:
         logger.error(f"[Bridge] Chat-Completion Fehler: {e}")
         return {"error": {"message": str(e), "type": "bridge_error"}}
@@ -383,17 +700,19 @@ async def chat_completions(request: Request):
 # -------------------------------------------------------------
 @app.get("/health")
 async def health():
-    async with httpx.AsyncClient(timeout=3.0) as client:
-        try:
-            ping = await client.get(f"{PROMPT_INJECTOR_URL.replace('/api/chat','')}/health")
-            injector_ok = ping.status_code == 200
-        except Exception:
-            injector_ok = False
+    # Antwort aus dem Cache des Hintergrund-Probers – kein blockierender Upstream-Call
+    injector_ok = HEALTH["prompt_injector"]["alive"]
     return {
         "status": "ok" if injector_ok else "degraded",
         "bridge": "ready",
         "prompt_injector_alive": injector_ok,
-        "tools_available": len(AVAILABLE_TOOLS),
+        "upstreams": HEALTH,
+        "tools_available": len(TOOL_CATALOG),
+        "discovery": {
+            server_id: {k: v for k, v in entry.items() if k != "tools"} | {"tools": len(entry["tools"])}
+            for server_id, entry in DISCOVERED.items()
+        },
+        "tracing": tracing.info(),
         "version": "3.0.0",
         "uptime_hint": "reload-safe",
     }
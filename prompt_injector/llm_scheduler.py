@@ -0,0 +1,266 @@
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+
+logger = logging.getLogger("llm-scheduler")
+
+# 🚦 --- KONFIG ---
+# Eine lokale GPU rechnet ohnehin nacheinander – mehr parallele Requests verlängern nur jede Antwort
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "1"))      # gleichzeitige Generierungen pro Modell
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "8"))                  # Wartende pro Modell, darüber 429
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))       # max. Wartezeit auf einen Slot, danach 503
+LLM_COALESCE = os.getenv("LLM_COALESCE", "1") == "1"                  # identische Prompts teilen eine Generierung
+LLM_SHORT_PROMPT_CHARS = int(os.getenv("LLM_SHORT_PROMPT_CHARS", "200"))
+
+# Kleinere Zahl = früher dran
+PRIORITY_TOOL = 0   # kurze Tool-Routing-Entscheidungen
+PRIORITY_CHAT = 1   # lange Chats / Streaming
+
+_GATES: dict = {}                       # Modell → ModelGate
+_INFLIGHT: dict = {}                    # Schlüssel → [Task, wartende Aufrufer] (Non-Stream)
+_STREAMS: dict = {}                     # Schlüssel → SharedStream
+_SEQ = itertools.count()                # FIFO innerhalb einer Priorität
+
+
+class Overloaded(Exception):
+    """Kein Slot: Warteschlange voll (429) oder Wartezeit überschritten (503)."""
+
+    def __init__(self, model: str, reason: str):
+        self.model = model
+        self.reason = reason
+        self.status = 429 if reason == "queue_full" else 503
+        self.retry_after = max(1, int(LLM_QUEUE_TIMEOUT // 2)) if reason == "queue_full" else int(LLM_QUEUE_TIMEOUT)
+        super().__init__(f"Modell '{model}' ausgelastet ({reason})")
+
+
+# 🎟️ --- SLOTS PRO MODELL ---
+class ModelGate:
+    """Semaphore mit begrenzter Prioritäts-Warteschlange für ein Modell."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.active = 0
+        self.waiters: list = []   # Heap aus [Priorität, Sequenz, Future]
+        self.stats = {"admitted": 0, "waited": 0, "coalesced": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def has_capacity(self) -> bool:
+        return self.active < LLM_MAX_CONCURRENCY or len(self.waiters) < LLM_MAX_QUEUE
+
+    async def acquire(self, priority: int):
+        if self.active < LLM_MAX_CONCURRENCY and not self.waiters:
+            self.active += 1
+            self.stats["admitted"] += 1
+            return
+        if len(self.waiters) >= LLM_MAX_QUEUE:
+            self.stats["rejected_full"] += 1
+            raise Overloaded(self.model, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(_SEQ), future]
+        heapq.heappush(self.waiters, entry)
+        self.stats["waited"] += 1
+        try:
+            await asyncio.wait_for(future, LLM_QUEUE_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot wurde im selben Moment zugeteilt → gleich weitergeben
+                self.release()
+            elif entry in self.waiters:   # release() kann den abgebrochenen Eintrag schon entfernt haben
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["rejected_timeout"] += 1
+                raise Overloaded(self.model, "timeout") from None
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self):
+        # Slot direkt an den nächsten Wartenden übergeben (active bleibt gleich)
+        while self.waiters:
+            future = heapq.heappop(self.waiters)[2]
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+    def info(self) -> dict:
+        return {"active": self.active, "queued": len(self.waiters), **self.stats}
+
+
+def gate(model: str) -> ModelGate:
+    g = _GATES.get(model)
+    if g is None:
+        g = _GATES[model] = ModelGate(model)
+    return g
+
+
+def request_key(model: str, payload: dict) -> str:
+    return hashlib.sha256(json.dumps([model, payload], sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def priority_for(prompt: str, stream: bool, requested=None) -> int:
+    """Explizit per Body ("tool"/"chat"), sonst: Streaming = Chat, kurze Prompts = Tool-Routing."""
+    if requested in ("tool", "high"):
+        return PRIORITY_TOOL
+    if requested in ("chat", "low"):
+        return PRIORITY_CHAT
+    if stream or len(prompt) > LLM_SHORT_PROMPT_CHARS:
+        return PRIORITY_CHAT
+    return PRIORITY_TOOL
+
+
+def check_capacity(model: str, payload: dict):
+    """Schneller Reject vor Beginn einer Streaming-Antwort (Status lässt sich danach nicht mehr setzen)."""
+    if LLM_COALESCE and request_key(model, payload) in _STREAMS:
+        return
+    if not gate(model).has_capacity():
+        gate(model).stats["rejected_full"] += 1
+        raise Overloaded(model, "queue_full")
+
+
+# 🔁 --- NON-STREAM: Single-Flight ---
+async def run(model: str, payload: dict, priority: int, call):
+    """Führt call() mit einem Slot aus; identische laufende Payloads warten auf dasselbe Ergebnis."""
+    g = gate(model)
+    if not LLM_COALESCE:
+        await g.acquire(priority)
+        try:
+            return await call()
+        finally:
+            g.release()
+
+    # Die Generierung läuft als eigener Task: bricht ein Aufrufer ab (auch der erste), bekommen die
+    # anderen trotzdem ihr Ergebnis. Erst wenn keiner mehr wartet, wird sie abgebrochen.
+    key = request_key(model, payload)
+    flight = _INFLIGHT.get(key)
+    if flight is None:
+        flight = _INFLIGHT[key] = [asyncio.create_task(_generate(g, priority, call)), 0]
+        flight[0].add_done_callback(lambda task: _finish(key, flight))
+    else:
+        g.stats["coalesced"] += 1
+    flight[1] += 1
+    try:
+        return await asyncio.shield(flight[0])
+    finally:
+        flight[1] -= 1
+        if flight[1] == 0 and not flight[0].done():
+            # Letzter Aufrufer weg → Slot/GPU freigeben; neue Anfragen starten frisch
+            if _INFLIGHT.get(key) is flight:
+                del _INFLIGHT[key]
+            flight[0].cancel()
+
+
+async def _generate(g: ModelGate, priority: int, call):
+    await g.acquire(priority)
+    try:
+        return await call()
+    finally:
+        g.release()
+
+
+def _finish(key: str, flight: list):
+    if _INFLIGHT.get(key) is flight:
+        del _INFLIGHT[key]
+    if not flight[0].cancelled():
+        flight[0].exception()  # als abgerufen markieren, falls niemand mehr wartet
+
+
+# 🌊 --- STREAM: eine Generierung, mehrere Leser ---
+class SharedStream:
+    """Puffert die Deltas einer Generierung; jeder Leser bekommt sie vollständig ab dem ersten."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: list = []
+        self.done = False
+        self.error: Exception | None = None
+        self.readers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def push(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def close(self, error: Exception | None = None):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        # Neues Event pro Änderung – kein clear(), das andere Leser verpassen könnten
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def read(self):
+        self.readers += 1
+        i = 0
+        try:
+            while True:
+                changed = self._changed
+                while i < len(self.chunks):
+                    yield self.chunks[i]
+                    i += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self.readers -= 1
+            # Letzter Leser weg → Generierung abbrechen, statt die GPU weiter zu belegen
+            if self.readers == 0 and not self.done and self.task is not None:
+                if _STREAMS.get(self.key) is self:
+                    del _STREAMS[self.key]   # neue Anfragen starten frisch statt einen Abbruch mitzulesen
+                self.task.cancel()
+
+
+async def _produce(shared: SharedStream, model: str, priority: int, open_stream):
+    g = gate(model)
+    try:
+        await g.acquire(priority)
+        try:
+            async with contextlib.aclosing(open_stream()) as deltas:
+                async for delta in deltas:
+                    shared.push(delta)
+        finally:
+            g.release()
+        shared.close()
+    except asyncio.CancelledError:
+        shared.close()
+    except Exception as e:
+        shared.close(e)
+    finally:
+        if _STREAMS.get(shared.key) is shared:
+            del _STREAMS[shared.key]
+
+
+def stream(model: str, payload: dict, priority: int, open_stream):
+    """Async-Iterator über die Deltas; identische laufende Streams werden mitgelesen."""
+    g = gate(model)
+    key = request_key(model, payload)
+    shared = _STREAMS.get(key) if LLM_COALESCE else None
+    if shared is not None:
+        g.stats["coalesced"] += 1
+    else:
+        shared = SharedStream(key)
+        if LLM_COALESCE:
+            _STREAMS[key] = shared
+        shared.task = asyncio.get_running_loop().create_task(_produce(shared, model, priority, open_stream))
+    return shared.read()
+
+
+def info() -> dict:
+    return {
+        "max_concurrency": LLM_MAX_CONCURRENCY,
+        "max_queue": LLM_MAX_QUEUE,
+        "queue_timeout": LLM_QUEUE_TIMEOUT,
+        "coalesce": LLM_COALESCE,
+        "inflight": len(_INFLIGHT) + len(_STREAMS),
+        "models": {model: g.info() for model, g in _GATES.items()},
+    }
@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+logger = logging.getLogger("memory")
+
+# 🧠 --- KONFIG ---
+MEMORY_DB_PATH = os.getenv("MEMORY_DB_PATH", "/app/data/memory.db")
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "1") == "1"
+# Requests ohne conversation_id landen hier. Leer (Standard) = ohne Gedächtnis beantworten – ein
+# gemeinsamer Verlauf würde Fragen verschiedener Nutzer in fremde Prompts tragen
+MEMORY_DEFAULT_CONVERSATION = os.getenv("MEMORY_DEFAULT_CONVERSATION", "")
+MEMORY_CACHE_CONVERSATIONS = int(os.getenv("MEMORY_CACHE_CONVERSATIONS", "256"))   # LRU über Konversationen
+MEMORY_CACHE_TURNS = int(os.getenv("MEMORY_CACHE_TURNS", "50"))                    # letzte Nachrichten je Konversation
+MEMORY_PRELOAD = int(os.getenv("MEMORY_PRELOAD", "64"))            # zuletzt aktive Konversationen beim Start laden
+MEMORY_FLUSH_SECONDS = float(os.getenv("MEMORY_FLUSH_SECONDS", "0.5"))
+MEMORY_FLUSH_BATCH = int(os.getenv("MEMORY_FLUSH_BATCH", "200"))   # ab so vielen Einträgen sofort schreiben
+MEMORY_MAX_QUEUE = int(os.getenv("MEMORY_MAX_QUEUE", "10000"))     # darüber werden Einträge verworfen
+# Mehrere Worker (WEB_CONCURRENCY > 1) teilen memory.db, aber nicht den LRU: höchstens alle
+# MEMORY_FLUSH_SECONDS wird per PRAGMA data_version geprüft, ob ein anderer Prozess geschrieben hat,
+# und dann nur die betroffenen Konversationen aus dem LRU verworfen
+MEMORY_SHARED_DB = os.getenv(
+    "MEMORY_SHARED_DB", "1" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "0"
+) == "1"
+
+# 📏 Kontextfenster – Tabelle aus AnythingLLM: {provider: {modell: tokens}}
+CONTEXT_WINDOWS_PATH = os.getenv("CONTEXT_WINDOWS_PATH", "/app/config/context-windows.json")
+CONTEXT_WINDOW_TOKENS = int(os.getenv("CONTEXT_WINDOW_TOKENS", "0"))           # > 0 überschreibt die Tabelle
+CONTEXT_WINDOW_DEFAULT = int(os.getenv("CONTEXT_WINDOW_DEFAULT", "4096"))     # Modell nicht in der Tabelle
+MEMORY_HISTORY_TOKENS = int(os.getenv("MEMORY_HISTORY_TOKENS", "2048"))       # Obergrenze für den Verlauf
+MEMORY_RESPONSE_TOKENS = int(os.getenv("MEMORY_RESPONSE_TOKENS", "1024"))     # Reserve für die Antwort
+
+ROLES = ("user", "assistant")
+
+_CACHE: OrderedDict = OrderedDict()     # conversation_id → deque[(role, content)]
+_QUEUE: list = []                       # (conversation_id, role, content, timestamp) – noch nicht geschrieben
+_CONN: sqlite3.Connection | None = None
+_DB_LOCK: asyncio.Lock | None = None    # Writer und Nachlader sehen DB + Queue immer konsistent
+_WAKE: asyncio.Event | None = None
+_WRITER: asyncio.Task | None = None
+_WINDOWS: dict = {}
+_DATA_VERSION: int | None = None        # zuletzt gesehener Schreibstand anderer Verbindungen
+_LAST_ROW_ID = 0                        # höchste bereits geprüfte id in memory
+_NEXT_CHECK = 0.0                       # monotonic: frühester Zeitpunkt der nächsten Prüfung
+STATS = {"cache_hits": 0, "cache_misses": 0, "written": 0, "dropped": 0, "flushes": 0, "failed": 0,
+         "invalidations": 0}
+
+
+# 🗄️ --- SQLITE ---
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(MEMORY_DB_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            role TEXT,
+            content TEXT,
+            timestamp TEXT
+        )
+    """)
+    # Bestehende memory.db (ohne Konversationen) weiterverwenden – alte Zeilen bleiben ohne Zuordnung
+    # (NULL) und werden nie in einen Prompt geladen
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(memory)")}
+    if "conversation_id" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE memory ADD COLUMN conversation_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_conversation ON memory(conversation_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_timestamp ON memory(timestamp)")
+    return conn
+
+
+def _load_turns(conversation_id: str, limit: int) -> list:
+    rows = _CONN.execute(
+        "SELECT role, content FROM memory WHERE conversation_id=? ORDER BY timestamp DESC, id DESC LIMIT ?",
+        (conversation_id, limit),
+    ).fetchall()
+    return rows[::-1]
+
+
+def _recent_conversations(limit: int) -> list:
+    rows = _CONN.execute(
+        "SELECT conversation_id FROM memory WHERE conversation_id IS NOT NULL "
+        "GROUP BY conversation_id ORDER BY MAX(timestamp) DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def _preload(limit: int) -> dict:
+    return {cid: _load_turns(cid, MEMORY_CACHE_TURNS) for cid in _recent_conversations(limit)[::-1]}
+
+
+def _data_version() -> int:
+    return _CONN.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _max_row_id() -> int:
+    return _CONN.execute("SELECT COALESCE(MAX(id), 0) FROM memory").fetchone()[0]
+
+
+def _written_since(version: int | None, row_id: int) -> tuple:
+    """(data_version, höchste id, Konversationen mit Zeilen nach row_id) – ohne fremden Commit nur das PRAGMA."""
+    current = _data_version()
+    if current == version:
+        return current, row_id, set()
+    rows = _CONN.execute(
+        "SELECT conversation_id, MAX(id) FROM memory WHERE id > ? GROUP BY conversation_id", (row_id,)
+    ).fetchall()
+    return current, max([row_id] + [r[1] for r in rows]), {r[0] for r in rows}
+
+
+def _write(batch: list):
+    with _CONN:
+        _CONN.executemany(
+            "INSERT INTO memory (conversation_id, role, content, timestamp) VALUES (?, ?, ?, ?)", batch
+        )
+
+
+# ⚡ --- LRU ---
+def _cache_put(conversation_id: str, turns) -> deque:
+    entry = deque(turns, maxlen=MEMORY_CACHE_TURNS)
+    _CACHE[conversation_id] = entry
+    _CACHE.move_to_end(conversation_id)
+    while len(_CACHE) > MEMORY_CACHE_CONVERSATIONS:
+        _CACHE.popitem(last=False)
+    return entry
+
+
+async def _drop_stale_cache():
+    """Hat ein anderer Worker committet, die betroffenen Konversationen verwerfen – der nächste Lookup liest die DB."""
+    global _DATA_VERSION, _LAST_ROW_ID, _NEXT_CHECK
+    now = time.monotonic()
+    if now < _NEXT_CHECK:
+        return
+    _NEXT_CHECK = now + MEMORY_FLUSH_SECONDS
+    async with _DB_LOCK:
+        _DATA_VERSION, _LAST_ROW_ID, changed = await asyncio.to_thread(_written_since, _DATA_VERSION, _LAST_ROW_ID)
+    # Enthält auch eigene, inzwischen geschriebene Zeilen – die werden dann einmal neu geladen
+    for conversation_id in changed:
+        if _CACHE.pop(conversation_id, None) is not None:
+            STATS["invalidations"] += 1
+
+
+async def history(conversation_id: str | None) -> list:
+    """Letzte Nachrichten [(role, content)] – aus dem LRU, nur bei einem Miss einmal von der Platte."""
+    if not MEMORY_ENABLED or not conversation_id or _CONN is None:
+        return []
+    if MEMORY_SHARED_DB:
+        await _drop_stale_cache()
+    entry = _CACHE.get(conversation_id)
+    if entry is not None:
+        _CACHE.move_to_end(conversation_id)
+        STATS["cache_hits"] += 1
+        return list(entry)
+
+    STATS["cache_misses"] += 1
+    async with _DB_LOCK:
+        entry = _CACHE.get(conversation_id)   # parallel nachgeladen?
+        if entry is None:
+            turns = await asyncio.to_thread(_load_turns, conversation_id, MEMORY_CACHE_TURNS)
+            turns += [(role, content) for cid, role, content, _ in _QUEUE if cid == conversation_id]
+            entry = _cache_put(conversation_id, turns)
+    return list(entry)
+
+
+def remember(conversation_id: str | None, role: str, content: str):
+    """Nimmt eine Nachricht sofort in den LRU auf; geschrieben wird gebündelt im Hintergrund."""
+    if not MEMORY_ENABLED or not conversation_id or _CONN is None or not content:
+        return
+    entry = _CACHE.get(conversation_id)
+    if entry is not None:
+        entry.append((role, content))
+        _CACHE.move_to_end(conversation_id)
+    if len(_QUEUE) >= MEMORY_MAX_QUEUE:
+        STATS["dropped"] += 1
+        return
+    _QUEUE.append((conversation_id, role, content, datetime.now().isoformat()))
+    if len(_QUEUE) >= MEMORY_FLUSH_BATCH:
+        _WAKE.set()
+
+
+# ✍️ --- HINTERGRUND-WRITER ---
+async def flush():
+    if not _QUEUE or _CONN is None:
+        return
+    async with _DB_LOCK:
+        batch = _QUEUE[:MEMORY_MAX_QUEUE]
+        try:
+            await asyncio.to_thread(_write, batch)
+        except Exception as e:
+            # Einträge bleiben in der Queue und werden beim nächsten Flush erneut versucht
+            STATS["failed"] += 1
+            logger.warning(f"[Memory] Schreiben von {len(batch)} Einträgen fehlgeschlagen: {e}")
+            return
+        # Erst nach dem Commit entfernen – neue Einträge hängen nur hinten an
+        del _QUEUE[:len(batch)]
+        STATS["written"] += len(batch)
+        STATS["flushes"] += 1
+
+
+async def writer_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_WAKE.wait(), MEMORY_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _WAKE.clear()
+        await flush()
+
+
+async def start():
+    """Im Startup-Hook: DB öffnen/migrieren, zuletzt aktive Konversationen vorladen, Writer starten."""
+    global _CONN, _DB_LOCK, _WAKE, _WRITER, _DATA_VERSION, _LAST_ROW_ID, _NEXT_CHECK
+    _WINDOWS.clear()
+    _WINDOWS.update(load_context_windows(CONTEXT_WINDOWS_PATH))
+    if not MEMORY_ENABLED:
+        return
+    _DB_LOCK = asyncio.Lock()
+    _WAKE = asyncio.Event()
+    try:
+        _CONN = await asyncio.to_thread(_connect)
+        _DATA_VERSION = await asyncio.to_thread(_data_version)
+        _LAST_ROW_ID = await asyncio.to_thread(_max_row_id)
+        _NEXT_CHECK = 0.0
+        preloaded = await asyncio.to_thread(_preload, min(MEMORY_PRELOAD, MEMORY_CACHE_CONVERSATIONS))
+    except sqlite3.Error as e:
+        logger.warning(f"[Memory] {MEMORY_DB_PATH} nicht nutzbar – ohne Gedächtnis: {e}")
+        _CONN = None
+        return
+    for conversation_id, turns in preloaded.items():
+        _cache_put(conversation_id, turns)
+    _WRITER = asyncio.get_running_loop().create_task(writer_loop())
+    logger.info(f"[Memory] {MEMORY_DB_PATH}: {len(preloaded)} Konversationen vorgeladen")
+
+
+async def stop():
+    """Im Shutdown-Hook: Writer beenden, Rest schreiben, DB schließen."""
+    global _WRITER, _CONN
+    if _WRITER is not None:
+        _WRITER.cancel()
+        try:
+            await _WRITER
+        except asyncio.CancelledError:
+            pass
+        _WRITER = None
+    if _CONN is not None:
+        await flush()
+        _CONN.close()
+        _CONN = None
+    _CACHE.clear()
+
+
+# 📏 --- KONTEXT-BUDGET ---
+def load_context_windows(path: str) -> dict:
+    """Flacht {provider: {modell: tokens}} zu {modell: tokens} ab."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.info(f"[Memory] Keine Kontextfenster-Tabelle ({path}): {e} – nutze {CONTEXT_WINDOW_DEFAULT}")
+        return {}
+    windows = {}
+    for models in data.values():
+        if isinstance(models, dict):
+            for name, tokens in models.items():
+                if isinstance(tokens, int) and tokens > 0:
+                    windows.setdefault(name.lower(), tokens)
+    return windows
+
+
+def context_window(model: str) -> int:
+    """Exakter Name, sonst längster Tabellen-Eintrag, mit dem der Ollama-Name beginnt (deepseek-r1:14b → deepseek-r1)."""
+    if CONTEXT_WINDOW_TOKENS > 0:
+        return CONTEXT_WINDOW_TOKENS
+    name = model.lower()
+    if name in _WINDOWS:
+        return _WINDOWS[name]
+    base = name.split(":", 1)[0]
+    matches = [k for k in _WINDOWS if base.startswith(k) or k.startswith(base)]
+    if matches:
+        return _WINDOWS[max(matches, key=lambda k: (base.startswith(k), len(k)))]
+    return CONTEXT_WINDOW_DEFAULT
+
+
+def estimate_tokens(text: str) -> int:
+    # Ohne Tokenizer: ~4 Zeichen pro Token plus Overhead pro Nachricht (eher zu hoch als zu niedrig)
+    return math.ceil(len(text) / 4) + 4
+
+
+def build_messages(system_prompt: str, turns: list, prompt: str, model: str) -> list:
+    """System-Prompt + so viele der jüngsten Nachrichten, wie ins Budget passen + aktuelle Eingabe."""
+    window = context_window(model)
+    budget = window - MEMORY_RESPONSE_TOKENS - estimate_tokens(system_prompt) - estimate_tokens(prompt)
+    budget = min(budget, MEMORY_HISTORY_TOKENS)
+    picked = []
+    for role, content in reversed(turns):
+        cost = estimate_tokens(content)
+        if cost > budget:
+            break
+        budget -= cost
+        picked.append({"role": role, "content": content})
+    # Verlauf beginnt nie mit einer Antwort ohne zugehörige Frage
+    while picked and picked[-1]["role"] != "user":
+        picked.pop()
+    return [
+        {"role": "system", "content": system_prompt},
+        *picked[::-1],
+        {"role": "user", "content": prompt},
+    ]
+
+
+def info() -> dict:
+    return {
+        "enabled": MEMORY_ENABLED and _CONN is not None,
+        "db": MEMORY_DB_PATH,
+        "shared_db": MEMORY_SHARED_DB,
+        "cached_conversations": len(_CACHE),
+        "queued": len(_QUEUE),
+        "context_windows": len(_WINDOWS),
+        **STATS,
+    }
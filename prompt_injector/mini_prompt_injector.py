@@ -3,16 +3,27 @@ import json
 import logging
 import httpx
 import os 
+import re
+import time
 from dotenv import load_dotenv
 
 from fastapi import FastAPI, Request
-from security_utils import sanitize_input, validate_tool_access, humanize_result, audit_log
+from fastapi.responses import JSONResponse, StreamingResponse
+from security_utils import sanitize_input, validate_tool_access, humanize_result, audit_log, ALLOWED_TOOLS
+import http_pool
+import llm_scheduler
+import memory_store
+import metrics
+import pre_router
+import tracing
 
 
 
 logging.basicConfig(level=logging.INFO, format="🧩 [%(levelname)s] %(message)s")
 
 app = FastAPI(title="Prompt Injector - Claude Style")
+tracing.setup("prompt-injector")
+metrics.instrument(app)
 
 load_dotenv()
 # Modell und URLs aus der .env laden
@@ -20,6 +31,29 @@ MODEL_NAME = os.getenv("OLLAMA_MODEL", "deepseek-r1:8b")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://192.168.0.224:11434/api/chat")
 MCP_HUB_URL = os.getenv("MCP_HUB_URL", "http://mcp-hub:4400")              # Für Tool-Weiterleitung
 
+# 🔌 HTTP-Client-Pool – ein langlebiger Client pro Upstream (Ollama, MCP-Hub)
+# Limits global oder pro Upstream überschreibbar, z. B. OLLAMA_MAX_CONNECTIONS
+
+OLLAMA_CLIENT: httpx.AsyncClient | None = None
+HUB_CLIENT: httpx.AsyncClient | None = None
+
+# 📈 Metriken (zusätzlich zu den HTTP-/Upstream-Metriken aus metrics.py)
+LLM_TTFT = metrics.Histogram("llm_time_to_first_token_seconds", "Zeit bis zum ersten Token (Streaming)", ("model",))
+PREROUTE_RESULTS = metrics.Counter("preroute_total", "Pre-Routing per Regex: Treffer (LLM übersprungen) oder nicht",
+                                   ("result",))
+LLM_SCHEDULER_RESULTS = ("admitted", "waited", "coalesced", "rejected_full", "rejected_timeout")
+metrics.Callback("llm_active_generations", "Laufende Ollama-Generierungen", ("model",),
+                 lambda: {(m,): g["active"] for m, g in llm_scheduler.info()["models"].items()})
+metrics.Callback("llm_queue_depth", "Auf einen Ollama-Slot wartende Requests", ("model",),
+                 lambda: {(m,): g["queued"] for m, g in llm_scheduler.info()["models"].items()})
+metrics.Callback("llm_scheduler_total", "Ollama-Aufrufe nach Ausgang der Zulassung", ("model", "result"),
+                 lambda: {(m, r): g[r] for m, g in llm_scheduler.info()["models"].items() for r in LLM_SCHEDULER_RESULTS},
+                 kind="counter")
+metrics.Callback("cache_requests_total", "Verlaufs-Lookups im Gedächtnis-LRU nach Ausgang", ("cache", "result"),
+                 lambda: {("conversation_memory", "hit"): memory_store.STATS["cache_hits"],
+                          ("conversation_memory", "miss"): memory_store.STATS["cache_misses"]},
+                 kind="counter")
+
 # 🧠 Claude-Style Systemprompt
 SYSTEM_PROMPT = """
 Du bist ein präziser KI-Assistent mit Zugriff auf Tools (MCP).
@@ -34,34 +68,171 @@ Verhalte dich wie folgt:
 4️⃣ Gib keine JSON-Struktur aus, wenn kein Tool gebraucht wird.
 """
 
+# ============================================================
+# 🔌 Client-Lifecycle
+# ============================================================
+@app.on_event("startup")
+async def startup_event():
+    global OLLAMA_CLIENT, HUB_CLIENT
+    OLLAMA_CLIENT = http_pool.create_client("ollama", timeout=60.0)
+    HUB_CLIENT = http_pool.create_client("hub", timeout=20.0)
+    pre_router.refresh(ALLOWED_TOOLS, force=True)
+    await memory_store.start()
+    tracing.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for client in (OLLAMA_CLIENT, HUB_CLIENT):
+        if client is not None:
+            await client.aclose()
+    await memory_store.stop()
+    await tracing.stop()
+
+
 # ============================================================
 # 🧩 DeepSeek-Aufruf
 # ============================================================
-async def ask_deepseek(user_prompt: str):
-    payload = {
+def build_payload(user_prompt: str, stream: bool, history: list = ()) -> dict:
+    return {
         "model": MODEL_NAME,
-        "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
+        # Verlauf nur so weit, wie er ins Kontextfenster des Modells passt
+        "messages": memory_store.build_messages(SYSTEM_PROMPT, history, user_prompt, MODEL_NAME),
         "temperature": 0.7,
-        "stream": False,
+        "stream": stream,
     }
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            r = await client.post(OLLAMA_URL, json=payload)
+
+async def ask_deepseek(user_prompt: str, priority: int = llm_scheduler.PRIORITY_CHAT, history: list = ()):
+    """Über den Scheduler: ein Slot pro Generierung, identische laufende Prompts teilen die Antwort.
+
+    Wirft llm_scheduler.Overloaded, wenn kein Slot frei wird.
+    """
+    payload = build_payload(user_prompt, stream=False, history=history)
+    return await llm_scheduler.run(MODEL_NAME, payload, priority, lambda: ollama_chat(payload))
+
+
+async def ollama_chat(payload: dict) -> str:
+    try:
+        with metrics.track(metrics.UPSTREAM_LATENCY, "ollama", MODEL_NAME), \
+                tracing.span("llm.chat", client=True, model=MODEL_NAME, stream=False):
+            r = await OLLAMA_CLIENT.post(OLLAMA_URL, json=payload)
             r.raise_for_status()
             data = r.json()
-            message = data.get("message") or data.get("response") or data
-            if isinstance(message, dict):
-                text = message.get("content", json.dumps(message))
-            else:
-                text = str(message)
-            return text
-        except Exception as e:
-            logging.error(f"❌ DeepSeek Fehler: {e}")
-            return f"⚠️ Modellfehler: {e}"
+        message = data.get("message") or data.get("response") or data
+        if isinstance(message, dict):
+            text = message.get("content", json.dumps(message))
+        else:
+            text = str(message)
+        return text
+    except Exception as e:
+        logging.error(f"❌ DeepSeek Fehler: {e}")
+        return f"⚠️ Modellfehler: {e}"
+
+
+async def stream_deepseek(user_prompt: str, priority: int = llm_scheduler.PRIORITY_CHAT, history: list = ()):
+    """Deltas über den Scheduler; ein identischer laufender Stream wird mitgelesen statt neu generiert."""
+    payload = build_payload(user_prompt, stream=True, history=history)
+    async for delta in llm_scheduler.stream(MODEL_NAME, payload, priority, lambda: ollama_stream(payload)):
+        yield delta
+
+
+async def ollama_stream(payload: dict):
+    """Liest Ollamas NDJSON-Stream und liefert die Text-Deltas, sobald sie ankommen."""
+    try:
+        with metrics.track(metrics.UPSTREAM_LATENCY, "ollama", MODEL_NAME), \
+                tracing.span("llm.chat", client=True, model=MODEL_NAME, stream=True) as span:
+            t0 = time.monotonic()
+            first = True
+            async with OLLAMA_CLIENT.stream("POST", OLLAMA_URL, json=payload) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    message = data.get("message") or {}
+                    delta = message.get("content") if isinstance(message, dict) else None
+                    if delta is None:
+                        delta = data.get("response", "")
+                    if delta:
+                        if first:
+                            ttft = time.monotonic() - t0
+                            LLM_TTFT.observe(ttft, MODEL_NAME)
+                            span.set("ttft_ms", round(ttft * 1000, 2))
+                            first = False
+                        yield delta
+                    if data.get("done"):
+                        break
+    except Exception as e:
+        logging.error(f"❌ DeepSeek Stream-Fehler: {e}")
+        yield f"⚠️ Modellfehler: {e}"
+
+
+# ============================================================
+# 🔍 Tool-Call-Erkennung im Stream
+# ============================================================
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class ToolCallSniffer:
+    """Entscheidet beim Streaming, ob die Modellantwort ein Tool-Call ist.
+
+    Ein führender <think>-Block wird direkt durchgereicht. Danach entscheidet das
+    erste Nicht-Leerzeichen: '{' → Rest puffern (möglicher Tool-Call), sonst streamen.
+    """
+
+    def __init__(self):
+        self.state = "start"   # start → (think →) decide → text | tool
+        self.pending = ""
+        self.tail = ""
+
+    @property
+    def buffering_tool_call(self) -> bool:
+        return self.state == "tool"
+
+    def feed(self, delta: str) -> str:
+        """Nimmt ein Delta auf und liefert den Teil, der sofort gesendet werden kann."""
+        if self.state == "text":
+            return delta
+        if self.state == "tool":
+            self.pending += delta
+            return ""
+        if self.state == "think":
+            # </think> kann über Delta-Grenzen verteilt sein → Rest des Vorgängers mitprüfen
+            scan = self.tail + delta
+            idx = scan.find(THINK_CLOSE)
+            if idx == -1:
+                self.tail = scan[-(len(THINK_CLOSE) - 1):]
+                return delta
+            cut = idx + len(THINK_CLOSE) - len(self.tail)
+            self.state = "decide"
+            return delta[:cut] + self.feed(delta[cut:])
+
+        self.pending += delta
+        head = self.pending.lstrip()
+        if not head:
+            return ""
+        if self.state == "start":
+            if len(head) < len(THINK_OPEN) and THINK_OPEN.startswith(head):
+                return ""
+            if head.startswith(THINK_OPEN):
+                text, self.pending = self.pending, ""
+                self.state = "think"
+                self.tail = ""
+                split = text.index(THINK_OPEN) + len(THINK_OPEN)
+                return text[:split] + self.feed(text[split:])
+        if head.startswith("{"):
+            self.state = "tool"
+            return ""
+        self.state = "text"
+        text, self.pending = self.pending, ""
+        return text
+
+    def finish(self) -> str:
+        """Liefert den gepufferten Rest (Tool-Call-Kandidat oder unentschiedener Text)."""
+        text, self.pending = self.pending, ""
+        return text
 
 
 # ============================================================
@@ -71,79 +242,238 @@ async def call_mcp_tool(tool: str, query: str):
     rpc_payload = {"jsonrpc": "2.0", "id": 1, "method": "query", "params": {"query": query}}
     url = f"{MCP_HUB_URL}/{tool}"
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        try:
-            logging.info(f"🔗 MCP-Aufruf → {url}")
-            r = await client.post(url, json=rpc_payload)
+    try:
+        logging.info(f"🔗 MCP-Aufruf → {url}")
+        with metrics.track(metrics.UPSTREAM_LATENCY, "hub", tool), \
+                tracing.span("hub.call", client=True, tool=tool):
+            r = await HUB_CLIENT.post(url, json=rpc_payload, headers=tracing.headers())
             r.raise_for_status()
             result = r.json()
-            content = (
-                result.get("result", {}).get("content")
-                or result.get("result", {}).get("time")
-                or str(result.get("result"))
-            )
-            return content
-        except Exception as e:
-            logging.error(f"❌ MCP-Aufruf fehlgeschlagen: {e}")
-            return f"⚠️ MCP-Fehler: {e}"
+        if "error" in result:
+            error = result["error"]
+            message = error.get("message") if isinstance(error, dict) else error
+            return f"⚠️ MCP-Fehler: {message}"
+        content = (
+            result.get("result", {}).get("content")
+            or result.get("result", {}).get("time")
+            or str(result.get("result"))
+        )
+        return content
+    except Exception as e:
+        logging.error(f"❌ MCP-Aufruf fehlgeschlagen: {e}")
+        return f"⚠️ MCP-Fehler: {e}"
 
 
 # ============================================================
-# 💬 Haupt-Endpunkt
+# 🧭 Pre-Routing: Regex-Treffer aus decision.db → Tool ohne LLM
 # ============================================================
-@app.post("/api/chat")
-async def handle_chat(request: Request):
-    body = await request.json()
-    prompt = body.get("prompt") or body.get("input") or body.get("content", "")
-    logging.info(f"💬 Eingabe erhalten: {prompt[:120]}")
-    
-    # 🧩 --- SECURITY-LAYER ---
-    prompt = sanitize_input(prompt)
+async def run_tool_call(prompt: str, decision: dict) -> str:
+    tool = decision.get("tool")
+    logging.info(f"🧠 Tool-Call erkannt → {tool}")
+    mcp_result = await call_mcp_tool(tool, decision.get("query", ""))
+
+    # 🧾 Audit Logging
+    audit_log(prompt, decision, {"result": mcp_result})
+
+    # ✨ Ergebnis verschönern (optional)
+    return humanize_result({"result": mcp_result})
 
 
+async def preroute(prompt: str):
+    """Liefert das Tool-Ergebnis bei einem sicheren Regex-Treffer, sonst None."""
+    with tracing.span("preroute") as span:
+        pre_router.refresh(ALLOWED_TOOLS)
+        rule = pre_router.match(prompt)
+        span.set("hit", rule is not None)
+    if rule is None or not validate_tool_access(rule["tool"]):
+        PREROUTE_RESULTS.inc("miss")
+        return None
+    PREROUTE_RESULTS.inc("hit")
+    logging.info(f"🧭 Pre-Routing: Regel '{rule['id']}' → {rule['tool']} (LLM übersprungen)")
+    decision = {"action": "mcp_call", "tool": rule["tool"], "query": prompt, "rule": rule["id"]}
+    return await run_tool_call(prompt, decision)
 
-    # Schritt 1️⃣ – DeepSeek befragen
-    deepseek_output = await ask_deepseek(prompt)
-    if not isinstance(deepseek_output, str):
-        deepseek_output = str(deepseek_output)
 
-    # Schritt 2️⃣ – Robust prüfen, ob ein JSON-Toolaufruf enthalten ist
+# ============================================================
+# 🧠 Modellausgabe auswerten (Tool-Call oder Textantwort)
+# ============================================================
+async def resolve_output(prompt: str, deepseek_output: str) -> str:
+    # Robust prüfen, ob ein JSON-Toolaufruf enthalten ist
     if "{" in deepseek_output and "}" in deepseek_output and '"tool":' in deepseek_output:
         try:
-            # JSON-Fragment isolieren (ignoriert Text vor/nach dem JSON)
-            start = deepseek_output.find("{")
-            end = deepseek_output.rfind("}") + 1
-            json_fragment = deepseek_output[start:end]
+            with tracing.span("extract_json"):
+                # JSON-Fragment isolieren (ignoriert Text vor/nach dem JSON)
+                start = deepseek_output.find("{")
+                end = deepseek_output.rfind("}") + 1
+                json_fragment = deepseek_output[start:end]
+                decision = json.loads(json_fragment)
 
-            decision = json.loads(json_fragment)
             if decision.get("action") == "mcp_call":
-                tool = decision.get("tool")
-                query = decision.get("query", "")
                 #Sicherheitsprüfung:
                 if not validate_tool_access(decision.get("tool", "")):
-                    return {"final": "Tool nicht erlaubt."}
-                
-                logging.info(f"🧠 Tool-Call erkannt → {tool}")
-                mcp_result = await call_mcp_tool(tool, query)
-                
-                 # 🧾 Audit Logging
-                audit_log(prompt, decision, {"result": mcp_result})
-
-                # ✨ Ergebnis verschönern (optional)
-                pretty = humanize_result({"result": mcp_result})
-                return {"final": pretty}
-                
-                
+                    return "Tool nicht erlaubt."
+                return await run_tool_call(prompt, decision)
+
         except json.JSONDecodeError as e:
             logging.warning(f"⚠️ JSON-Parsing unvollständig oder fehlerhaft: {e}")
-            return {"final": f"⚠️ Unvollständige JSON-Ausgabe erkannt. Text: {deepseek_output.strip()[:200]}"}
+            return f"⚠️ Unvollständige JSON-Ausgabe erkannt. Text: {deepseek_output.strip()[:200]}"
         except Exception as e:
             logging.error(f"❌ Tool-Call Fehler: {e}")
-            return {"final": f"⚠️ Fehler bei der Tool-Verarbeitung: {e}"}
+            return f"⚠️ Fehler bei der Tool-Verarbeitung: {e}"
 
-    # Schritt 3️⃣ – Falls kein Tool-Call oder Parsing fehlgeschlagen → Textantwort
+    # Falls kein Tool-Call oder Parsing fehlgeschlagen → Textantwort
     logging.info("🗣️ Direkte Antwort von DeepSeek oder anderem Modell.")
-    return {"final": deepseek_output.strip()}
+    return deepseek_output.strip()
+
+
+# ============================================================
+# 💬 Haupt-Endpunkt
+# ============================================================
+def extract_prompt(body: dict) -> str:
+    return body.get("prompt") or body.get("input") or body.get("content", "")
+
+
+def conversation_id(body: dict, request: Request) -> str | None:
+    return (
+        body.get("conversation_id")
+        or request.headers.get("x-conversation-id")
+        or memory_store.MEMORY_DEFAULT_CONVERSATION
+        or None
+    )
+
+
+async def conversation_history(body: dict, conversation: str | None) -> list:
+    """Schickt der Client den Verlauf mit (OpenAI-"messages" über die Bridge), gilt dieser – sonst das Gedächtnis.
+
+    User-Turns aus dem Client-Verlauf laufen wie die neue Eingabe durch sanitize_input;
+    nur Antworten des Assistenten bleiben unverändert.
+    """
+    messages = body.get("messages")
+    if isinstance(messages, list):
+        turns = []
+        for m in messages:
+            if not isinstance(m, dict) or m.get("role") not in memory_store.ROLES:
+                continue
+            content = str(m.get("content") or "")
+            turns.append((m["role"], sanitize_input(content) if m["role"] == "user" else content))
+        return turns
+    return await memory_store.history(conversation)
+
+
+def remember_turn(conversation: str | None, prompt: str, answer: str):
+    # Denkblöcke nicht in den Verlauf – sie kosten nur Kontext
+    answer = re.sub(THINK_OPEN + r".*?" + THINK_CLOSE, "", answer, flags=re.S).strip()
+    memory_store.remember(conversation, "user", prompt)
+    memory_store.remember(conversation, "assistant", answer)
+
+
+def overloaded_response(e: llm_scheduler.Overloaded) -> JSONResponse:
+    # 429 = Warteschlange voll, 503 = kein Slot innerhalb LLM_QUEUE_TIMEOUT
+    logging.warning(f"🚦 {e} → {e.status}")
+    return JSONResponse(
+        status_code=e.status,
+        headers={"Retry-After": str(e.retry_after)},
+        content={
+            "final": "⚠️ Das Modell ist gerade ausgelastet – bitte gleich noch einmal versuchen.",
+            "error": {"code": e.status, "reason": e.reason, "message": str(e)},
+        },
+    )
+
+
+@app.post("/api/chat")
+async def handle_chat(request: Request):
+    body = await request.json()
+    prompt = extract_prompt(body)
+    logging.info(f"💬 Eingabe erhalten: {prompt[:120]}")
+
+    with tracing.server_span("POST /api/chat", request.headers):
+        # 🧩 --- SECURITY-LAYER ---
+        with tracing.span("sanitize"):
+            prompt = sanitize_input(prompt)
+
+        # Schritt 0️⃣ – Eindeutige Tool-Anfragen direkt per Regel routen
+        conversation = conversation_id(body, request)
+        routed = await preroute(prompt)
+        if routed is not None:
+            remember_turn(conversation, prompt, routed)
+            return {"final": routed}
+
+        # Schritt 1️⃣ – DeepSeek befragen (Slot im Scheduler, Tool-Routing vor langen Chats)
+        priority = llm_scheduler.priority_for(prompt, stream=False, requested=body.get("priority"))
+        try:
+            history = await conversation_history(body, conversation)
+            deepseek_output = await ask_deepseek(prompt, priority, history)
+        except llm_scheduler.Overloaded as e:
+            return overloaded_response(e)
+        if not isinstance(deepseek_output, str):
+            deepseek_output = str(deepseek_output)
+
+        # Schritt 2️⃣ – Tool-Call ausführen oder Text zurückgeben
+        final = await resolve_output(prompt, deepseek_output)
+        remember_turn(conversation, prompt, final)
+        return {"final": final}
+
+
+# ============================================================
+# 🌊 Streaming-Endpunkt (NDJSON: {"delta": ...} … {"done": true})
+# ============================================================
+@app.post("/api/chat/stream")
+async def handle_chat_stream(request: Request):
+    body = await request.json()
+    prompt = extract_prompt(body)
+    logging.info(f"🌊 Stream-Eingabe erhalten: {prompt[:120]}")
+
+    # 🧩 --- SECURITY-LAYER ---
+    prompt = sanitize_input(prompt)
+
+    # 🚦 Volle Warteschlange sofort ablehnen – nach Stream-Beginn ist der Status fix
+    priority = llm_scheduler.priority_for(prompt, stream=True, requested=body.get("priority"))
+    conversation = conversation_id(body, request)
+    history = await conversation_history(body, conversation)
+    if pre_router.match(prompt) is None:
+        try:
+            llm_scheduler.check_capacity(MODEL_NAME, build_payload(prompt, stream=True, history=history))
+        except llm_scheduler.Overloaded as e:
+            return overloaded_response(e)
+
+    def line(obj: dict) -> str:
+        return json.dumps(obj, ensure_ascii=False) + "\n"
+
+    async def generate():
+        # Läuft nach dem Endpoint – Trace über die Request-Header fortsetzen
+        with tracing.server_span("POST /api/chat/stream", request.headers):
+            routed = await preroute(prompt)
+            if routed is not None:
+                remember_turn(conversation, prompt, routed)
+                yield line({"delta": routed})
+                yield line({"done": True})
+                return
+
+            sniffer = ToolCallSniffer()
+            answer = []
+            try:
+                async for delta in stream_deepseek(prompt, priority, history):
+                    out = sniffer.feed(delta)
+                    if out:
+                        answer.append(out)
+                        yield line({"delta": out})
+            except llm_scheduler.Overloaded as e:
+                logging.warning(f"🚦 {e} (Stream)")
+                yield line({"delta": "⚠️ Das Modell ist gerade ausgelastet – bitte gleich noch einmal versuchen.",
+                            "error": {"code": e.status, "reason": e.reason}})
+                yield line({"done": True})
+                return
+
+            rest = sniffer.finish()
+            if sniffer.buffering_tool_call:
+                rest = await resolve_output(prompt, rest)
+            if rest:
+                answer.append(rest)
+                yield line({"delta": rest})
+            remember_turn(conversation, prompt, "".join(answer))
+            yield line({"done": True})
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 # ============================================================
@@ -156,5 +486,9 @@ async def health():
         "model": MODEL_NAME,
         "mode": "claude-style",
         "bridge_ready": True,
-        "mcp_target": MCP_HUB_URL
+        "mcp_target": MCP_HUB_URL,
+        "pre_router": pre_router.stats(),
+        "llm_scheduler": llm_scheduler.info(),
+        "memory": memory_store.info(),
+        "tracing": tracing.info(),
     }
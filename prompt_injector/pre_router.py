@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+logger = logging.getLogger("pre-router")
+
+# 🧭 --- KONFIG ---
+# Regeln aus decision.db (decision_rules-install.py) – Patterns als JSON-String gespeichert
+DECISION_DB_PATH = os.getenv("DECISION_DB_PATH", "/app/decision_rules/decision.db")
+# Opt-in: die Regel-Patterns sind einzelne Schlüsselwörter und nur zusammen mit PREROUTE_MAX_EXTRA_WORDS
+# ein brauchbares Signal ("keine Zeit, erkläre Quantenphysik" darf nicht beim time-Tool landen)
+PREROUTE_ENABLED = os.getenv("PREROUTE_ENABLED", "0") == "1"
+PREROUTE_MIN_CONFIDENCE = float(os.getenv("PREROUTE_MIN_CONFIDENCE", "0.9"))
+PREROUTE_REFRESH_SECONDS = float(os.getenv("PREROUTE_REFRESH_SECONDS", "5"))
+# Wörter außerhalb des Treffers, die keine Füllwörter sind – mehr davon = Frage geht ans LLM
+PREROUTE_MAX_EXTRA_WORDS = int(os.getenv("PREROUTE_MAX_EXTRA_WORDS", "0"))
+
+# Füllwörter kurzer Tool-Befehle ("Wie spät ist es?", "What time is it now?", "Que hora é?")
+FILLER_WORDS = {
+    # de
+    "wie", "was", "ist", "es", "sind", "wir", "haben", "hast", "du", "mir", "sag", "sage", "sagen",
+    "bitte", "mal", "jetzt", "gerade", "aktuell", "aktuelle", "die", "der", "das", "den", "welche",
+    "kannst", "zeig", "zeige", "ich", "hallo", "hey", "hi", "viel", "wieviel", "uhr", "schon",
+    # en
+    "what", "whats", "s", "is", "it", "the", "a", "current", "now", "right", "please", "tell", "me",
+    "do", "you", "know", "can", "could", "show", "have", "get", "turn", "on", "off", "my",
+    # pt
+    "que", "qual", "é", "e", "são", "sao", "agora", "por", "favor", "diga", "diz", "o", "as", "os",
+    "tem", "você", "voce", "sabe", "oi", "olá", "ola",
+}
+
+# Aktueller Matcher: ein kombinierter Regex, Gruppe r<i> gehört zu rules[i]
+_MATCHER = {"regex": None, "rules": [], "fingerprint": None, "signature": None, "checked_at": 0.0}
+_COMPILED = {}   # Pattern → einzeln validierter Regex-Text (überlebt Rebuilds)
+
+
+# 🗂️ --- REGELN LADEN ---
+def _db_signature():
+    """mtime/size von DB und WAL – ändert sich bei jedem Schreibzugriff."""
+    sig = []
+    for path in (DECISION_DB_PATH, DECISION_DB_PATH + "-wal"):
+        try:
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def _load_rules():
+    # Read-only: eine fehlende decision.db darf hier nicht leer angelegt werden
+    if not os.path.exists(DECISION_DB_PATH):
+        return []
+    conn = sqlite3.connect(f"file:{DECISION_DB_PATH}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT id, tool, pattern, confidence FROM decision_rules "
+            "WHERE enabled=1 AND confidence >= ? ORDER BY confidence DESC, id",
+            (PREROUTE_MIN_CONFIDENCE,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return rows
+
+
+def _pattern_source(raw: str):
+    """Entpackt das JSON-kodierte Pattern und prüft es einzeln (ungültige Regeln fallen raus)."""
+    if raw in _COMPILED:
+        return _COMPILED[raw]
+    try:
+        pattern = json.loads(raw)
+    except (TypeError, json.JSONDecodeError):
+        pattern = raw
+    source = None
+    if isinstance(pattern, str) and pattern:
+        try:
+            re.compile(pattern)
+            source = pattern
+        except re.error as e:
+            logger.warning(f"[PreRouter] Ungültiges Pattern übersprungen: {pattern!r} ({e})")
+    _COMPILED[raw] = source
+    return source
+
+
+def rebuild(allowed_tools):
+    """Baut den kombinierten Matcher neu – nur wenn sich die relevanten Regeln geändert haben."""
+    try:
+        rows = _load_rules()
+    except sqlite3.Error as e:
+        logger.warning(f"[PreRouter] Regeln nicht lesbar ({DECISION_DB_PATH}): {e}")
+        rows = []
+
+    rules = []
+    parts = []
+    for rule_id, tool, raw, confidence in rows:
+        if tool not in allowed_tools:
+            continue
+        source = _pattern_source(raw)
+        if source is None:
+            continue
+        # Ganze Wörter erzwingen: "late" trifft weder "translate" noch "latest", "zeit" nicht "Zeitung"
+        parts.append(f"(?P<r{len(rules)}>\\b(?:{source})\\b)")
+        rules.append({"id": rule_id, "tool": tool, "confidence": confidence})
+
+    fingerprint = tuple(parts)
+    if fingerprint == _MATCHER["fingerprint"]:
+        return
+    regex = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+    _MATCHER.update(regex=regex, rules=rules, fingerprint=fingerprint)
+    logger.info(f"[PreRouter] Matcher mit {len(rules)} Regeln aufgebaut.")
+
+
+def refresh(allowed_tools, force: bool = False):
+    """Prüft höchstens alle PREROUTE_REFRESH_SECONDS, ob sich decision.db geändert hat."""
+    if not PREROUTE_ENABLED:
+        return
+    now = time.monotonic()
+    if not force and now - _MATCHER["checked_at"] < PREROUTE_REFRESH_SECONDS:
+        return
+    _MATCHER["checked_at"] = now
+    signature = _db_signature()
+    if force or signature != _MATCHER["signature"]:
+        _MATCHER["signature"] = signature
+        rebuild(allowed_tools)
+
+
+# 🎯 --- MATCHING ---
+def _rule_of(m):
+    name = m.lastgroup or next(k for k, v in m.groupdict().items() if v is not None)
+    return _MATCHER["rules"][int(name[1:])]
+
+
+def match(prompt: str):
+    """Liefert die getroffene Regel (id, tool, confidence) oder None.
+
+    Ein Schlüsselwort allein reicht nicht: außer den Treffern desselben Tools dürfen höchstens
+    PREROUTE_MAX_EXTRA_WORDS Wörter im Prompt stehen, die keine Füllwörter sind.
+    """
+    regex = _MATCHER["regex"]
+    if not PREROUTE_ENABLED or regex is None or not prompt:
+        return None
+    hits = list(regex.finditer(prompt))
+    if not hits:
+        return None
+    rule = _rule_of(hits[0])
+    rest = prompt
+    for m in reversed(hits):
+        if _rule_of(m)["tool"] == rule["tool"]:
+            rest = rest[:m.start()] + " " + rest[m.end():]
+    extra = [w for w in re.findall(r"\w+", rest.casefold()) if w not in FILLER_WORDS]
+    if len(extra) > PREROUTE_MAX_EXTRA_WORDS:
+        return None
+    return rule
+
+
+def stats() -> dict:
+    return {
+        "enabled": PREROUTE_ENABLED,
+        "rules": len(_MATCHER["rules"]),
+        "min_confidence": PREROUTE_MIN_CONFIDENCE,
+        "max_extra_words": PREROUTE_MAX_EXTRA_WORDS,
+        "db": DECISION_DB_PATH,
+    }
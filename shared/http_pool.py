@@ -0,0 +1,33 @@
+# http_pool.py – gepoolte HTTP-Clients (ein langlebiger Client pro Upstream) für alle Services
+# Limits global oder pro Upstream überschreibbar: <UPSTREAM>_MAX_CONNECTIONS, _MAX_KEEPALIVE,
+# _KEEPALIVE_EXPIRY, _HTTP2 (z. B. INJECTOR_MAX_CONNECTIONS, OLLAMA_HTTP2, TIME_MAX_KEEPALIVE).
+
+import logging
+import os
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "0") == "1"
+
+logger = logging.getLogger("http-pool")
+
+
+def create_client(upstream: str, timeout: float) -> httpx.AsyncClient:
+    """Erstellt einen gepoolten Client mit Keep-Alive für einen Upstream."""
+    prefix = upstream.upper().replace("-", "_")
+    limits = httpx.Limits(
+        max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", HTTP_MAX_CONNECTIONS)),
+        max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE", HTTP_MAX_KEEPALIVE)),
+        keepalive_expiry=float(os.getenv(f"{prefix}_KEEPALIVE_EXPIRY", HTTP_KEEPALIVE_EXPIRY)),
+    )
+    http2 = os.getenv(f"{prefix}_HTTP2", "1" if HTTP2_ENABLED else "0") == "1"
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning(f"HTTP/2 für '{upstream}' angefragt, aber 'h2' fehlt – nutze HTTP/1.1.")
+            http2 = False
+    return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
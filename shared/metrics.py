@@ -0,0 +1,182 @@
+# metrics.py – Prometheus-Metriken für alle Services (/metrics im Text-Format 0.0.4)
+# Zähler, Gauges und Histogramme mit festen Buckets, rein in-process und ohne Abhängigkeiten.
+# Hot Path: ein Dict-Lookup pro Label-Kombination, ein bisect und zwei Additionen (~1 µs).
+# Werte, die ohnehin schon irgendwo gezählt werden (Cache-Statistiken, Regelanzahl), werden nicht
+# doppelt geführt, sondern erst beim Scrape per Callback gelesen.
+# Mit WEB_CONCURRENCY > 1 zählt jeder Worker für sich – ein Scrape sieht nur einen Worker.
+
+import time
+from bisect import bisect_left
+
+from starlette.responses import Response
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Sekunden: deckt Cache-Treffer (sub-ms) bis LLM-Antworten (Timeout 60 s) ab
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY: list = []
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.values: dict = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, label_text(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values: dict = {}   # Labels → [Zähler je Bucket (+Inf zuletzt), Summe, Anzahl]
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{format_value(bound)}"'
+                yield self.name + "_bucket", label_text(self.labelnames, labels, le), cumulative
+            yield self.name + "_sum", label_text(self.labelnames, labels), total
+            yield self.name + "_count", label_text(self.labelnames, labels), count
+
+
+class Callback:
+    """Wert(e) erst beim Scrape lesen: fn() → {Label-Tupel: Wert}."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple, fn, kind: str = "gauge"):
+        self.name, self.help, self.labelnames, self.fn, self.kind = name, help, tuple(labelnames), fn, kind
+        REGISTRY.append(self)
+
+    def samples(self):
+        for labels, value in self.fn().items():
+            yield self.name, label_text(self.labelnames, labels), value
+
+
+class track:
+    """Misst einen Upstream-Aufruf: with track(UPSTREAM_LATENCY, "ollama", model): ..."""
+
+    __slots__ = ("histogram", "labels", "t0")
+
+    def __init__(self, histogram: Histogram, *labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = "ok" if exc_type is None else "error"
+        self.histogram.observe(time.perf_counter() - self.t0, *self.labels, outcome)
+        return False
+
+
+# ==================== GEMEINSAME METRIKEN ====================
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP-Requests nach Route, Methode und Status",
+                        ("route", "method", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Dauer bis zum Ende der Antwort (inkl. Streaming)",
+                         ("route", "method"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Gerade laufende HTTP-Requests")
+UPSTREAM_LATENCY = Histogram("upstream_request_duration_seconds",
+                             "Aufrufe an Upstreams (Ollama, Injector, Hub, Tools)",
+                             ("upstream", "target", "outcome"))
+HTTP_IN_FLIGHT.set(0)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Reine ASGI-Middleware (kein BaseHTTPMiddleware) – Route-Label ist das Pfad-Template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.values[()] += 1
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - t0
+            HTTP_IN_FLIGHT.values[()] -= 1
+            # Starlette setzt scope["route"] beim Routing; Pfad-Templates halten die Kardinalität klein
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(route, method, status[0])
+            HTTP_LATENCY.observe(elapsed, route, method)
+
+
+async def metrics_endpoint():
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
+def instrument(app):
+    """Middleware + GET /metrics an eine FastAPI-App hängen."""
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,251 @@
+# tracing.py – leichtgewichtiges Tracing für Bridge → Injector → Hub → Tool
+# Trace-/Span-IDs laufen im W3C-Header "traceparent" mit; jeder Hop misst seine Spans mit der
+# monotonen Uhr und exportiert sie gebündelt als OTLP-JSON (Datei und/oder Collector).
+# Ohne TRACE_EXPORT_FILE / TRACE_EXPORT_URL ist alles ein No-op: span() liefert ein geteiltes
+# Dummy-Objekt, headers() ein leeres Dict – keine IDs, keine Uhr, keine Allokation pro Span.
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")    # OTLP-JSON, eine Zeile pro Export
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL", "")      # OTLP/HTTP, z. B. http://otel-collector:4318/v1/traces
+TRACE_FLUSH_SECONDS = float(os.getenv("TRACE_FLUSH_SECONDS", "2"))
+TRACE_MAX_QUEUE = int(os.getenv("TRACE_MAX_QUEUE", "10000"))   # darüber werden Spans verworfen
+ENABLED = bool(TRACE_EXPORT_FILE or TRACE_EXPORT_URL)
+
+logger = logging.getLogger("tracing")
+
+SERVICE = {"name": "unknown"}
+QUEUE: list = []
+STATS = {"exported": 0, "dropped": 0, "failed": 0}
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_FLUSHER: asyncio.Task | None = None
+
+# OTLP-Status- und Span-Kind-Codes
+STATUS_OK, STATUS_ERROR = 1, 2
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+
+class Span:
+    """Ein Abschnitt eines Traces; als Context-Manager wird er zum aktuellen Span."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes",
+                 "start_ns", "t0", "duration_ns", "error", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, kind: int, attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.t0 = time.perf_counter_ns()
+        self.duration_ns = 0
+        self.error = None
+        self._token = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._token = _CURRENT.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ns = time.perf_counter_ns() - self.t0
+        if exc is not None and not isinstance(exc, (GeneratorExit, asyncio.CancelledError)):
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _CURRENT.reset(self._token)
+        except ValueError:
+            # In einem anderen Kontext beendet (z. B. Streaming-Generator) – nur zurücksetzen
+            _CURRENT.set(None)
+        if len(QUEUE) < TRACE_MAX_QUEUE:
+            QUEUE.append(self)
+        else:
+            STATS["dropped"] += 1
+        return False
+
+
+class NoopSpan:
+    """Ersatz bei deaktiviertem Tracing – tut nichts und ist immer dasselbe Objekt."""
+
+    __slots__ = ()
+
+    def set(self, key: str, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP = NoopSpan()
+
+
+# ==================== API ====================
+def setup(service_name: str):
+    SERVICE["name"] = service_name
+
+
+def parse_traceparent(value: str | None):
+    """'00-<trace>-<span>-<flags>' → (trace_id, parent_span_id) oder None."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[1] == "0" * 32:
+        return None
+    return parts[1], parts[2]
+
+
+def server_span(name: str, headers=None, **attributes):
+    """Eingangs-Span eines Hops: setzt den Trace aus 'traceparent' fort oder startet einen neuen."""
+    if not ENABLED:
+        return NOOP
+    parent = parse_traceparent(headers.get("traceparent") if headers is not None else None)
+    if parent is None:
+        trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+    else:
+        trace_id, parent_id = parent
+    return Span(name, trace_id, parent_id, KIND_SERVER, attributes)
+
+
+def span(name: str, client: bool = False, **attributes):
+    """Kind-Span des aktuellen Spans; ohne laufenden Trace (oder deaktiviert) ein No-op."""
+    if not ENABLED:
+        return NOOP
+    parent = _CURRENT.get()
+    if parent is None:
+        return NOOP
+    return Span(name, parent.trace_id, parent.span_id, KIND_CLIENT if client else KIND_INTERNAL, attributes)
+
+
+def headers() -> dict:
+    """'traceparent' des aktuellen Spans für ausgehende Requests."""
+    if not ENABLED:
+        return {}
+    current = _CURRENT.get()
+    if current is None:
+        return {}
+    return {"traceparent": f"00-{current.trace_id}-{current.span_id}-01"}
+
+
+def current_trace_id() -> str | None:
+    current = _CURRENT.get() if ENABLED else None
+    return current.trace_id if current is not None else None
+
+
+# ==================== EXPORT (OTLP-JSON) ====================
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_span(s: Span) -> dict:
+    out = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": s.kind,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.start_ns + s.duration_ns),
+        "attributes": [{"key": k, "value": otlp_value(v)} for k, v in s.attributes.items()],
+        "status": {"code": STATUS_ERROR, "message": s.error} if s.error else {"code": STATUS_OK},
+    }
+    if s.parent_id:
+        out["parentSpanId"] = s.parent_id
+    return out
+
+
+def otlp_payload(spans: list) -> dict:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE["name"]}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "mcp-bridge-tracing"},
+                "spans": [otlp_span(s) for s in spans],
+            }],
+        }]
+    }
+
+
+def write_file(payload: dict):
+    line = json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n"
+    # Append einer ganzen Zeile – mehrere Worker/Services können dieselbe Datei nutzen
+    with open(TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+async def flush(client=None):
+    """Exportiert alle fertigen Spans; Datei-I/O im Thread, Collector per HTTP."""
+    if not QUEUE:
+        return
+    spans = QUEUE[:]
+    del QUEUE[:len(spans)]
+    payload = otlp_payload(spans)
+    try:
+        if TRACE_EXPORT_FILE:
+            await asyncio.to_thread(write_file, payload)
+        if TRACE_EXPORT_URL and client is not None:
+            resp = await client.post(TRACE_EXPORT_URL, json=payload)
+            resp.raise_for_status()
+        STATS["exported"] += len(spans)
+    except Exception as e:
+        STATS["failed"] += len(spans)
+        logger.warning(f"[Tracing] Export von {len(spans)} Spans fehlgeschlagen: {e}")
+
+
+async def flush_loop():
+    client = None
+    if TRACE_EXPORT_URL:
+        import httpx   # nur mit Collector nötig (mcp_time hat kein httpx)
+        client = httpx.AsyncClient(timeout=5.0)
+    try:
+        while True:
+            await asyncio.sleep(TRACE_FLUSH_SECONDS)
+            await flush(client)
+    finally:
+        await flush(client)
+        if client is not None:
+            await client.aclose()
+
+
+def start():
+    """Im Startup-Hook aufrufen; startet den Export-Task nur bei aktivem Tracing."""
+    global _FLUSHER
+    if ENABLED and _FLUSHER is None:
+        _FLUSHER = asyncio.get_running_loop().create_task(flush_loop())
+        logger.info(f"[Tracing] aktiv für '{SERVICE['name']}' → {TRACE_EXPORT_FILE or ''} {TRACE_EXPORT_URL or ''}".rstrip())
+
+
+async def stop():
+    """Im Shutdown-Hook: Export-Task beenden, verbleibende Spans werden dabei noch geschrieben."""
+    global _FLUSHER
+    if _FLUSHER is not None:
+        _FLUSHER.cancel()
+        try:
+            await _FLUSHER
+        except asyncio.CancelledError:
+            pass
+        _FLUSHER = None
+
+
+def info() -> dict:
+    return {"enabled": ENABLED, "queued": len(QUEUE), **STATS,
+            "file": TRACE_EXPORT_FILE or None, "url": TRACE_EXPORT_URL or None}